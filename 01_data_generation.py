@@ -1,7 +1,39 @@
 # 01_data_generation.py
+import argparse
+
 import pandas as pd
 import numpy as np
 
+from thumbnail_ab.storage import FORMATS, data_path, open_writer
+
+GROUPS = ['control', 'treatment']
+GROUP_PROBS = [0.5, 0.5]
+COUNTRIES = ['US', 'UK', 'CA', 'AU']
+COUNTRY_PROBS = [0.6, 0.2, 0.15, 0.05]
+WATCHED_PROB = 0.3
+CLICK_RATES = {'control': 0.12, 'treatment': 0.16}
+AGE_MIN, AGE_MAX = 18, 65  # upper bound is exclusive, as in np.random.randint
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+MAX_USERS = np.iinfo(np.uint32).max + 1
+
+
+def make_arms(n_arms, click_rates=None):
+    """Arm name -> click rate for an A/B/n test: 'control' plus variant_1..variant_{n-1}.
+
+    Two arms keep the original control/treatment names and rates. Without
+    click_rates the variants' rates are spread evenly from the control
+    rate up to the original treatment rate.
+    """
+    if n_arms < 2:
+        raise ValueError("An experiment needs at least two arms")
+    names = GROUPS if n_arms == 2 else ['control'] + [f'variant_{i}' for i in range(1, n_arms)]
+    if click_rates is None:
+        click_rates = np.linspace(CLICK_RATES['control'], CLICK_RATES['treatment'], n_arms)
+    if len(click_rates) != n_arms:
+        raise ValueError(f"Got {len(click_rates)} click rates for {n_arms} arms")
+    return dict(zip(names, (float(rate) for rate in click_rates)))
+
 
 def generate_ab_test_data():
     """Generate synthetic YouTube A/B test data"""
@@ -53,5 +85,110 @@ def generate_ab_test_data():
     return data
 
 
+def generate_chunk(rng, start_id, n_rows, arms=None):
+    """Generate one chunk of users with compact dtypes from a seeded Generator
+
+    arms maps arm name -> click rate (see make_arms); users are split
+    evenly across arms. The default is the original two-arm test.
+    """
+    arms = arms or CLICK_RATES
+    groups = list(arms)
+    if groups == GROUPS:
+        group_codes = (rng.random(n_rows) < GROUP_PROBS[1]).astype(np.int8)
+    else:
+        group_codes = rng.integers(0, len(groups), n_rows, dtype=np.int8)
+    country_codes = rng.choice(len(COUNTRIES), n_rows, p=COUNTRY_PROBS).astype(np.int8)
+
+    # One uniform draw per user against the per-group click rate replaces
+    # the boolean-mask .loc assignments used by generate_ab_test_data()
+    click_rates = np.array([arms[g] for g in groups])
+    clicked = (rng.random(n_rows) < click_rates[group_codes]).astype(np.int8)
+
+    return pd.DataFrame({
+        'user_id': np.arange(start_id, start_id + n_rows, dtype=np.uint32),
+        'group': pd.Categorical.from_codes(group_codes, categories=groups),
+        'age': rng.integers(AGE_MIN, AGE_MAX, n_rows, dtype=np.int8),
+        'country': pd.Categorical.from_codes(country_codes, categories=COUNTRIES),
+        'previously_watched_channel': (rng.random(n_rows) < WATCHED_PROB).astype(np.int8),
+        'clicked': clicked,
+    })
+
+
+def iter_ab_test_chunks(n_users, chunk_size=DEFAULT_CHUNK_SIZE, seed=42, arms=None):
+    """Yield the synthetic dataset as a sequence of DataFrame chunks.
+
+    Every chunk gets its own np.random.Generator spawned from a single
+    SeedSequence, so the output is reproducible for a given
+    (n_users, chunk_size, seed) and chunks could be produced in parallel.
+    """
+    if n_users > MAX_USERS:
+        raise ValueError(f"n_users={n_users:,} does not fit in uint32 user ids (max {MAX_USERS:,})")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+
+    n_chunks = -(-n_users // chunk_size)
+    child_seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+
+    for i, child_seed in enumerate(child_seeds):
+        start_id = i * chunk_size
+        n_rows = min(chunk_size, n_users - start_id)
+        yield generate_chunk(np.random.default_rng(child_seed), start_id, n_rows, arms)
+
+
+def stream_ab_test_data(n_users, chunk_size=DEFAULT_CHUNK_SIZE, seed=42, output_path=None, fmt='csv',
+                        arms=None):
+    """Generate a large dataset chunk by chunk, appending each chunk to disk.
+
+    Only one chunk is held in memory at a time, so peak memory depends on
+    chunk_size rather than n_users. fmt picks the storage backend (csv,
+    parquet, feather or npy). arms (see make_arms) generates an A/B/n
+    test instead of the original two arms. Returns per-group user and
+    click counts.
+    """
+    arms = arms or CLICK_RATES
+    groups = list(arms)
+    output_path = output_path or data_path(fmt)
+    print("🚀 STREAMING SYNTHETIC A/B TEST DATA")
+    print("=" * 50)
+    print(f"Users: {n_users:,} | Chunk size: {chunk_size:,} | Seed: {seed} | Format: {fmt} | Arms: {len(groups)}")
+
+    users = pd.Series(0, index=groups, dtype=np.int64)
+    clicks = pd.Series(0, index=groups, dtype=np.int64)
+
+    writer = open_writer(output_path, fmt, n_rows=n_users, categories={'group': groups})
+    for i, chunk in enumerate(iter_ab_test_chunks(n_users, chunk_size, seed, arms)):
+        writer.write(chunk)
+
+        grouped = chunk.groupby('group', observed=False)['clicked']
+        users = users.add(grouped.size(), fill_value=0)
+        clicks = clicks.add(grouped.sum(), fill_value=0)
+        print(f"   Chunk {i + 1}: wrote {len(chunk):,} rows ({int(users.sum()):,}/{n_users:,})")
+    writer.close()
+
+    print("✅ DATA GENERATED AND SAVED")
+    print(f"File saved: {output_path}")
+    print(f"\nClick rates by group:")
+    print(clicks / users)
+
+    return {'users': users.astype(np.int64), 'clicks': clicks.astype(np.int64)}
+
+
 if __name__ == "__main__":
-    data = generate_ab_test_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate synthetic YouTube thumbnail A/B test data")
+    parser.add_argument('--n-users', type=int, default=None,
+                        help="Stream this many users to disk in chunks (default: the original 10k in-memory dataset)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help="Storage backend for streamed data")
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--arms', type=int, default=2, help="Number of thumbnails (A/B/n) for streamed data")
+    parser.add_argument('--click-rates', type=float, nargs='+', default=None,
+                        help="Click rate per arm, control first (default: evenly spaced 0.12-0.16)")
+    args = parser.parse_args()
+
+    if args.n_users is None:
+        data = generate_ab_test_data()
+    else:
+        arms = make_arms(args.arms, args.click_rates)
+        stream_ab_test_data(args.n_users, args.chunk_size, args.seed, args.output, args.format, arms)
\ No newline at end of file
@@ -1,36 +1,68 @@
 # 02_exploratory_analysis.py
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-def load_data():
-    """Load data from CSV file"""
-    try:
-        data = pd.read_csv('ab_test_data.csv')
-        print("✅ DATA LOADED SUCCESSFULLY")
-        return data
-    except FileNotFoundError:
-        print("❌ ERROR: ab_test_data.csv not found. Run 01_data_generation.py first.")
-        return None
-
-def perform_eda(data):
-    """Perform Exploratory Data Analysis"""
+
+from thumbnail_ab.eda import FIGURE_FORMATS, eda_summary, render_eda, show_if_interactive
+from thumbnail_ab.storage import load_data, ALL_COLUMNS
+from thumbnail_ab.trace import span, traced
+
+# Columns this stage reads; the storage layer skips the rest
+COLUMNS = ALL_COLUMNS
+
+# From this many rows mode='auto' plots pre-aggregated summaries
+SUMMARY_MIN_ROWS = 1_000_000
+
+@traced
+def perform_eda(data, mode='auto', dpi=300, fmt='png', show=None):
+    """Perform Exploratory Data Analysis
+
+    mode='raw' draws the seaborn plots from every row; mode='summary'
+    aggregates once (vectorized binning and count tables) and renders from
+    those summaries, so rendering time does not grow with the data.
+    'auto' picks summary from SUMMARY_MIN_ROWS rows. The figure is saved as
+    exploratory_analysis.<fmt> and only shown when a display is available.
+    """
     print("\n🔍 PERFORMING EXPLORATORY DATA ANALYSIS")
     print("=" * 50)
     
     # Check data quality
     print("=== DATA QUALITY CHECK ===")
     print(f"Missing values:\n{data.isnull().sum()}")
-    print(f"Duplicate users: {data['user_id'].duplicated().sum()}")
-    
+    duplicate_users = data['user_id'].duplicated().sum()
+    print(f"Duplicate users: {duplicate_users}")
+
+    figure_path = f'exploratory_analysis.{fmt}'
+    if mode == 'auto':
+        mode = 'summary' if len(data) >= SUMMARY_MIN_ROWS else 'raw'
+
     # Create visualizations
     print("\n📈 CREATING EXPLORATORY VISUALIZATIONS...")
+    if mode == 'summary':
+        render_eda(eda_summary(data), figure_path, dpi=dpi, fmt=fmt, show=show)
+    elif mode == 'raw':
+        plot_raw_eda(data, figure_path, dpi, fmt, show)
+    else:
+        raise ValueError(f"Unknown mode '{mode}'. Choose 'auto', 'summary' or 'raw'")
+
+    print(f"✅ VISUALIZATIONS SAVED AS '{figure_path}'")
+
+    return {
+        'missing_values': int(data.isnull().sum().sum()),
+        'duplicate_users': int(duplicate_users),
+        'figure_path': figure_path
+    }
+
+def plot_raw_eda(data, figure_path, dpi, fmt, show):
+    """The original seaborn figure, drawn from the raw rows"""
+    import seaborn as sns
+    from thumbnail_ab.eda import get_pyplot
+
+    plt = get_pyplot()
     plt.style.use('default')
     fig, axes = plt.subplots(2, 2, figsize=(15, 10))
 
     # Plot 1: Click rates by group
     sns.barplot(x='group', y='clicked', data=data, ax=axes[0,0], errorbar=None, 
-                hue='group', palette=['#1f77b4', '#ff7f0e'], legend=False)
+                hue='group', palette=['#1f77b4', '#ff7f0e'], legend=False, dodge=False)
     axes[0,0].set_title('Click-Through Rate by Group', fontsize=14, fontweight='bold')
     axes[0,0].set_ylabel('Click Rate')
 
@@ -53,12 +85,23 @@ def perform_eda(data):
     axes[1,1].legend(title='Group')
 
     plt.tight_layout()
-    plt.savefig('exploratory_analysis.png', dpi=300, bbox_inches='tight')
-    plt.show()
-
-    print("✅ VISUALIZATIONS SAVED AS 'exploratory_analysis.png'")
+    with span('figure_save', path=str(figure_path), dpi=dpi):
+        plt.savefig(figure_path, dpi=dpi, format=fmt, bbox_inches='tight')
+    if show is None or show:
+        show_if_interactive(plt)
+    else:
+        plt.close(fig)
 
 if __name__ == "__main__":
-    data = load_data()
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=['auto', 'summary', 'raw'], default='auto')
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--format', choices=FIGURE_FORMATS, default='png')
+    parser.add_argument('--no-show', action='store_true', help="Never call plt.show()")
+    args = parser.parse_args()
+
+    data = load_data(columns=COLUMNS, verbose=True)
     if data is not None:
-        perform_eda(data)
\ No newline at end of file
+        perform_eda(data, args.mode, args.dpi, args.format, show=False if args.no_show else None)
\ No newline at end of file
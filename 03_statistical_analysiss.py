@@ -1,34 +1,45 @@
 # 03_statistical_testing.py
-import pandas as pd
-from scipy import stats
-
-def load_data():
-    """Load data from CSV file"""
-    try:
-        data = pd.read_csv('ab_test_data.csv')
-        return data
-    except FileNotFoundError:
-        print("❌ ERROR: ab_test_data.csv not found. Run 01_data_generation.py first.")
-        return None
-
-def perform_statistical_tests(data):
-    """Perform basic statistical tests"""
+from thumbnail_ab.aggregates import (
+    ensure_stats, ttest_clicks, ttest_age, anova_age, chi2_outcome, chi2_covariate
+)
+from thumbnail_ab.incremental import ExperimentState
+from thumbnail_ab.multiarm import CORRECTIONS, best_arm, compare_to_control, is_multiarm, pairwise_tests
+from thumbnail_ab.storage import load_data
+from thumbnail_ab.trace import traced
+
+# Columns this stage reads; the storage layer skips the rest
+COLUMNS = ['group', 'clicked', 'age', 'country', 'previously_watched_channel']
+
+@traced
+def perform_statistical_tests(data, correction='holm'):
+    """Perform basic statistical tests
+
+    data can be the raw rows or a precomputed SufficientStats; every test
+    below runs on the aggregated count tables. With more than two arms the
+    A/B/n tests in perform_multiarm_tests() run instead, with p-values
+    adjusted by correction ('holm', 'bh' or 'none').
+    """
     print("\n📊 PERFORMING STATISTICAL TESTING")
     print("=" * 50)
     
-    # Separate groups
-    control_clicks = data[data['group'] == 'control']['clicked']
-    treatment_clicks = data[data['group'] == 'treatment']['clicked']
+    # Aggregate once, then work on counts
+    summary = ensure_stats(data)
+    if is_multiarm(summary):
+        return perform_multiarm_tests(summary, correction)
+    control = summary.index('control')
+    treatment = summary.index('treatment')
+    control_rate = summary.rates[control]
+    treatment_rate = summary.rates[treatment]
 
     # T-test
     print("=== INDEPENDENT T-TEST RESULTS ===")
-    t_stat, p_value = stats.ttest_ind(treatment_clicks, control_clicks)
+    t_stat, p_value = ttest_clicks(summary, 'treatment', 'control')
 
-    abs_diff = treatment_clicks.mean() - control_clicks.mean()
-    rel_improvement = (abs_diff / control_clicks.mean()) * 100
+    abs_diff = treatment_rate - control_rate
+    rel_improvement = (abs_diff / control_rate) * 100
 
-    print(f"Control CTR:    {control_clicks.mean():.4f} ({control_clicks.sum()}/{len(control_clicks)} clicks)")
-    print(f"Treatment CTR:  {treatment_clicks.mean():.4f} ({treatment_clicks.sum()}/{len(treatment_clicks)} clicks)")
+    print(f"Control CTR:    {control_rate:.4f} ({summary.successes[control]}/{summary.trials[control]} clicks)")
+    print(f"Treatment CTR:  {treatment_rate:.4f} ({summary.successes[treatment]}/{summary.trials[treatment]} clicks)")
     print(f"Absolute difference: {abs_diff:.4f}")
     print(f"Relative improvement: {rel_improvement:.2f}%")
     print(f"T-statistic: {t_stat:.4f}")
@@ -41,33 +52,41 @@ def perform_statistical_tests(data):
 
     # Chi-square test
     print("\n=== CHI-SQUARE TEST VALIDATION ===")
-    contingency_table = pd.crosstab(data['group'], data['clicked'])
+    contingency_table = summary.outcome_table()
     print("Contingency Table:")
     print(contingency_table)
 
-    chi2, p_chi, dof, expected = stats.chi2_contingency(contingency_table)
+    chi2, p_chi, dof, expected = chi2_outcome(summary)
     print(f"Chi-square statistic: {chi2:.4f}")
     print(f"P-value: {p_chi:.6f}")
 
+    results = {
+        'control_rate': control_rate,
+        'treatment_rate': treatment_rate,
+        'absolute_difference': abs_diff,
+        'relative_improvement': rel_improvement,
+        'p_value': p_value,
+        't_statistic': t_stat,
+    }
+
     # Check covariate balance
     print("\n=== COVARIATE BALANCE CHECK ===")
-    t_age, p_age = stats.ttest_ind(
-        data[data['group'] == 'control']['age'],
-        data[data['group'] == 'treatment']['age']
-    )
+    if not summary.has_covariates:
+        print("⏭️  Skipped: only click counts are available")
+        results['covariate_imbalanced'] = None
+        return results
+    t_age, p_age = ttest_age(summary, 'control', 'treatment')
     print(f"Age balance - T-stat: {t_age:.4f}, P-value: {p_age:.4f}")
 
-    country_table = pd.crosstab(data['country'], data['group'])
-    chi2_country, p_country, _, _ = stats.chi2_contingency(country_table)
+    chi2_country, p_country, _, _ = chi2_covariate(summary, 'country')
     print(f"Country balance - Chi2: {chi2_country:.4f}, P-value: {p_country:.4f}")
 
-    watch_table = pd.crosstab(data['previously_watched_channel'], data['group'])
-    chi2_watch, p_watch, _, _ = stats.chi2_contingency(watch_table)
+    chi2_watch, p_watch, _, _ = chi2_covariate(summary, 'previously_watched_channel')
     print(f"Previous watchers - Chi2: {chi2_watch:.4f}, P-value: {p_watch:.4f}")
 
     # Enhanced analysis for imbalance
     print(f"\n🔍 INVESTIGATING IMBALANCE IN PREVIOUS WATCHERS:")
-    watch_distribution = pd.crosstab(data['previously_watched_channel'], data['group'])
+    watch_distribution = summary.covariate_table('previously_watched_channel')
     print("Distribution of previous watchers:")
     print(watch_distribution)
     
@@ -91,17 +110,81 @@ def perform_statistical_tests(data):
         print(f"   1. Use logistic regression to control for these variables")
         print(f"   2. Check if the imbalance affects our conclusion")
     
+    results['covariate_imbalanced'] = p_watch <= 0.05
+    return results
+
+def perform_multiarm_tests(summary, correction='holm'):
+    """A/B/n version of the tests above: omnibus, each variant vs control, all pairs, balance"""
+    print(f"=== A/B/n TEST WITH {len(summary.groups)} ARMS ===")
+    chi2, p_chi, dof, _ = chi2_outcome(summary)
+    print(f"Omnibus chi-square (any arm differs): {chi2:.4f}, dof={dof}, P-value: {p_chi:.6f}")
+
+    print(f"\n=== EACH VARIANT VS CONTROL ({correction} adjusted) ===")
+    vs_control = compare_to_control(summary, correction=correction)
+    print(f"Control CTR: {summary.rates[summary.index('control')]:.4f}")
+    print(vs_control[['ctr', 'absolute_difference', 'relative_improvement', 't_statistic',
+                      'p_value', 'p_adjusted', 'significant']].round(6).to_string())
+
+    pairwise = pairwise_tests(summary, correction)
+    n_pairs = len(summary.groups) * (len(summary.groups) - 1) // 2
+    significant_pairs = int((pairwise['p_adjusted'].to_numpy() < 0.05).sum() // 2)
+    print(f"\n=== ALL PAIRS ({n_pairs} comparisons, {correction} adjusted) ===")
+    print(pairwise['p_adjusted'].round(4).to_string())
+    print(f"Significantly different pairs: {significant_pairs}/{n_pairs}")
+
+    best = best_arm(summary)
+    best_row = vs_control.loc[best]
+    print(f"\n🏆 BEST ARM: {best} (CTR {best_row['ctr']:.4f}, {best_row['relative_improvement']:+.2f}% vs control, "
+          f"adjusted p={best_row['p_adjusted']:.6f})")
+
+    print("\n=== COVARIATE BALANCE CHECK ===")
+    imbalanced = None
+    if summary.has_covariates:
+        f_age, p_age = anova_age(summary)
+        print(f"Age balance - ANOVA F: {f_age:.4f}, P-value: {p_age:.4f}")
+        chi2_country, p_country, _, _ = chi2_covariate(summary, 'country')
+        print(f"Country balance - Chi2: {chi2_country:.4f}, P-value: {p_country:.4f}")
+        chi2_watch, p_watch, _, _ = chi2_covariate(summary, 'previously_watched_channel')
+        print(f"Previous watchers - Chi2: {chi2_watch:.4f}, P-value: {p_watch:.4f}")
+        if p_age > 0.05 and p_country > 0.05 and p_watch > 0.05:
+            print("✅ ALL COVARIATES ARE BALANCED - Randomization successful")
+        else:
+            print("⚠️  COVARIATE IMBALANCE DETECTED - Advanced analysis required")
+        imbalanced = p_watch <= 0.05
+    else:
+        print("⏭️  Skipped: only click counts are available")
+
+    # Headline fields describe the best arm, so stage 06 reads them like a two-arm test
     return {
-        'control_rate': control_clicks.mean(),
-        'treatment_rate': treatment_clicks.mean(),
-        'absolute_difference': abs_diff,
-        'relative_improvement': rel_improvement,
-        'p_value': p_value,
-        't_statistic': t_stat,
-        'covariate_imbalanced': p_watch <= 0.05
+        'best_arm': best,
+        'control_rate': summary.rates[summary.index('control')],
+        'treatment_rate': best_row['ctr'],
+        'absolute_difference': best_row['absolute_difference'],
+        'relative_improvement': best_row['relative_improvement'],
+        'p_value': best_row['p_adjusted'],
+        't_statistic': best_row['t_statistic'],
+        'covariate_imbalanced': imbalanced,
+        'omnibus_p_value': p_chi,
+        'vs_control': vs_control.to_dict(orient='index'),
+        'pairwise_p_adjusted': pairwise['p_adjusted'].to_dict(orient='index'),
     }
 
 if __name__ == "__main__":
-    data = load_data()
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--state', default=None,
+                        help="Use incremental experiment state (see thumbnail_ab.incremental) instead of the raw data")
+    parser.add_argument('--experiment', default='default')
+    parser.add_argument('--correction', choices=list(CORRECTIONS), default='holm',
+                        help="Multiple-comparison correction for A/B/n tests")
+    args = parser.parse_args()
+
+    if args.state:
+        data = ExperimentState.load(args.state).experiments.get(args.experiment)
+        if data is None:
+            print(f"❌ ERROR: experiment '{args.experiment}' not found in {args.state}")
+    else:
+        data = load_data(columns=COLUMNS)
     if data is not None:
-        results = perform_statistical_tests(data)
\ No newline at end of file
+        results = perform_statistical_tests(data, args.correction)
\ No newline at end of file
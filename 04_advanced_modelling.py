@@ -1,27 +1,26 @@
 # 04_advanced_modeling.py - FIXED VERSION
+import os
+
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
-from sklearn.preprocessing import LabelEncoder
 
-def load_data():
-    """Load data from CSV file"""
-    try:
-        data = pd.read_csv('ab_test_data.csv')
-        return data
-    except FileNotFoundError:
-        print("❌ ERROR: ab_test_data.csv not found. Run 01_data_generation.py first.")
-        return None
-
-def perform_logistic_regression(data):
-    """Perform logistic regression analysis - CONTROLLING FOR IMBALANCE"""
-    print("\n🎯 PERFORMING ADVANCED STATISTICAL MODELING")
-    print("=" * 50)
-    print("⚠️  Since we detected covariate imbalance, we'll use logistic regression")
-    print("   to control for these variables and get an unbiased estimate.")
+from thumbnail_ab.cache import DEFAULT_CACHE_DIR, ResultCache, data_fingerprint
+from thumbnail_ab.cuped import accumulate_moments, adjusted_effects
+from thumbnail_ab.logit import fit_compressed_logit
+from thumbnail_ab.multiarm import ARM_TERM, CONTROL, arm_effects
+from thumbnail_ab.storage import find_data_path, load_data
+from thumbnail_ab.trace import span, traced
+
+# Columns this stage reads; the storage layer skips the rest
+COLUMNS = ['group', 'clicked', 'age', 'country', 'previously_watched_channel']
+
+# Above this many rows method='auto' fits on compressed covariate patterns
+COMPRESSED_MIN_ROWS = 1_000_000
+
+def fit_formula_logit(data):
+    """Fit the covariate-adjusted model on the raw rows with statsmodels"""
+    import statsmodels.api as sm
 
-    print("\n=== LOGISTIC REGRESSION WITH COVARIATES ===")
-    
     # Create a clean copy of the data
     data_clean = data.copy()
     
@@ -40,7 +39,8 @@ def perform_logistic_regression(data):
         
         # Fit the model using formula API
         logit_model = sm.Logit.from_formula(formula, data=data_clean)
-        logit_result = logit_model.fit()
+        with span('logit_fit', rows=len(data_clean), engine='statsmodels'):
+            logit_result = logit_model.fit()
         
         print("✅ Formula API successful!")
         
@@ -49,6 +49,8 @@ def perform_logistic_regression(data):
         print("Trying Method 2: Manual feature engineering...")
         
         # Method 2: Manual approach
+        from sklearn.preprocessing import LabelEncoder
+
         # Encode country safely
         le = LabelEncoder()
         data_clean['country_encoded'] = le.fit_transform(data_clean['country'])
@@ -63,45 +65,87 @@ def perform_logistic_regression(data):
         
         # Fit the model
         logit_model = sm.Logit(y, X)
-        logit_result = logit_model.fit()
+        with span('logit_fit', rows=len(X), engine='statsmodels'):
+            logit_result = logit_model.fit()
         
         print("✅ Manual feature engineering successful!")
 
+    return logit_result
+
+
+@traced
+def perform_logistic_regression(data, method='auto', age_bins=None, correction='holm', fitted=None):
+    """Perform logistic regression analysis - CONTROLLING FOR IMBALANCE
+
+    method='statsmodels' fits on the raw rows; method='compressed' collapses
+    rows into unique covariate patterns and fits a weighted binomial model,
+    which gives the same estimates with memory independent of row count.
+    'auto' uses the compressed fit from COMPRESSED_MIN_ROWS rows upwards.
+    With more than two arms every variant gets its own dummy against the
+    control; the headline figures describe the variant with the highest
+    adjusted odds ratio, and the per-arm p-values are adjusted by correction.
+    fitted=(logit_result, compressed, moments) reports a fit made elsewhere,
+    e.g. by thumbnail_ab.parallel over row partitions; data may then be None.
+    """
+    print("\n🎯 PERFORMING ADVANCED STATISTICAL MODELING")
+    print("=" * 50)
+    print("⚠️  Since we detected covariate imbalance, we'll use logistic regression")
+    print("   to control for these variables and get an unbiased estimate.")
+
+    print("\n=== LOGISTIC REGRESSION WITH COVARIATES ===")
+
+    groups = data['group'].unique() if fitted is None else fitted[1]['group'].unique()
+    arms = [g for g in groups if g != CONTROL]
+    multiarm = len(arms) > 1
+    moments = None
+    if fitted is None and method == 'auto':
+        method = 'compressed' if len(data) >= COMPRESSED_MIN_ROWS or multiarm else 'statsmodels'
+    elif fitted is None and method == 'statsmodels' and multiarm:
+        print("A/B/n data: using the compressed fit (same estimates) for the per-arm dummies")
+        method = 'compressed'
+    if fitted is not None:
+        print("Using the partitioned fit (gradients and Hessians reduced across row partitions)")
+        logit_result, compressed, moments = fitted
+    elif method == 'compressed':
+        print("Fitting on compressed covariate patterns...")
+        logit_result, compressed = fit_compressed_logit(data, age_bins=age_bins)
+        print("✅ Compressed fit successful!")
+    elif method == 'statsmodels':
+        logit_result = fit_formula_logit(data)
+        compressed = None
+    else:
+        raise ValueError(f"Unknown method '{method}'. Choose 'auto', 'compressed' or 'statsmodels'")
+
     # Display results
     print("\n" + "="*80)
     print("LOGISTIC REGRESSION RESULTS")
     print("="*80)
     print(logit_result.summary())
 
+    treatment_label, treatment_term, effects = 'treatment', 'is_treatment', None
+    if multiarm:
+        effects = arm_effects(logit_result, sorted(arms), correction)
+        print(f"\n🎰 ADJUSTED ODDS RATIOS VS CONTROL ({correction} adjusted):")
+        print(effects.round(6).to_string())
+        treatment_label = effects['odds_ratio'].idxmax()
+        treatment_term = ARM_TERM.format(treatment_label)
+        print(f"🏆 Highest adjusted odds ratio: {treatment_label}")
+
     # Enhanced interpretation
     print(f"\n💡 ENHANCED INTERPRETATION (Controlling for Imbalance):")
     
-    # Extract key coefficients safely
-    try:
-        if 'is_treatment' in logit_result.params:
-            treatment_coef = logit_result.params['is_treatment']
-            treatment_odds_ratio = np.exp(treatment_coef)
-            treatment_pvalue = logit_result.pvalues['is_treatment']
-            
-            # Get confidence intervals
-            conf_int = logit_result.conf_int()
-            treatment_ci_lower = np.exp(conf_int.loc['is_treatment', 0])
-            treatment_ci_upper = np.exp(conf_int.loc['is_treatment', 1])
-        else:
-            # Try alternative name
-            treatment_coef = logit_result.params['is_treatment[T.1]'] if 'is_treatment[T.1]' in logit_result.params else logit_result.params[1]
-            treatment_odds_ratio = np.exp(treatment_coef)
-            treatment_pvalue = logit_result.pvalues[1]
-            treatment_ci_lower = np.exp(conf_int.iloc[1, 0])
-            treatment_ci_upper = np.exp(conf_int.iloc[1, 1])
-            
-    except Exception as e:
-        print(f"❌ Error extracting coefficients: {e}")
-        # Use approximate values for demonstration
-        treatment_odds_ratio = 1.41
-        treatment_ci_lower = 1.28
-        treatment_ci_upper = 1.56
-        treatment_pvalue = 0.0001
+    # Extract key coefficients
+    conf_int = logit_result.conf_int()
+    if treatment_term not in logit_result.params and 'is_treatment[T.1]' in logit_result.params:
+        treatment_term = 'is_treatment[T.1]'  # formula name of a boolean treatment dummy
+    treatment_coef = logit_result.params[treatment_term]
+    treatment_odds_ratio = np.exp(treatment_coef)
+    treatment_pvalue = logit_result.pvalues[treatment_term]
+    treatment_ci_lower = np.exp(conf_int.loc[treatment_term, 0])
+    treatment_ci_upper = np.exp(conf_int.loc[treatment_term, 1])
+
+    if effects is not None:
+        treatment_pvalue = effects.loc[treatment_label, 'p_adjusted']
 
     print(f"🎯 TREATMENT EFFECT (Adjusted):")
     print(f"   Odds Ratio: {treatment_odds_ratio:.4f}")
@@ -131,8 +175,13 @@ def perform_logistic_regression(data):
         print("\n📊 Note: Previous watchers effect could not be extracted")
 
     # Compare with naive estimate
-    naive_ctr_control = data[data['group'] == 'control']['clicked'].mean()
-    naive_ctr_treatment = data[data['group'] == 'treatment']['clicked'].mean()
+    if compressed is not None:
+        by_group = compressed.groupby('group')[['clicks', 'trials']].sum()
+        naive_ctr_control = by_group.loc['control', 'clicks'] / by_group.loc['control', 'trials']
+        naive_ctr_treatment = by_group.loc[treatment_label, 'clicks'] / by_group.loc[treatment_label, 'trials']
+    else:
+        naive_ctr_control = data[data['group'] == 'control']['clicked'].mean()
+        naive_ctr_treatment = data[data['group'] == treatment_label]['clicked'].mean()
     naive_odds = naive_ctr_treatment / naive_ctr_control if naive_ctr_control > 0 else 0
     
     print(f"\n🔍 COMPARISON WITH NAIVE ESTIMATE:")
@@ -149,6 +198,16 @@ def perform_logistic_regression(data):
     else:
         print("   ✅ Small difference - basic analysis was reasonable")
 
+    # Linear adjustment from one pass of moments: a cheap cross-check on the CTR scale
+    moments = moments if moments is not None else accumulate_moments(data)
+    cuped = adjusted_effects(moments, correction=correction).loc[treatment_label]
+    print(f"\n📉 REGRESSION-ADJUSTED CTR LIFT (CUPED):")
+    print(f"   Raw difference:      {cuped['raw_difference']:.4f} (SE {cuped['raw_se']:.4f})")
+    print(f"   Adjusted difference: {cuped['adjusted_difference']:.4f} (SE {cuped['adjusted_se']:.4f})")
+    print(f"   95% Confidence Interval: [{cuped['confidence_interval_lower']:.4f}, "
+          f"{cuped['confidence_interval_upper']:.4f}]")
+    print(f"   Variance reduction:  {cuped['variance_reduction'] * 100:.2f}%")
+
     # Model diagnostics
     print(f"\n📈 MODEL DIAGNOSTICS:")
     print(f"   Pseudo R-squared: {logit_result.prsquared:.4f}")
@@ -161,18 +220,43 @@ def perform_logistic_regression(data):
     total_predictors = len(logit_result.pvalues) - 1  # Exclude intercept
     print(f"   Significant predictors: {significant_count}/{total_predictors}")
 
-    return {
+    results = {
         'odds_ratio': treatment_odds_ratio,
         'confidence_interval_lower': treatment_ci_lower,
         'confidence_interval_upper': treatment_ci_upper,
         'p_value': treatment_pvalue,
         'model_prsquared': logit_result.prsquared,
-        'significant_predictors': significant_count
+        'significant_predictors': significant_count,
+        'cuped_difference': cuped['adjusted_difference'],
+        'cuped_ci_lower': cuped['confidence_interval_lower'],
+        'cuped_ci_upper': cuped['confidence_interval_upper'],
+        'cuped_p_value': cuped['p_adjusted'],
+        'cuped_variance_reduction': cuped['variance_reduction'],
     }
+    if effects is not None:
+        results['best_arm'] = treatment_label
+        results['arm_effects'] = effects.to_dict(orient='index')
+    return results
 
 if __name__ == "__main__":
-    data = load_data()
-    if data is not None:
-        regression_results = perform_logistic_regression(data)
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--method', choices=['auto', 'compressed', 'statsmodels'], default='auto')
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_DIR, default=None,
+                        help="Reuse the result of an earlier run on identical data (see thumbnail_ab.cache)")
+    args = parser.parse_args()
+
+    path = find_data_path()
+    if args.cache and os.path.exists(path):
+        cache = ResultCache(args.cache)
+        params = {'method': args.method, 'correction': 'holm'}
+        regression_results = cache.call('regression', data_fingerprint(path), params,
+                                        lambda: perform_logistic_regression(load_data(path, columns=COLUMNS),
+                                                                            **params))
+    else:
+        data = load_data(path, columns=COLUMNS)
+        regression_results = None if data is None else perform_logistic_regression(data, method=args.method)
+    if regression_results is not None:
         print(f"\n✅ Logistic regression completed successfully!")
         print(f"📊 Final adjusted odds ratio: {regression_results['odds_ratio']:.4f}")
\ No newline at end of file
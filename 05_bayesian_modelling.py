@@ -1,21 +1,30 @@
 # 05_bayesian_analysis.py
-import pandas as pd
 import numpy as np
-from scipy import stats
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-def load_data():
-    """Load data from CSV file"""
-    try:
-        data = pd.read_csv('ab_test_data.csv')
-        return data
-    except FileNotFoundError:
-        print("❌ ERROR: ab_test_data.csv not found. Run 01_data_generation.py first.")
-        return None
-
-def perform_bayesian_analysis(data):
-    """Perform Bayesian A/B testing analysis"""
+
+from thumbnail_ab.aggregates import ensure_stats, beta_posterior
+from thumbnail_ab.bayes import DEFAULT_TOL, compare_exact, compare_sampled
+from thumbnail_ab.cache import DEFAULT_CACHE_DIR, ResultCache, data_fingerprint
+from thumbnail_ab.incremental import ExperimentState
+from thumbnail_ab.multiarm import CONTROL, bayesian_arms, is_multiarm
+from thumbnail_ab.storage import load_data
+from thumbnail_ab.trace import span, traced
+
+# Columns this stage reads; the storage layer skips the rest
+COLUMNS = ['group', 'clicked']
+FIGURE_PATH = 'bayesian_analysis.png'
+
+@traced
+def perform_bayesian_analysis(data, method='exact', n_samples=100000, tol=DEFAULT_TOL, cross_check=False,
+                              plot=True):
+    """Perform Bayesian A/B testing analysis
+
+    data can be the raw rows or a precomputed SufficientStats.
+    method='exact' computes P(treatment > control) and the expected loss in
+    closed form / by quadrature to tolerance tol; method='sample' uses the
+    original n_samples Monte Carlo draws. cross_check=True reports both.
+    plot=False skips the figure (and the matplotlib import). With more than
+    two arms, see perform_multiarm_bayes().
+    """
     print("\n🔮 PERFORMING BAYESIAN ANALYSIS")
     print("=" * 50)
 
@@ -24,41 +33,89 @@ def perform_bayesian_analysis(data):
     alpha_prior = 2
     beta_prior = 10
 
-    # Calculate successes and trials
-    control_success = data[data['group'] == 'control']['clicked'].sum()
-    control_trials = data[data['group'] == 'control']['clicked'].count()
-
-    treatment_success = data[data['group'] == 'treatment']['clicked'].sum()
-    treatment_trials = data[data['group'] == 'treatment']['clicked'].count()
-
-    # Posterior distributions
-    alpha_control_post = alpha_prior + control_success
-    beta_control_post = beta_prior + (control_trials - control_success)
-
-    alpha_treatment_post = alpha_prior + treatment_success
-    beta_treatment_post = beta_prior + (treatment_trials - treatment_success)
+    # Posterior distributions from the aggregated successes and trials
+    summary = ensure_stats(data)
+    if is_multiarm(summary):
+        return perform_multiarm_bayes(summary, alpha_prior, beta_prior, tol, plot)
+    alpha_control_post, beta_control_post = beta_posterior(summary, 'control', alpha_prior, beta_prior)
+    alpha_treatment_post, beta_treatment_post = beta_posterior(summary, 'treatment', alpha_prior, beta_prior)
 
     print(f"Control posterior: Beta({alpha_control_post}, {beta_control_post})")
     print(f"Treatment posterior: Beta({alpha_treatment_post}, {beta_treatment_post})")
 
-    # Sample from posterior distributions
-    np.random.seed(42)
-    n_samples = 100000
-    control_samples = np.random.beta(alpha_control_post, beta_control_post, n_samples)
-    treatment_samples = np.random.beta(alpha_treatment_post, beta_treatment_post, n_samples)
+    posteriors = (alpha_control_post, beta_control_post, alpha_treatment_post, beta_treatment_post)
 
-    # Calculate probability that treatment is better
-    prob_treatment_better = (treatment_samples > control_samples).mean()
-    difference = treatment_samples - control_samples
+    # Probability that treatment is better, mean improvement, interval and loss
+    difference = None
+    if method == 'exact':
+        results = compare_exact(*posteriors, tol=tol)
+    elif method == 'sample':
+        results, difference = compare_sampled(*posteriors, n_samples=n_samples)
+    else:
+        raise ValueError(f"Unknown method '{method}'. Choose 'exact' or 'sample'")
+    prob_treatment_better = results['bayesian_probability']
 
-    print(f"\n📊 BAYESIAN RESULTS:")
+    print(f"\n📊 BAYESIAN RESULTS ({method}):")
     print(f"Probability that treatment is better: {prob_treatment_better:.4f} ({(prob_treatment_better * 100):.2f}%)")
-    print(f"Mean improvement: {difference.mean():.4f}")
-    print(f"95% credible interval: [{np.percentile(difference, 2.5):.4f}, {np.percentile(difference, 97.5):.4f}]")
-
-    # Expected loss
-    loss = np.maximum(control_samples - treatment_samples, 0).mean()
-    print(f"Expected loss if we choose treatment: {loss:.6f}")
+    print(f"Mean improvement: {results['mean_improvement']:.4f}")
+    print(f"95% credible interval: [{results['credible_interval_lower']:.4f}, {results['credible_interval_upper']:.4f}]")
+    print(f"Expected loss if we choose treatment: {results['expected_loss']:.6f}")
+
+    if cross_check:
+        other = compare_sampled(*posteriors, n_samples=n_samples)[0] if method == 'exact' else compare_exact(*posteriors, tol=tol)
+        print(f"\n🔁 CROSS-CHECK ({'sample' if method == 'exact' else 'exact'}):")
+        for key, value in other.items():
+            print(f"   {key}: {value:.6f} (diff {abs(value - results[key]):.2e})")
+
+    if plot:
+        plot_bayesian_results(posteriors, results, difference)
+
+    return results
+
+def perform_multiarm_bayes(summary, alpha_prior=2, beta_prior=10, tol=DEFAULT_TOL, plot=True):
+    """Probability that each arm is best, P(arm i > arm j) for all pairs, and best arm vs control"""
+    table, prob_greater = bayesian_arms(summary, alpha_prior, beta_prior)
+    print(f"\n📊 POSTERIORS FOR {len(table)} ARMS:")
+    print(table[['posterior_mean', 'credible_interval_lower', 'credible_interval_upper',
+                 'prob_best', 'expected_loss']].round(6).to_string())
+    print("\nP(row arm CTR > column arm CTR):")
+    print(prob_greater.round(4).to_string())
+
+    best = table['prob_best'].idxmax()
+    posteriors = (table.loc[CONTROL, 'alpha_posterior'], table.loc[CONTROL, 'beta_posterior'],
+                  table.loc[best, 'alpha_posterior'], table.loc[best, 'beta_posterior'])
+    results = compare_exact(*posteriors, tol=tol)
+
+    print(f"\n🏆 MOST LIKELY BEST ARM: {best} (P(best) = {table.loc[best, 'prob_best']:.4f})")
+    print(f"Probability that {best} beats control: {results['bayesian_probability']:.4f}")
+    print(f"Mean improvement over control: {results['mean_improvement']:.4f}")
+    print(f"95% credible interval: [{results['credible_interval_lower']:.4f}, {results['credible_interval_upper']:.4f}]")
+    print(f"Expected loss if we choose {best} over control: {results['expected_loss']:.6f}")
+
+    if plot:
+        arm_posteriors = {arm: (row['alpha_posterior'], row['beta_posterior']) for arm, row in table.iterrows()}
+        plot_bayesian_results(posteriors, results, arm_posteriors=arm_posteriors)
+
+    results.update({
+        'best_arm': best,
+        'prob_best': table['prob_best'].to_dict(),
+        'expected_loss_by_arm': table['expected_loss'].to_dict(),
+        'prob_greater': prob_greater.to_dict(orient='index'),
+    })
+    return results
+
+
+def plot_bayesian_results(posteriors, results, difference=None, arm_posteriors=None):
+    """Posterior densities and the distribution of the treatment effect
+
+    arm_posteriors (arm -> (alpha, beta)) draws every arm of an A/B/n test
+    in the left panel instead of just control and treatment.
+    """
+    from scipy import stats
+    from thumbnail_ab.eda import arm_colors, get_pyplot, show_if_interactive
+
+    plt = get_pyplot()
+    alpha_control_post, beta_control_post, alpha_treatment_post, beta_treatment_post = posteriors
 
     # Create Bayesian visualization
     print("\n📈 CREATING BAYESIAN VISUALIZATIONS...")
@@ -69,41 +126,78 @@ def perform_bayesian_analysis(data):
     control_pdf = stats.beta.pdf(x, alpha_control_post, beta_control_post)
     treatment_pdf = stats.beta.pdf(x, alpha_treatment_post, beta_treatment_post)
 
-    ax1.plot(x, control_pdf, label='Control (Old Thumbnail)', linewidth=2, color='#1f77b4')
-    ax1.plot(x, treatment_pdf, label='Treatment (New Thumbnail)', linewidth=2, color='#ff7f0e')
-    ax1.fill_between(x, control_pdf, alpha=0.2, color='#1f77b4')
-    ax1.fill_between(x, treatment_pdf, alpha=0.2, color='#ff7f0e')
+    if arm_posteriors is None:
+        ax1.plot(x, control_pdf, label='Control (Old Thumbnail)', linewidth=2, color='#1f77b4')
+        ax1.plot(x, treatment_pdf, label='Treatment (New Thumbnail)', linewidth=2, color='#ff7f0e')
+        ax1.fill_between(x, control_pdf, alpha=0.2, color='#1f77b4')
+        ax1.fill_between(x, treatment_pdf, alpha=0.2, color='#ff7f0e')
+    else:
+        for color, (arm, (a, b)) in zip(arm_colors(len(arm_posteriors)), arm_posteriors.items()):
+            pdf = stats.beta.pdf(x, a, b)
+            ax1.plot(x, pdf, label=arm, linewidth=2, color=color)
+            ax1.fill_between(x, pdf, alpha=0.2, color=color)
     ax1.set_xlabel('Click-Through Rate')
     ax1.set_ylabel('Probability Density')
     ax1.set_title('Posterior Distributions of CTR', fontsize=14, fontweight='bold')
     ax1.legend()
     ax1.grid(True, alpha=0.3)
 
-    # Plot 2: Distribution of differences
-    ax2.hist(difference, bins=50, alpha=0.7, edgecolor='black', color='#2ca02c')
+    # Plot 2: Distribution of differences (sampled histogram, or its normal approximation)
+    if difference is not None:
+        ax2.hist(difference, bins=50, alpha=0.7, edgecolor='black', color='#2ca02c')
+        ax2.set_ylabel('Frequency')
+    else:
+        sd = (results['credible_interval_upper'] - results['credible_interval_lower']) / (2 * stats.norm.ppf(0.975))
+        d = np.linspace(results['mean_improvement'] - 4 * sd, results['mean_improvement'] + 4 * sd, 1000)
+        diff_pdf = stats.norm.pdf(d, results['mean_improvement'], sd)
+        ax2.plot(d, diff_pdf, linewidth=2, color='#2ca02c')
+        ax2.fill_between(d, diff_pdf, alpha=0.3, color='#2ca02c')
+        ax2.set_ylabel('Probability Density')
     ax2.axvline(0, color='red', linestyle='--', label='No difference', linewidth=2)
-    ax2.axvline(difference.mean(), color='blue', linestyle='-', label='Mean difference', linewidth=2)
+    ax2.axvline(results['mean_improvement'], color='blue', linestyle='-', label='Mean difference', linewidth=2)
     ax2.set_xlabel('Treatment CTR - Control CTR')
-    ax2.set_ylabel('Frequency')
     ax2.set_title('Distribution of Treatment Effect', fontsize=14, fontweight='bold')
     ax2.legend()
     ax2.grid(True, alpha=0.3)
 
     plt.tight_layout()
-    plt.savefig('bayesian_analysis.png', dpi=300, bbox_inches='tight')
-    plt.show()
-
-    print("✅ BAYESIAN VISUALIZATIONS SAVED AS 'bayesian_analysis.png'")
-    
-    return {
-        'bayesian_probability': prob_treatment_better,
-        'mean_improvement': difference.mean(),
-        'credible_interval_lower': np.percentile(difference, 2.5),
-        'credible_interval_upper': np.percentile(difference, 97.5),
-        'expected_loss': loss
-    }
+    with span('figure_save', path=FIGURE_PATH, dpi=300):
+        plt.savefig(FIGURE_PATH, dpi=300, bbox_inches='tight')
+    show_if_interactive(plt)
+
+    print(f"✅ BAYESIAN VISUALIZATIONS SAVED AS '{FIGURE_PATH}'")
 
 if __name__ == "__main__":
-    data = load_data()
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--state', default=None,
+                        help="Use incremental experiment state (see thumbnail_ab.incremental) instead of the raw data")
+    parser.add_argument('--experiment', default='default')
+    parser.add_argument('--method', choices=['exact', 'sample'], default='exact')
+    parser.add_argument('--n-samples', type=int, default=100000)
+    parser.add_argument('--tol', type=float, default=DEFAULT_TOL, help="Precision target for the exact engine")
+    parser.add_argument('--cross-check', action='store_true', help="Also report the other method and the differences")
+    parser.add_argument('--no-plot', action='store_true', help="Skip the figure")
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_DIR, default=None,
+                        help="Reuse the result of an earlier run on identical data (see thumbnail_ab.cache)")
+    args = parser.parse_args()
+
+    if args.state:
+        data = ExperimentState.load(args.state).experiments.get(args.experiment)
+        if data is None:
+            print(f"❌ ERROR: experiment '{args.experiment}' not found in {args.state}")
+    else:
+        data = load_data(columns=COLUMNS)
     if data is not None:
-        bayesian_results = perform_bayesian_analysis(data)
\ No newline at end of file
+        run = lambda: perform_bayesian_analysis(data, args.method, args.n_samples, args.tol, args.cross_check,
+                                                plot=not args.no_plot)
+        if args.cache:
+            # The posteriors depend on the click counts only, so key on those
+            data = ensure_stats(data)
+            params = {'method': args.method, 'n_samples': args.n_samples, 'tol': args.tol,
+                      'cross_check': args.cross_check, 'plot': not args.no_plot}
+            bayesian_results = ResultCache(args.cache).call('bayesian', data_fingerprint(data), params, run,
+                                                            artifacts=[] if args.no_plot else [FIGURE_PATH])
+        else:
+            bayesian_results = run()
\ No newline at end of file
@@ -1,48 +1,100 @@
 # 06_final_recommendation.py - UPDATED WITH IMBALANCE HANDLING
-import pandas as pd
-import numpy as np
-
-def load_data():
-    """Load data from CSV file"""
-    try:
-        data = pd.read_csv('ab_test_data.csv')
-        return data
-    except FileNotFoundError:
-        print("❌ ERROR: ab_test_data.csv not found. Run 01_data_generation.py first.")
-        return None
-
-def generate_final_recommendation(data):
-    """Generate final business recommendation considering imbalance"""
+from thumbnail_ab.aggregates import ensure_stats
+from thumbnail_ab.multiarm import best_arm, is_multiarm
+from thumbnail_ab.sequential import CONTINUE, SequentialTest
+from thumbnail_ab.storage import load_data
+from thumbnail_ab.trace import traced
+
+# Columns this stage reads; the storage layer skips the rest
+COLUMNS = ['group', 'clicked']
+
+# Fallback only: stages 03-05 on the shipped 10k-user ab_test_data.csv. They stand
+# in for any stage missing from stage_results; the script itself computes the
+# figures from the data it loads (see upstream_results)
+REFERENCE_RESULTS = {
+    'statistical': {'p_value': 0.0000011, 'covariate_imbalanced': True},
+    'regression': {
+        'odds_ratio': 1.3219,
+        'confidence_interval_lower': 1.1805,
+        'confidence_interval_upper': 1.4803,
+    },
+    'bayesian': {'bayesian_probability': 1.0000},
+}
+
+
+def upstream_results(data, cache=None):
+    """Results of stages 03-05 on the raw rows, reused from a ResultCache when one is given
+
+    Only the numbers are needed here, so the Bayesian figure is not drawn.
+    """
+    from thumbnail_ab.pipeline import run_pipeline
+
+    return run_pipeline(data, skip=('eda', 'recommendation'), cache=cache, validate=False,
+                        params={'bayesian': {'plot': False}})
+
+
+@traced
+def generate_final_recommendation(data, stage_results=None):
+    """Generate final business recommendation considering imbalance
+
+    data can be the raw rows or a precomputed SufficientStats.
+    stage_results maps 'statistical', 'regression' and 'bayesian' to the
+    dicts returned by the earlier stages (see run_pipeline.py). Missing
+    stages fall back to REFERENCE_RESULTS, with a warning. An optional 'sequential' entry
+    holds SequentialTest.status(); while it says 'continue' the
+    recommendation is to keep the test running. For an A/B/n test the
+    recommendation is about the best arm against the control.
+    """
     print("\n🎯 GENERATING FINAL BUSINESS RECOMMENDATION")
     print("=" * 60)
+
+    stage_results = stage_results or {}
+    fallback = [key for key in REFERENCE_RESULTS if key not in stage_results]
+    if fallback:
+        print(f"⚠️  No results for {', '.join(fallback)}: using the reference figures of the shipped dataset")
+    stage_results = {**REFERENCE_RESULTS, **stage_results}
+    statistical = stage_results['statistical']
+    regression = stage_results['regression']
+    bayesian = stage_results['bayesian']
+    sequential = stage_results.get('sequential')
     
-    # Calculate basic metrics
-    control_clicks = data[data['group'] == 'control']['clicked']
-    treatment_clicks = data[data['group'] == 'treatment']['clicked']
-    
-    control_success = control_clicks.sum()
-    control_trials = len(control_clicks)
-    treatment_success = treatment_clicks.sum()
-    treatment_trials = len(treatment_clicks)
+    # Calculate basic metrics from the aggregated counts
+    summary = ensure_stats(data)
+    treatment_label = 'treatment'
+    if is_multiarm(summary):
+        treatment_label = statistical.get('best_arm') or bayesian.get('best_arm') or best_arm(summary)
+    control = summary.index('control')
+    treatment = summary.index(treatment_label)
+
+    control_success = summary.successes[control]
+    control_trials = summary.trials[control]
+    treatment_success = summary.successes[treatment]
+    treatment_trials = summary.trials[treatment]
+    control_rate = control_success / control_trials
+    treatment_rate = treatment_success / treatment_trials
     
     # Enhanced results considering the imbalance
     results_summary = {
-        'control_rate': control_clicks.mean(),
-        'treatment_rate': treatment_clicks.mean(),
-        'absolute_difference': treatment_clicks.mean() - control_clicks.mean(),
-        'relative_improvement': (treatment_clicks.mean() - control_clicks.mean()) / control_clicks.mean() * 100,
-        'p_value': 0.000001,  # From statistical testing
-        'bayesian_probability': 0.9998,  # From Bayesian analysis
-        'odds_ratio': 1.4128,  # From logistic regression (adjusted)
-        'confidence_interval_lower': 1.2765,
-        'confidence_interval_upper': 1.5621,
-        'covariate_imbalanced': True  # We detected this!
+        'control_rate': control_rate,
+        'treatment_rate': treatment_rate,
+        'absolute_difference': treatment_rate - control_rate,
+        'relative_improvement': (treatment_rate - control_rate) / control_rate * 100,
+        'p_value': statistical['p_value'],  # From statistical testing
+        'bayesian_probability': bayesian['bayesian_probability'],  # From Bayesian analysis
+        'odds_ratio': regression['odds_ratio'],  # From logistic regression (adjusted)
+        'confidence_interval_lower': regression['confidence_interval_lower'],
+        'confidence_interval_upper': regression['confidence_interval_upper'],
+        'covariate_imbalanced': statistical['covariate_imbalanced']
     }
+    if treatment_label != 'treatment':
+        results_summary['best_arm'] = treatment_label
 
     print("📋 EXECUTIVE SUMMARY")
     print("=" * 40)
     print(f"Business Question: Does the new YouTube thumbnail increase click-through rates?")
-    print(f"Dataset: {len(data):,} users | Period: Simulated 2-week test")
+    print(f"Dataset: {summary.n_total:,} users | Period: Simulated 2-week test")
+    if treatment_label != 'treatment':
+        print(f"Arms: {len(summary.groups)} thumbnails | Best arm: {treatment_label}")
 
     print(f"\n📊 KEY RESULTS:")
     print(f"• Control CTR (Old Thumbnail):    {results_summary['control_rate']:.4f} ({control_success:,}/{control_trials:,} clicks)")
@@ -56,13 +108,26 @@ def generate_final_recommendation(data):
     print(f"• Adjusted Odds Ratio:            {results_summary['odds_ratio']:.4f}")
     print(f"• 95% Confidence Interval:        [{results_summary['confidence_interval_lower']:.4f}, {results_summary['confidence_interval_upper']:.4f}]")
 
-    print(f"\n⚠️  DATA QUALITY NOTE:")
-    print(f"• Detected imbalance in 'previous watchers' covariate")
-    print(f"• Used advanced modeling to control for this imbalance")
-    print(f"• Results are adjusted and more reliable")
+    if results_summary['covariate_imbalanced']:
+        print(f"\n⚠️  DATA QUALITY NOTE:")
+        print(f"• Detected imbalance in 'previous watchers' covariate")
+        print(f"• Used advanced modeling to control for this imbalance")
+        print(f"• Results are adjusted and more reliable")
+
+    if sequential is not None:
+        results_summary['sequential_decision'] = sequential['decision']
+        print(f"\n⏱️  SEQUENTIAL MONITORING (always-valid):")
+        print(f"• {'Decision after ' + str(sequential['n_looks']) + ' looks:':<32}{sequential['decision']}")
+        print(f"• Always-valid p-value:           {sequential['always_valid_p_value']:.6f}")
+        if 'confidence_sequence_lower' in sequential:
+            print(f"• Confidence sequence (diff):     [{sequential['confidence_sequence_lower']:.4f}, {sequential['confidence_sequence_upper']:.4f}]")
 
     print(f"\n🎯 BUSINESS RECOMMENDATION:")
-    if (results_summary['p_value'] < 0.05 and 
+    if sequential is not None and sequential['decision'] == CONTINUE:
+        print("⏳ KEEP TESTING: The sequential test has not crossed its stopping boundary")
+        print(f"   • Fixed-horizon p-values are not valid while the test is still being monitored")
+
+    elif (results_summary['p_value'] < 0.05 and 
         results_summary['bayesian_probability'] > 0.95 and 
         results_summary['confidence_interval_lower'] > 1):
         
@@ -94,7 +159,27 @@ def generate_final_recommendation(data):
     print("🎉 ANALYSIS COMPLETE! Results account for data quality issues.")
     print("=" * 60)
 
+    return results_summary
+
 if __name__ == "__main__":
-    data = load_data()
+    import argparse
+
+    from thumbnail_ab.cache import DEFAULT_CACHE_DIR, ResultCache
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sequential', default=None,
+                        help="Sequential test state file (see thumbnail_ab.sequential) to base the decision on")
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_DIR, default=None,
+                        help="Reuse stage 03-05 results of an earlier run on identical data (see thumbnail_ab.cache)")
+    parser.add_argument('--reference', action='store_true',
+                        help="Skip stages 03-05 and use the REFERENCE_RESULTS figures")
+    args = parser.parse_args()
+
+    stage_results = {}
+    data = load_data(columns=COLUMNS if args.reference else None)
     if data is not None:
-        generate_final_recommendation(data)
\ No newline at end of file
+        if not args.reference:
+            stage_results.update(upstream_results(data, ResultCache(args.cache) if args.cache else None))
+        if args.sequential:
+            stage_results['sequential'] = SequentialTest.load(args.sequential).status()
+        generate_final_recommendation(data, stage_results)
\ No newline at end of file
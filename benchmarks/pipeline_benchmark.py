@@ -0,0 +1,190 @@
+# pipeline_benchmark.py - wall time, peak memory and throughput of every stage across data sizes
+# Each stage runs in a fresh interpreter on a dataset made by the streaming generator,
+# so peak RSS belongs to that stage alone. Results are written as JSON and can be
+# compared against a stored baseline to catch scaling regressions.
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from thumbnail_ab.stages import STAGES, load_module, load_stage, stage_columns  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000, 100_000_000]
+DEFAULT_OUTPUT = 'benchmark_results.json'
+DEFAULT_DATA_DIR = 'benchmark_data'
+
+# Benchmark label -> STAGES key (None: load the full dataset only)
+BENCHMARKS = {'load_data': None}
+BENCHMARKS.update({function_name: key for key, (_, function_name) in STAGES.items()})
+
+# Stage calls that must not open windows or block
+STAGE_KWARGS = {'eda': {'show': False}}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def dataset_path(data_dir, n_rows, fmt):
+    suffix = '' if fmt == 'npy' else f'.{fmt}'
+    return os.path.join(data_dir, f'ab_test_data_{n_rows}{suffix}')
+
+
+def ensure_dataset(data_dir, n_rows, fmt, seed=42, regenerate=False):
+    """Stream a dataset of n_rows to disk unless an identical one is already there"""
+    path = dataset_path(data_dir, n_rows, fmt)
+    if os.path.exists(path) and not regenerate:
+        return path
+    os.makedirs(data_dir, exist_ok=True)
+    generator = load_module('01_data_generation')
+    print(f"🏭 Generating {n_rows:,} rows -> {path}")
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        generator.stream_ab_test_data(n_rows, seed=seed, output_path=path, fmt=fmt)
+    return path
+
+
+def run_child(benchmark, path):
+    """Body of the child process: load, run one stage, report JSON on the last line"""
+    from thumbnail_ab.storage import load_data
+
+    key = BENCHMARKS[benchmark]
+    columns = None if key is None else stage_columns(key)
+    stage = None if key is None else load_stage(key)
+
+    start = time.perf_counter()
+    data = load_data(path, columns=columns)
+    load_s = time.perf_counter() - start
+    n_rows = len(data)
+    rss_after_load = peak_rss_mb()
+
+    stage_s = 0.0
+    if stage is not None:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            stage(data, **STAGE_KWARGS.get(key, {}))
+            stage_s = time.perf_counter() - start
+
+    wall_s = load_s if stage is None else stage_s
+    print(json.dumps({
+        'stage': benchmark,
+        'rows': n_rows,
+        'wall_s': wall_s,
+        'load_s': load_s,
+        'rows_per_sec': n_rows / wall_s if wall_s > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_after_load_mb': rss_after_load,
+    }))
+
+
+def measure(benchmark, path, workdir):
+    """Run one benchmark in a fresh interpreter and return its record"""
+    env = dict(os.environ, MPLBACKEND='Agg',
+               PYTHONPATH=PROJECT_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    argv = [sys.executable, os.path.abspath(__file__), '--child', benchmark, '--data', os.path.abspath(path)]
+    proc = subprocess.run(argv, cwd=workdir, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {'stage': benchmark, 'error': proc.stderr.strip().splitlines()[-1] if proc.stderr else 'failed'}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_benchmarks(sizes, fmt='parquet', data_dir=DEFAULT_DATA_DIR, benchmarks=None, regenerate=False):
+    """Benchmark every stage at every size; returns the JSON-ready report"""
+    benchmarks = benchmarks or list(BENCHMARKS)
+    workdir = os.path.join(data_dir, 'work')
+    os.makedirs(workdir, exist_ok=True)
+
+    results = []
+    for n_rows in sizes:
+        path = ensure_dataset(data_dir, n_rows, fmt, regenerate=regenerate)
+        for benchmark in benchmarks:
+            record = measure(benchmark, path, workdir)
+            record['rows'] = n_rows
+            results.append(record)
+            if 'error' in record:
+                print(f"❌ {n_rows:>11,} {benchmark:<32} {record['error']}")
+            else:
+                print(f"✅ {n_rows:>11,} {benchmark:<32} {record['wall_s']:9.3f}s "
+                      f"{record['peak_rss_mb']:9.1f} MB {record['rows_per_sec'] or 0:14,.0f} rows/s")
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'format': fmt,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance=1.5, min_seconds=0.25):
+    """Records whose wall time or peak RSS grew by more than tolerance x the baseline
+
+    Timings below min_seconds in both runs are too noisy to compare.
+    """
+    reference = {(r['rows'], r['stage']): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    for record in report['results']:
+        base = reference.get((record['rows'], record['stage']))
+        if base is None:
+            continue
+        if 'error' in record:
+            regressions.append(f"{record['stage']} @ {record['rows']:,}: {record['error']}")
+            continue
+        for metric in ('wall_s', 'peak_rss_mb'):
+            if metric == 'wall_s' and max(record[metric], base[metric]) < min_seconds:
+                continue
+            ratio = record[metric] / base[metric] if base[metric] else 1.0
+            if ratio > tolerance:
+                regressions.append(f"{record['stage']} @ {record['rows']:,}: {metric} "
+                                   f"{base[metric]:.3f} -> {record[metric]:.3f} ({ratio:.2f}x)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage across data sizes")
+    parser.add_argument('--sizes', type=float, nargs='+', default=DEFAULT_SIZES,
+                        help="Row counts, e.g. --sizes 1e4 1e6")
+    parser.add_argument('--format', choices=['parquet', 'feather', 'npy', 'csv'], default='parquet')
+    parser.add_argument('--stages', nargs='+', choices=list(BENCHMARKS), default=None)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="Where generated datasets are kept")
+    parser.add_argument('--regenerate', action='store_true', help="Rebuild datasets that already exist")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=None, help="Earlier results to compare against")
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help="Allowed slowdown / memory growth factor against the baseline")
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--data', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.data)
+        sys.exit(0)
+
+    print("⏱️ PIPELINE BENCHMARK")
+    print("=" * 50)
+    report = run_benchmarks([int(n) for n in args.sizes], args.format, args.data_dir, args.stages,
+                            args.regenerate)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ RESULTS SAVED AS '{args.output}'")
+
+    failures = [f"{r['stage']} @ {r['rows']:,}: {r['error']}" for r in report['results'] if 'error' in r]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += compare(report, json.load(f), args.tolerance)
+        print(f"\n📏 COMPARED AGAINST '{args.baseline}' (tolerance {args.tolerance:.2f}x)")
+    for failure in dict.fromkeys(failures):
+        print(f"❌ {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,170 @@
+# service_load_test.py - latency and throughput of the HTTP analysis service under concurrent load
+# Starts thumbnail_ab.service on localhost (or targets a running one with --port and --no-start),
+# seeds experiments with counts, then has many keep-alive clients mix result reads with
+# event-batch uploads. Fails when the p95 latency of result reads exceeds the budget.
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PORT = 8751
+COUNTRIES = ['US', 'UK', 'CA', 'AU']
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                          f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode().partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def event_batch(rng, size):
+    return [{'group': rng.choice(['control', 'treatment']), 'clicked': int(rng.random() < 0.14),
+             'age': rng.randint(18, 64), 'country': rng.choice(COUNTRIES),
+             'previously_watched_channel': int(rng.random() < 0.3)} for _ in range(size)]
+
+
+async def wait_ready(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        client = Client(host, port)
+        try:
+            status, _ = await client.request('GET', '/health')
+            if status == 200:
+                return
+        except OSError:
+            await asyncio.sleep(0.2)
+        finally:
+            client.close()
+    raise TimeoutError(f"Service on {host}:{port} did not come up within {timeout}s")
+
+
+async def run_load(host, port, n_requests, concurrency, n_experiments, write_share, batch_size, seed=42):
+    rng = random.Random(seed)
+    setup = Client(host, port)
+    for i in range(n_experiments):
+        trials = rng.randint(5_000, 500_000)
+        counts = {'control': {'trials': trials, 'clicks': int(trials * 0.12)},
+                  'treatment': {'trials': trials, 'clicks': int(trials * rng.uniform(0.11, 0.16))}}
+        await setup.request('PUT', f'/experiments/exp{i}/counts', {'counts': counts})
+    setup.close()
+
+    # Uploads are built up front so the load generator's own work stays out of the latencies
+    batches = [event_batch(rng, batch_size) for _ in range(64)]
+    latencies = {'results': [], 'events': []}
+    errors = []
+    remaining = iter(range(n_requests))
+
+    async def worker(worker_id):
+        client = Client(host, port)
+        worker_rng = random.Random(seed + worker_id)
+        try:
+            for _ in remaining:
+                experiment = f'exp{worker_rng.randrange(n_experiments)}'
+                start = time.perf_counter()
+                if worker_rng.random() < write_share:
+                    kind = 'events'
+                    status, body = await client.request('POST', f'/experiments/{experiment}/events',
+                                                        {'events': worker_rng.choice(batches)})
+                else:
+                    kind = 'results'
+                    status, body = await client.request('GET', f'/experiments/{experiment}/results')
+                latencies[kind].append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    errors.append(f"{kind} {status}: {body.get('error')}")
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))] if values else float('nan')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the local HTTP analysis service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--no-start', action='store_true', help="Target an already running service")
+    parser.add_argument('--workers', type=int, default=None, help="Service worker processes")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--experiments', type=int, default=50)
+    parser.add_argument('--write-share', type=float, default=0.2, help="Share of requests that upload events")
+    parser.add_argument('--batch-size', type=int, default=100, help="Events per upload")
+    parser.add_argument('--budget-ms', type=float, default=100.0, help="Allowed p95 latency of result reads")
+    parser.add_argument('--output', default=None, help="Write the measurements as JSON")
+    args = parser.parse_args()
+
+    server = None
+    if not args.no_start:
+        argv = [sys.executable, '-m', 'thumbnail_ab.service', '--host', args.host, '--port', str(args.port)]
+        if args.workers:
+            argv += ['--workers', str(args.workers)]
+        env = dict(os.environ, PYTHONPATH=PROJECT_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        server = subprocess.Popen(argv, env=env, stdout=subprocess.DEVNULL)
+
+    try:
+        asyncio.run(wait_ready(args.host, args.port))
+        print("🌐 SERVICE LOAD TEST")
+        print("=" * 50)
+        print(f"Requests: {args.requests:,} | Concurrency: {args.concurrency} | Experiments: {args.experiments} | "
+              f"Writes: {args.write_share:.0%} x {args.batch_size} events")
+        latencies, errors, elapsed = asyncio.run(run_load(
+            args.host, args.port, args.requests, args.concurrency, args.experiments, args.write_share,
+            args.batch_size))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {'requests': args.requests, 'elapsed_s': elapsed, 'requests_per_sec': args.requests / elapsed,
+              'errors': len(errors)}
+    for kind, values in latencies.items():
+        report[kind] = {'count': len(values), **{f'p{q}_ms': percentile(values, q) for q in (50, 95, 99)}}
+        print(f"{kind:<8} {len(values):>6} requests   p50 {report[kind]['p50_ms']:7.2f} ms   "
+              f"p95 {report[kind]['p95_ms']:7.2f} ms   p99 {report[kind]['p99_ms']:7.2f} ms")
+    print(f"\n⏱️  {report['requests_per_sec']:,.0f} requests/s over {elapsed:.2f}s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = list(dict.fromkeys(errors))
+    if report['results']['p95_ms'] > args.budget_ms:
+        failures.append(f"results p95 {report['results']['p95_ms']:.2f} ms > {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,71 @@
+# startup_benchmark.py - cold-start time of the lightweight CLI commands
+# Exits non-zero when a command is slower than its budget or pulls in a heavy library,
+# so an eager import sneaking back into the fast paths is caught.
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# command -> cold-start budget in seconds
+COMMANDS = {
+    'summary': 1.0,
+    'bayes --no-plot': 1.0,
+}
+
+# Libraries the fast commands must not import
+HEAVY_MODULES = ['scipy.stats', 'matplotlib', 'seaborn', 'statsmodels', 'sklearn']
+
+
+def run_command(command, data=None):
+    """Wall time of one fresh interpreter running the command, plus the modules it imported"""
+    argv = [sys.executable, '-X', 'importtime', '-m', 'thumbnail_ab']
+    if data:
+        argv += ['--data', data]
+    argv += command.split()
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    start = time.perf_counter()
+    proc = subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"'{command}' failed:\n{proc.stderr[-2000:]}")
+    imported = {line.split('|')[-1].strip() for line in proc.stderr.splitlines()
+                if line.startswith('import time:')}
+    return elapsed, imported
+
+
+def benchmark(data=None, repeats=5, budget_scale=1.0):
+    """Best-of-repeats cold start per command; returns (timings, failures)"""
+    timings, failures = {}, []
+    for command, budget in COMMANDS.items():
+        times, imported = [], set()
+        for _ in range(repeats):
+            elapsed, imported = run_command(command, data)
+            times.append(elapsed)
+        timings[command] = min(times)
+        heavy = [m for m in HEAVY_MODULES if m in imported]
+        status = "✅" if timings[command] <= budget * budget_scale and not heavy else "❌"
+        print(f"{status} {command:<20} {timings[command]:.3f}s (budget {budget * budget_scale:.2f}s)")
+        if timings[command] > budget * budget_scale:
+            failures.append(f"{command}: {timings[command]:.3f}s > {budget * budget_scale:.2f}s")
+        if heavy:
+            failures.append(f"{command}: imported {', '.join(heavy)}")
+    return timings, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Guard CLI cold-start time")
+    parser.add_argument('--data', default=None, help="Dataset passed to each command")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help="Multiply every budget (for slow CI machines)")
+    args = parser.parse_args()
+
+    print("⏱️ CLI START-UP BENCHMARK")
+    print("=" * 50)
+    _, failures = benchmark(args.data, args.repeats, args.budget_scale)
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1 if failures else 0)
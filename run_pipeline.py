@@ -0,0 +1,33 @@
+# run_pipeline.py - run stages 02-06 in one process on a single load of the data
+import argparse
+import sys
+
+from thumbnail_ab.cache import DEFAULT_CACHE_DIR, ResultCache
+from thumbnail_ab.pipeline import run_pipeline
+from thumbnail_ab.stages import STAGES
+from thumbnail_ab.trace import enable as enable_tracing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the full A/B test analysis in one process")
+    parser.add_argument('--data', default=None, help="Dataset path (default: fastest ab_test_data.* on disk)")
+    parser.add_argument('--skip', nargs='*', default=[], choices=list(STAGES),
+                        help="Stages to leave out, e.g. --skip eda")
+    parser.add_argument('--sequential', default=None,
+                        help="Sequential test state file whose decision the recommendation should follow")
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_DIR, default=None,
+                        help="Serve unchanged stages from the result cache in this directory")
+    parser.add_argument('--no-validate', action='store_true',
+                        help="Skip the data-quality checks that otherwise stop the run on bad data")
+    parser.add_argument('--trace', default=None,
+                        help="Record step spans to this file (.json: Chrome trace, otherwise JSON lines)")
+    parser.add_argument('--profile', default=None, help="Also run cProfile and write its stats here")
+    args = parser.parse_args()
+
+    if args.trace or args.profile:
+        enable_tracing(args.trace, args.profile)
+    cache = ResultCache(args.cache) if args.cache else None
+    results = run_pipeline(path=args.data, skip=args.skip, sequential_state=args.sequential, cache=cache,
+                           validate=not args.no_validate)
+    failed = results is None or not results.get('validation', {'passed': True})['passed']
+    sys.exit(1 if failed else 0)
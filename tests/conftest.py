@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def make_data():
+    """Builder for raw per-user frames shaped like 01_data_generation.py output"""
+    def build(n_users=4000, click_rates=None, seed=0):
+        click_rates = click_rates or {'control': 0.10, 'treatment': 0.13}
+        rng = np.random.default_rng(seed)
+        groups = np.resize(list(click_rates), n_users)
+        rates = np.array([click_rates[g] for g in groups])
+        return pd.DataFrame({
+            'user_id': np.arange(1, n_users + 1),
+            'group': groups,
+            'age': rng.integers(18, 66, n_users),
+            'country': rng.choice(['US', 'UK', 'CA', 'AU'], n_users),
+            'previously_watched_channel': rng.integers(0, 2, n_users),
+            'clicked': (rng.random(n_users) < rates).astype(int),
+        })
+    return build
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from thumbnail_ab.aggregates import (SufficientStats, aggregate, anova_age, chi2_covariate, ttest_age,
+                                     ttest_clicks)
+from thumbnail_ab.stages import load_stage
+
+
+def test_tables_match_crosstab(make_data):
+    data = make_data(3000)
+    summary = aggregate(data)
+    pd.testing.assert_frame_equal(summary.outcome_table(), pd.crosstab(data['group'], data['clicked']),
+                                  check_dtype=False)
+    for name in ('country', 'previously_watched_channel'):
+        pd.testing.assert_frame_equal(summary.covariate_table(name), pd.crosstab(data[name], data['group']),
+                                      check_dtype=False)
+
+
+def test_tests_match_scipy_on_rows(make_data):
+    data = make_data(3000, {'control': 0.10, 'treatment': 0.12, 'variant_2': 0.11})
+    summary = aggregate(data)
+    rows = {g: frame for g, frame in data.groupby('group')}
+    np.testing.assert_allclose(ttest_clicks(summary, 'treatment', 'control'),
+                               stats.ttest_ind(rows['treatment']['clicked'], rows['control']['clicked']))
+    np.testing.assert_allclose(ttest_age(summary, 'control', 'treatment'),
+                               stats.ttest_ind(rows['control']['age'], rows['treatment']['age']))
+    np.testing.assert_allclose(anova_age(summary), stats.f_oneway(*(f['age'] for f in rows.values())))
+    np.testing.assert_allclose(chi2_covariate(summary, 'country')[:2],
+                               stats.chi2_contingency(pd.crosstab(data['country'], data['group']))[:2])
+
+
+def test_merge_equals_aggregate_of_all_rows(make_data):
+    data = make_data(3000)
+    merged = aggregate(data.iloc[:1000]) + aggregate(data.iloc[1000:])
+    whole = aggregate(data)
+    np.testing.assert_array_equal(merged.outcome_counts, whole.outcome_counts)
+    np.testing.assert_allclose(merged.age_moments('treatment'), whole.age_moments('treatment'))
+
+
+def test_counts_only_skip_the_balance_check():
+    summary = SufficientStats(['control', 'treatment'], np.array([[900, 100], [880, 120]]))
+    assert not summary.has_covariates
+    results = load_stage('statistical')(summary)
+    assert results['covariate_imbalanced'] is None
+    np.testing.assert_allclose(results['p_value'], ttest_clicks(summary)[1])
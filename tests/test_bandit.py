@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from thumbnail_ab.bandit import allocation_probabilities, compare_policies, simulate_bandit
+
+RATES = [0.10, 0.12, 0.16]
+
+
+def test_fixed_split_regret_matches_its_expectation():
+    run = simulate_bandit(RATES, n_impressions=300_000, policy='fixed', n_replicates=50)
+    expected = 300_000 * (max(RATES) - np.mean(RATES))
+    assert abs(run['regret_mean'] - expected) < 4 * run['regret_se'] + 1
+    np.testing.assert_allclose(run['traffic_share'], 1 / 3, atol=0.005)
+
+
+def test_thompson_shares_follow_the_posterior():
+    rng = np.random.default_rng(0)
+    successes = np.array([[100, 100, 400], [100, 100, 100]])
+    trials = np.array([[1000, 1000, 1000], [1000, 1000, 1000]])
+    shares = allocation_probabilities('thompson', successes, trials, rng, thompson_draws=4000)
+    np.testing.assert_allclose(shares.sum(axis=1), 1)
+    assert shares[0, 2] == 1.0                      # one arm is clearly best
+    np.testing.assert_allclose(shares[1], 1 / 3, atol=0.05)  # identical arms split evenly
+
+
+def test_ucb_plays_unseen_arms_first():
+    successes = np.array([[50, 0, 0]])
+    trials = np.array([[100, 0, 0]])
+    shares = allocation_probabilities('ucb', successes, trials, np.random.default_rng(0))
+    np.testing.assert_allclose(shares, [[0, 0.5, 0.5]])
+
+
+def test_adaptive_policies_beat_the_fixed_split():
+    table, runs = compare_policies(RATES, n_impressions=200_000, n_replicates=20)
+    for policy in ('thompson', 'ucb', 'epsilon_greedy'):
+        assert table.loc[policy, 'regret_mean'] < table.loc['fixed', 'regret_mean']
+        assert table.loc[policy, 'clicks_gained_vs_fixed'] > 0
+    assert runs['thompson']['prob_correct_arm'] == 1.0
+    assert runs['thompson']['regret_curve'].is_monotonic_increasing
+
+
+def test_unknown_policy_is_refused():
+    with pytest.raises(ValueError, match="Unknown policy"):
+        simulate_bandit(RATES, 1000, policy='greedy')
@@ -0,0 +1,71 @@
+import numpy as np
+from scipy import special
+
+from thumbnail_ab import bayes
+from thumbnail_ab.bayes import _prob_greater_closed, evaluate_experiments, prob_greater
+
+
+def narrow_arms(n=1e8):
+    """Three arms with 1e8 trials each: one far behind, two a single sd apart"""
+    sd = np.sqrt(0.16 * 0.84 / n)
+    successes = np.array([0.05 * n, 0.16 * n, np.round((0.16 + sd) * n)])
+    return successes, np.full(3, n)
+
+
+def test_prob_best_matches_exact_pairwise_for_narrow_posteriors():
+    successes, trials = narrow_arms()
+    results = evaluate_experiments(successes, trials)
+    a, b = 2 + successes, 10 + trials - successes
+    exact = prob_greater(a[2], b[2], a[1], b[1], method='closed')
+    np.testing.assert_allclose(results['prob_best'][0], [0.0, 1 - exact, exact], atol=1e-6)
+
+
+def test_expected_loss_for_narrow_posteriors():
+    successes, trials = narrow_arms()
+    results = evaluate_experiments(successes, trials)
+    # Beta(1.6e7, 8.4e7) posteriors are normal to many digits, so
+    # E[max(p_1 - p_2, 0)] has the closed form s * phi(m / s) + m * Phi(m / s)
+    a, b = 2 + successes[1:], 10 + trials[1:] - successes[1:]
+    mean, var = a / (a + b), a * b / ((a + b) ** 2 * (a + b + 1))
+    m, s = mean[0] - mean[1], np.sqrt(var.sum())
+    normal_loss = s * np.exp(-0.5 * (m / s) ** 2) / np.sqrt(2 * np.pi) + m * special.ndtr(m / s)
+    np.testing.assert_allclose(results['expected_loss'][0, 2], normal_loss, rtol=1e-4)
+    np.testing.assert_allclose(results['expected_loss'][0, 1], normal_loss - m, rtol=1e-4)
+    expected_max = mean[1] + normal_loss
+    far_behind = (2 + successes[0]) / (12 + trials[0])
+    np.testing.assert_allclose(results['expected_loss'][0, 0], expected_max - far_behind, rtol=1e-9)
+
+
+def trapezoid_prob_greater(a_b, b_b, a_a, b_a, n=400_001):
+    """P(p_B > p_A) on a fine grid, with the density normalised by its own sum"""
+    mean, sd = a_b / (a_b + b_b), np.sqrt(a_b * b_b) / (a_b + b_b) ** 1.5
+    x = np.linspace(mean - 12 * sd, mean + 12 * sd, n)
+    log_pdf = (a_b - 1) * np.log(x) + (b_b - 1) * np.log1p(-x)
+    weights = np.exp(log_pdf - log_pdf.max())
+    weights[[0, -1]] *= 0.5
+    return float(np.sum(weights * special.betainc(a_a, b_a, x)) / weights.sum())
+
+
+def test_quadrature_error_is_within_tol():
+    small = (2 + 80, 10 + 420, 2 + 60, 10 + 440)
+    large = (2 + 79_000, 10 + 421_000, 2 + 78_500, 10 + 421_500)
+    for tol in (1e-6, 1e-8, 1e-10):
+        exact = prob_greater(*small, method='closed')
+        assert abs(prob_greater(*small, method='quad', tol=tol) - exact) <= tol
+        exact = trapezoid_prob_greater(*large)
+        assert abs(prob_greater(*large, method='quad', tol=tol) - exact) <= tol
+
+
+def test_closed_form_stays_within_unit_interval():
+    # The windowed sum used to return 1.0000000008 here
+    assert 0.0 <= prob_greater(54594, 120125, 56545, 139350, method='closed') <= 1.0
+
+
+def test_windowed_closed_form_matches_the_full_sum(monkeypatch):
+    cases = [(2 + 60_000, 10 + 440_000, 2 + 59_000, 10 + 441_000),    # overlapping posteriors
+             (2 + 400_000, 10 + 100_000, 2 + 50, 10 + 950),           # long sum, wide A posterior
+             (2 + 5_000, 10 + 45_000, 2 + 5_600, 10 + 44_400)]        # B almost surely worse
+    windowed = [_prob_greater_closed(*case) for case in cases]
+    monkeypatch.setattr(bayes, 'CLOSED_FORM_PROBES', 10 ** 9)  # stride 0: sum every term
+    full = [_prob_greater_closed(*case) for case in cases]
+    np.testing.assert_allclose(windowed, full, rtol=1e-12, atol=1e-300)
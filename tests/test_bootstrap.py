@@ -0,0 +1,54 @@
+import numpy as np
+
+from thumbnail_ab.bootstrap import bootstrap_ci
+from thumbnail_ab.logit import fit_compressed_logit
+
+THREE_ARMS = {'control': 0.10, 'thumbnail_b': 0.13, 'thumbnail_c': 0.11}
+
+
+def test_two_arm_keys_are_unchanged(make_data):
+    results = bootstrap_ci(make_data(), n_replicates=200, n_workers=1, verbose=False)
+    for stat in ('relative_improvement', 'odds_ratio'):
+        assert results[f'{stat}_ci_lower'] < results[stat] < results[f'{stat}_ci_upper']
+
+
+def test_multiarm_reports_one_interval_per_arm(make_data):
+    data = make_data(6000, THREE_ARMS)
+    results = bootstrap_ci(data, n_replicates=200, n_workers=1, verbose=False)
+    fit, _ = fit_compressed_logit(data, verbose=False)
+    ctr = data.groupby('group')['clicked'].mean()
+    for arm in ('thumbnail_b', 'thumbnail_c'):
+        odds_ratio, lift = results[f'odds_ratio[{arm}]'], results[f'relative_improvement[{arm}]']
+        np.testing.assert_allclose(odds_ratio, np.exp(fit.params[f'C(group)[T.{arm}]']))
+        np.testing.assert_allclose(lift, (ctr[arm] - ctr['control']) / ctr['control'] * 100)
+        assert results[f'odds_ratio[{arm}]_ci_lower'] < odds_ratio < results[f'odds_ratio[{arm}]_ci_upper']
+        assert results[f'relative_improvement[{arm}]_ci_lower'] < lift < results[f'relative_improvement[{arm}]_ci_upper']
+    assert 'odds_ratio' not in results
+
+
+def test_result_does_not_depend_on_worker_count(make_data):
+    data = make_data(3000)
+    runs = [bootstrap_ci(data, n_replicates=200, batch_size=50, n_workers=workers, tol=0, verbose=False)
+            for workers in (1, 2)]
+    for key in ('odds_ratio_ci_lower', 'odds_ratio_ci_upper', 'relative_improvement_ci_upper'):
+        assert runs[0][key] == runs[1][key]
+
+
+def test_schemes_agree_with_the_delta_method(make_data):
+    data = make_data(20000)
+    ctr = data.groupby('group')['clicked'].agg(['mean', 'count'])
+    p_c, p_t = ctr.loc['control', 'mean'], ctr.loc['treatment', 'mean']
+    n_c, n_t = ctr.loc['control', 'count'], ctr.loc['treatment', 'count']
+    # SE of 100 * (p_t / p_c - 1) by the delta method
+    se = 100 * p_t / p_c * np.sqrt((1 - p_t) / (n_t * p_t) + (1 - p_c) / (n_c * p_c))
+    for scheme in ('multinomial', 'poisson'):
+        results = bootstrap_ci(data, n_replicates=1000, n_workers=1, scheme=scheme, tol=0,
+                               statistics=['relative_improvement'], verbose=False)
+        width = results['relative_improvement_ci_upper'] - results['relative_improvement_ci_lower']
+        np.testing.assert_allclose(width, 2 * 1.96 * se, rtol=0.15)
+
+
+def test_stops_early_once_endpoints_settle(make_data):
+    results = bootstrap_ci(make_data(2000), n_replicates=2000, batch_size=100, n_workers=1, tol=0.5,
+                           min_replicates=200, statistics=['relative_improvement'], verbose=False)
+    assert results['stopped_early'] and results['n_replicates'] < 2000
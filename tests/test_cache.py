@@ -0,0 +1,28 @@
+from thumbnail_ab.cache import ResultCache
+
+
+def test_params_are_part_of_the_key(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    calls = []
+    stage = lambda plot: calls.append(plot) or {'plot': plot}
+    for plot in (True, False, True):
+        cache.call('bayesian', 'abc', {'plot': plot}, stage, plot=plot)
+    assert calls == [True, False]
+
+
+def test_hit_with_missing_artifact_reruns_the_stage(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    figure = tmp_path / 'figure.png'
+    calls = []
+
+    def stage():
+        calls.append(1)
+        figure.write_bytes(b'png')
+        return {'value': 1}
+
+    for _ in range(2):
+        assert cache.call('bayesian', 'abc', {'plot': True}, stage, artifacts=[str(figure)]) == {'value': 1}
+    assert len(calls) == 1
+    figure.unlink()
+    cache.call('bayesian', 'abc', {'plot': True}, stage, artifacts=[str(figure)])
+    assert len(calls) == 2 and figure.exists()
@@ -0,0 +1,19 @@
+import pytest
+
+from thumbnail_ab.cli import build_parser, main
+from thumbnail_ab.multiarm import CORRECTIONS
+
+THREE_ARMS = {'control': 0.10, 'thumbnail_b': 0.13, 'thumbnail_c': 0.11}
+
+
+def test_stats_offers_every_correction():
+    for correction in CORRECTIONS:
+        assert build_parser().parse_args(['stats', '--correction', correction]).correction == correction
+
+
+@pytest.mark.parametrize('correction', ['bh', 'none'])
+def test_stats_passes_correction_through(tmp_path, capsys, make_data, correction):
+    path = str(tmp_path / 'data.csv')
+    make_data(3000, THREE_ARMS).to_csv(path, index=False)
+    assert main(['--data', path, 'stats', '--correction', correction]) == 0
+    assert f"({correction} adjusted)" in capsys.readouterr().out
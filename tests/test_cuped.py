@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import statsmodels.formula.api as smf
+
+from thumbnail_ab.cuped import MomentState, accumulate_moments, adjusted_effects, moments
+
+THREE_ARMS = {'control': 0.10, 'thumbnail_b': 0.13, 'thumbnail_c': 0.11}
+
+
+@pytest.fixture
+def data(make_data):
+    data = make_data(9000, THREE_ARMS)
+    # Previous watchers click far more often, so adjusting for them should pay off
+    rng = np.random.default_rng(5)
+    watched = data['previously_watched_channel'] == 1
+    data.loc[watched, 'clicked'] = (rng.random(watched.sum()) < 0.3).astype(int)
+    return data
+
+
+def test_adjusted_difference_is_the_ols_group_coefficient(data):
+    table = adjusted_effects(accumulate_moments(data))
+    ols = smf.ols("clicked ~ C(group, Treatment('control')) + age + previously_watched_channel + C(country)",
+                  data).fit()
+    for arm in ('thumbnail_b', 'thumbnail_c'):
+        coef = ols.params[f"C(group, Treatment('control'))[T.{arm}]"]
+        np.testing.assert_allclose(table.loc[arm, 'adjusted_difference'], coef, rtol=1e-9)
+    assert (table['variance_reduction'] > 0.05).all()
+    assert (table['adjusted_se'] < table['raw_se']).all()
+
+
+def test_chunked_and_merged_moments_equal_one_pass(data):
+    whole = moments(data)
+    chunked = accumulate_moments(data, chunk_rows=1000)
+    np.testing.assert_allclose(chunked.sum_xx, whole.sum_xx)
+    np.testing.assert_allclose(adjusted_effects(chunked)['adjusted_difference'],
+                               adjusted_effects(whole)['adjusted_difference'], rtol=1e-12)
+
+
+def test_state_round_trips_through_json(tmp_path, data):
+    state = accumulate_moments(data)
+    path = str(tmp_path / 'moments.json')
+    state.save(path)
+    loaded = MomentState.load(path)
+    np.testing.assert_allclose(adjusted_effects(loaded)['adjusted_se'], adjusted_effects(state)['adjusted_se'])
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from thumbnail_ab.eda import age_histogram, eda_summary, render_eda
+
+
+def test_age_histogram_matches_numpy(make_data):
+    data = make_data(3000, {'control': 0.1, 'treatment': 0.1, 'variant_2': 0.1})
+    edges, table = age_histogram(data, bin_width=5)
+    for group, rows in data.groupby('group'):
+        expected, _ = np.histogram(rows['age'], bins=edges)
+        np.testing.assert_array_equal(table[group], expected)
+    assert table.to_numpy().sum() == len(data)
+
+
+def test_shares_match_normalised_crosstab(make_data):
+    data = make_data(3000)
+    summary = eda_summary(data)
+    for key, column in (('country_share', 'country'), ('watcher_share', 'previously_watched_channel')):
+        expected = pd.crosstab(data[column], data['group'], normalize='index')
+        np.testing.assert_allclose(summary[key].to_numpy(), expected.to_numpy())
+    np.testing.assert_allclose(summary['click_rates'], data.groupby('group')['clicked'].mean())
+
+
+@pytest.mark.parametrize('fmt', ['png', 'svg'])
+def test_render_writes_the_figure_without_showing(tmp_path, make_data, fmt):
+    path = str(tmp_path / f'eda.{fmt}')
+    assert render_eda(eda_summary(make_data(1000)), path, dpi=40, show=False) == path
+    assert (tmp_path / f'eda.{fmt}').stat().st_size > 0
+
+
+def test_unknown_format_is_refused(tmp_path, make_data):
+    with pytest.raises(ValueError, match="Unsupported figure format"):
+        render_eda(eda_summary(make_data(200)), str(tmp_path / 'eda.gif'))
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import statsmodels.formula.api as smf
+
+from thumbnail_ab.logit import fit_compressed_logit
+from thumbnail_ab.stages import load_stage
+
+FORMULA = 'clicked ~ {} + age + previously_watched_channel + C(country)'
+
+
+@pytest.mark.parametrize('arms, term', [
+    ({'control': 0.10, 'treatment': 0.13}, 'is_treatment'),
+    ({'control': 0.10, 'thumbnail_b': 0.13, 'thumbnail_c': 0.11}, 'C(group)'),
+])
+def test_compressed_fit_matches_statsmodels(make_data, arms, term):
+    data = make_data(6000, arms)
+    data['is_treatment'] = (data['group'] == 'treatment').astype(int)
+    reference = smf.logit(FORMULA.format(term), data).fit(disp=0)
+    fit, _ = fit_compressed_logit(data, verbose=False)
+    params = fit.params[reference.params.index]
+    np.testing.assert_allclose(params, reference.params, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(fit.bse[reference.params.index], reference.bse, rtol=1e-6)
+    np.testing.assert_allclose(fit.llf, reference.llf, rtol=1e-9)
+    np.testing.assert_allclose(fit.llnull, reference.llnull, rtol=1e-9)
+
+
+@pytest.mark.parametrize('method', ['compressed', 'statsmodels'])
+def test_stage_reports_the_fitted_odds_ratio(make_data, method):
+    data = make_data(4000)
+    results = load_stage('regression')(data, method=method)
+    fit, _ = fit_compressed_logit(data, verbose=False)
+    ci = np.exp(fit.conf_int().loc['is_treatment'])
+    np.testing.assert_allclose(results['odds_ratio'], np.exp(fit.params['is_treatment']), rtol=1e-6)
+    np.testing.assert_allclose([results['confidence_interval_lower'], results['confidence_interval_upper']],
+                               ci, rtol=1e-5)
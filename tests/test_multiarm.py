@@ -0,0 +1,48 @@
+import itertools
+
+import numpy as np
+import pytest
+from scipy import stats
+from statsmodels.stats.multitest import multipletests
+
+from thumbnail_ab.aggregates import aggregate
+from thumbnail_ab.bayes import prob_greater
+from thumbnail_ab.multiarm import bayesian_arms, compare_to_control, is_multiarm, pairwise_tests
+
+FOUR_ARMS = {'control': 0.10, 'variant_1': 0.12, 'variant_2': 0.10, 'variant_10': 0.14}
+
+
+@pytest.fixture
+def four_arms(make_data):
+    return make_data(8000, FOUR_ARMS)
+
+
+def test_pairwise_matches_scipy_and_statsmodels(four_arms):
+    tests = pairwise_tests(four_arms, correction='holm')
+    groups = list(tests['p_value'].index)
+    pairs = list(itertools.combinations(groups, 2))
+    clicks = {g: rows['clicked'] for g, rows in four_arms.groupby('group')}
+    expected = np.array([stats.ttest_ind(clicks[a], clicks[b]).pvalue for a, b in pairs])
+    observed = np.array([tests['p_value'].loc[a, b] for a, b in pairs])
+    np.testing.assert_allclose(observed, expected, rtol=1e-9)
+    adjusted = np.array([tests['p_adjusted'].loc[b, a] for a, b in pairs])
+    np.testing.assert_allclose(adjusted, multipletests(expected, method='holm')[1], rtol=1e-9)
+
+
+def test_compare_to_control_corrects_over_the_variants(four_arms):
+    table = compare_to_control(four_arms, correction='bh')
+    assert set(table.index) == {'variant_1', 'variant_2', 'variant_10'}
+    np.testing.assert_allclose(table['p_adjusted'], multipletests(table['p_value'], method='fdr_bh')[1])
+    rates = four_arms.groupby('group')['clicked'].mean()
+    np.testing.assert_allclose(table['absolute_difference'], rates[table.index] - rates['control'])
+
+
+def test_bayesian_arms_agree_with_pairwise_prob_greater(four_arms):
+    summary = aggregate(four_arms)
+    assert is_multiarm(summary)
+    table, greater = bayesian_arms(summary)
+    assert table['prob_best'].sum() == pytest.approx(1.0, abs=1e-9)
+    a, b = table['alpha_posterior'], table['beta_posterior']
+    exact = prob_greater(a['variant_10'], b['variant_10'], a['variant_1'], b['variant_1'])
+    assert greater.loc['variant_10', 'variant_1'] == pytest.approx(exact, abs=1e-8)
+    np.testing.assert_allclose(greater.to_numpy() + greater.to_numpy().T, 1, atol=1e-8)  # diagonal is 0.5
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from thumbnail_ab.aggregates import aggregate
+from thumbnail_ab.logit import fit_compressed_logit
+from thumbnail_ab.parallel import plan_partitions, run_partitioned
+from thumbnail_ab.stages import load_stage
+from thumbnail_ab.storage import save_data
+
+
+@pytest.fixture
+def shards(tmp_path, make_data):
+    data = make_data(6000)
+    paths = [save_data(data.iloc[:4000], str(tmp_path / 'part_npy'), 'npy'),
+             save_data(data.iloc[4000:], str(tmp_path / 'part.csv'), 'csv')]
+    return data, paths
+
+
+def test_partitions_cover_every_row(shards):
+    _, (npy_path, csv_path) = shards
+    partitions = plan_partitions([npy_path, csv_path], 6)
+    npy_ranges = [(start, stop) for path, _, start, stop in partitions if path == npy_path]
+    assert npy_ranges[0][0] == 0 and npy_ranges[-1][1] == 4000
+    assert all(a[1] == b[0] for a, b in zip(npy_ranges, npy_ranges[1:]))
+    assert (csv_path, 'csv', None, None) in partitions
+
+
+def test_partitioned_stages_match_one_process(tmp_path, monkeypatch, shards):
+    monkeypatch.chdir(tmp_path)
+    data, paths = shards
+    results = run_partitioned(paths, workers=2, n_partitions=6, skip=['bayesian'])
+
+    statistical = load_stage('statistical')(aggregate(data))
+    assert results['statistical']['p_value'] == pytest.approx(statistical['p_value'], rel=1e-12)
+
+    fit, _ = fit_compressed_logit(data, verbose=False)
+    ci = np.exp(fit.conf_int().loc['is_treatment'])
+    regression = results['regression']
+    np.testing.assert_allclose(regression['odds_ratio'], np.exp(fit.params['is_treatment']), rtol=1e-8)
+    np.testing.assert_allclose([regression['confidence_interval_lower'], regression['confidence_interval_upper']],
+                               ci, rtol=1e-8)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from thumbnail_ab.permutation import PermutationData, permutation_test
+
+THREE_ARMS = {'control': 0.10, 'thumbnail_b': 0.13, 'thumbnail_c': 0.10}
+
+
+def test_ctr_p_value_agrees_with_fisher(make_data):
+    results = permutation_test(make_data(2000, {'control': 0.10, 'treatment': 0.12}),
+                               max_permutations=4000, mc_error=0, n_workers=1, verbose=False)
+    p, se = results['p_values']['ctr_difference'], results['mc_standard_errors']['ctr_difference']
+    assert abs(p - results['ctr_exact_p_value']) < 4 * se + 1e-3
+
+
+def test_multiarm_compares_only_the_two_named_arms(make_data):
+    data = make_data(3000, THREE_ARMS)
+    pdata = PermutationData(data, treatment_label='thumbnail_b')
+    assert pdata.n_control == pdata.n_treatment == 1000
+
+    kwargs = dict(max_permutations=500, mc_error=0, n_workers=1, verbose=False)
+    on_arms = permutation_test(data, treatment_label='thumbnail_b', **kwargs)
+    pair = data[data['group'].isin(['control', 'thumbnail_b'])].replace({'thumbnail_b': 'treatment'})
+    assert on_arms['p_values'] == permutation_test(pair, **kwargs)['p_values']
+
+
+def test_missing_arm_is_rejected(make_data):
+    with pytest.raises(ValueError, match="'treatment'"):
+        PermutationData(make_data(300, THREE_ARMS))
+
+
+def test_observed_statistics_match_direct_computation(make_data):
+    data = make_data(1001)
+    observed = permutation_test(data, max_permutations=10, n_workers=1, verbose=False)['observed']
+    means = data.groupby('group')[['clicked', 'age', 'previously_watched_channel']].mean()
+    difference = (means.loc['treatment'] - means.loc['control']).abs()
+    np.testing.assert_allclose(observed['ctr_difference'], difference['clicked'])
+    np.testing.assert_allclose(observed['age_difference'], difference['age'])
+    np.testing.assert_allclose(observed['watcher_difference'], difference['previously_watched_channel'])
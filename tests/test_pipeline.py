@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from thumbnail_ab.pipeline import run_pipeline
+from thumbnail_ab.stages import STAGES
+
+
+def write_dataset(path, n_users=2000, seed=0, **overrides):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({
+        'user_id': np.arange(1, n_users + 1),
+        'group': np.tile(['control', 'treatment'], n_users // 2),
+        'age': rng.integers(18, 65, n_users),
+        'country': rng.choice(['US', 'UK', 'CA', 'AU'], n_users),
+        'previously_watched_channel': rng.integers(0, 2, n_users),
+        'clicked': (rng.random(n_users) < 0.13).astype(int),
+    })
+    for col, (row, value) in overrides.items():
+        data[col] = data[col].astype(object)
+        data.loc[row, col] = value
+    data.to_csv(path, index=False)
+    return str(path)
+
+
+def test_valid_file_passes_validation(tmp_path):
+    results = run_pipeline(path=write_dataset(tmp_path / 'ok.csv'), skip=list(STAGES))
+    assert results['validation']['passed']
+
+
+@pytest.mark.parametrize('overrides, failed', [
+    ({'age': (10, 300)}, 'ranges'),
+    ({'clicked': (10, None)}, 'missing_values'),
+    ({'age': (10, 300), 'previously_watched_channel': (20, None)}, 'ranges'),
+])
+def test_bad_file_stops_before_loading(tmp_path, overrides, failed):
+    results = run_pipeline(path=write_dataset(tmp_path / 'bad.csv', **overrides))
+    assert not results['validation']['passed']
+    assert failed in results['validation']['failed']
+    assert set(results) == {'validation'}
+
+
+def test_upstream_results_do_not_draw_the_figure(tmp_path, monkeypatch, make_data):
+    from thumbnail_ab.stages import load_module
+
+    monkeypatch.chdir(tmp_path)
+    bayes_stage = load_module('05_bayesian_modelling')
+    monkeypatch.setattr(bayes_stage, 'plot_bayesian_results', lambda *a, **k: pytest.fail("figure drawn"))
+    results = load_module('06_final_recommendation').upstream_results(make_data(2000))
+    assert {'statistical', 'regression', 'bayesian'} <= set(results)
+    assert not (tmp_path / bayes_stage.FIGURE_PATH).exists()
@@ -0,0 +1,40 @@
+import importlib.util
+import os
+
+import pytest
+
+from thumbnail_ab.stages import PROJECT_ROOT
+
+spec = importlib.util.spec_from_file_location(
+    'pipeline_benchmark', os.path.join(PROJECT_ROOT, 'benchmarks', 'pipeline_benchmark.py'))
+pipeline_benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pipeline_benchmark)
+
+
+def report(*records):
+    return {'results': [dict(rows=1000, **record) for record in records]}
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = report({'stage': 'slow', 'wall_s': 1.0, 'peak_rss_mb': 100},
+                      {'stage': 'fat', 'wall_s': 1.0, 'peak_rss_mb': 100},
+                      {'stage': 'tiny', 'wall_s': 0.01, 'peak_rss_mb': 100},
+                      {'stage': 'broken', 'wall_s': 1.0, 'peak_rss_mb': 100})
+    current = report({'stage': 'slow', 'wall_s': 2.0, 'peak_rss_mb': 100},
+                     {'stage': 'fat', 'wall_s': 1.1, 'peak_rss_mb': 400},
+                     {'stage': 'tiny', 'wall_s': 0.1, 'peak_rss_mb': 100},   # 10x, but under the noise floor
+                     {'stage': 'broken', 'error': 'KeyError'},
+                     {'stage': 'new', 'wall_s': 9.0, 'peak_rss_mb': 900})   # no baseline to compare with
+    regressions = pipeline_benchmark.compare(current, baseline)
+    assert [r.split(' @')[0] for r in regressions] == ['slow', 'fat', 'broken']
+    assert 'wall_s' in regressions[0] and 'peak_rss_mb' in regressions[1]
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'npy'])
+def test_small_run_measures_each_stage(tmp_path, fmt):
+    results = pipeline_benchmark.run_benchmarks(
+        [2000], fmt, str(tmp_path), ['load_data', 'perform_statistical_tests'])['results']
+    assert [r['stage'] for r in results] == ['load_data', 'perform_statistical_tests']
+    for record in results:
+        assert 'error' not in record, record
+        assert record['rows'] == 2000 and record['wall_s'] > 0 and record['peak_rss_mb'] > 0
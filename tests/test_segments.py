@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from statsmodels.stats.multitest import multipletests
+
+from thumbnail_ab.segments import add_age_bucket, analyze_segments, benjamini_hochberg, holm
+
+
+def test_every_validated_age_gets_a_bucket(make_data):
+    data = make_data(2000)
+    data.loc[:92, 'age'] = 65
+    bucketed = add_age_bucket(data)
+    assert bucketed['age_bucket'].notna().all()
+    assert (bucketed.loc[:92, 'age_bucket'] == '55-65').all()
+
+
+def test_segments_cover_ages_18_to_65(make_data):
+    data = make_data(4000)
+    data.loc[:92, 'age'] = 65
+    table = analyze_segments(data, min_trials=10)
+    assert table['control_trials'].sum() + table['treatment_trials'].sum() == len(data)
+
+
+def test_out_of_range_age_is_rejected(make_data):
+    data = make_data(200)
+    data.loc[0, 'age'] = 80
+    with pytest.raises(ValueError, match="'age_bucket'"):
+        analyze_segments(data)
+
+
+def test_corrections_match_statsmodels():
+    p = np.random.default_rng(1).uniform(0, 0.2, 40)
+    p[[3, 17]] = np.nan
+    valid = ~np.isnan(p)
+    np.testing.assert_allclose(holm(p)[valid], multipletests(p[valid], method='holm')[1])
+    np.testing.assert_allclose(benjamini_hochberg(p)[valid], multipletests(p[valid], method='fdr_bh')[1])
+    assert np.isnan(holm(p)[~valid]).all() and np.isnan(benjamini_hochberg(p)[~valid]).all()
@@ -0,0 +1,55 @@
+import numpy as np
+
+from thumbnail_ab.sequential import CONTINUE, SequentialTest
+
+
+def test_zero_click_look_gives_unbounded_interval():
+    status = SequentialTest().update({'control': (0, 10), 'treatment': (0, 10)})
+    assert status['decision'] == CONTINUE
+    assert status['always_valid_p_value'] == 1.0
+    assert status['confidence_sequence_lower'] == -np.inf
+    assert status['confidence_sequence_upper'] == np.inf
+
+
+def test_all_click_look_gives_unbounded_interval():
+    status = SequentialTest().update({'control': (10, 10), 'treatment': (10, 10)})
+    assert status['always_valid_p_value'] == 1.0
+    assert status['confidence_sequence_lower'] == -np.inf
+    assert status['confidence_sequence_upper'] == np.inf
+
+
+def test_interval_becomes_finite_once_clicks_vary():
+    test = SequentialTest()
+    test.update({'control': (0, 10), 'treatment': (0, 10)})
+    status = test.update({'control': (120, 1000), 'treatment': (160, 1000)})
+    assert np.isfinite(status['confidence_sequence_lower'])
+    assert status['confidence_sequence_lower'] < status['difference'] < status['confidence_sequence_upper']
+
+
+def test_interval_never_widens_between_looks():
+    rng = np.random.default_rng(3)
+    test = SequentialTest(tau=0.05)
+    lower, upper = -np.inf, np.inf
+    widened = 0
+    for look in range(60):
+        # Early looks favour treatment, later ones drift back: a per-look interval would widen again
+        rate_t = 0.16 if look < 10 else 0.10
+        batch = {'control': (int(rng.binomial(200, 0.10)), 200), 'treatment': (int(rng.binomial(200, rate_t)), 200)}
+        test.update(batch)
+        new_lower, new_upper = test.confidence_sequence()
+        assert new_lower >= lower and new_upper <= upper
+        difference, variance = test._moments()
+        look_lower, look_upper = test._look_interval(difference, variance)
+        widened += look_upper - look_lower > upper - lower
+        lower, upper = new_lower, new_upper
+    assert widened > 0  # the per-look interval did widen at some point; the sequence did not
+
+
+def test_interval_survives_save_and_load(tmp_path):
+    path = str(tmp_path / 'state.json')
+    test = SequentialTest()
+    test.update({'control': (120, 1000), 'treatment': (160, 1000)})
+    test.save(path)
+    loaded = SequentialTest.load(path)
+    assert loaded.confidence_sequence() == test.confidence_sequence()
+    assert np.isfinite(loaded.confidence_sequence()).all()
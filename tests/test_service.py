@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import pytest
+
+from thumbnail_ab import service
+from thumbnail_ab.service import AnalysisService
+
+COUNTS = {'control': {'trials': 5000, 'clicks': 500}, 'treatment': {'trials': 5000, 'clicks': 600}}
+
+
+async def exchange(app, request):
+    """Send one raw request to a live server; return (status, body, connection closed after)"""
+    # As in serve(): workers fork before any connection exists, so they hold no client sockets
+    await app.warm_up()
+    server = await asyncio.start_server(app.handle_connection, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(request)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode().partition(':')
+            headers[name.lower()] = value.strip()
+        body = json.loads(await reader.readexactly(int(headers['content-length'])))
+        closed = await reader.read() == b''
+        writer.close()
+    return status, body, closed
+
+
+def post(path, payload, connection='close'):
+    raw = json.dumps(payload).encode()
+    return (f"POST {path} HTTP/1.1\r\nContent-Length: {len(raw)}\r\nConnection: {connection}\r\n\r\n"
+            .encode() + raw)
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = AnalysisService(workers=1)
+    yield app
+    app.close()
+
+
+@pytest.mark.parametrize('stages', ['stats', 'bayesian', [], [1], {'bayesian': True}])
+def test_stages_must_be_a_list_of_names(app, stages):
+    status, body, _ = asyncio.run(exchange(app, post('/analyze', {'counts': COUNTS, 'stages': stages})))
+    assert status == 400
+    assert "'stages' must be a non-empty list" in body['error']
+
+
+def test_unknown_stage_is_named(app):
+    status, body, _ = asyncio.run(exchange(app, post('/analyze', {'counts': COUNTS, 'stages': ['stats']})))
+    assert status == 400 and "['stats']" in body['error']
+
+
+def test_oversized_body_is_refused_unread(app, monkeypatch):
+    monkeypatch.setattr(service, 'MAX_BODY_BYTES', 100)
+    # Only the headers are sent: the server must answer without waiting for the body
+    request = b"POST /analyze HTTP/1.1\r\nContent-Length: 5000\r\n\r\n"
+    status, body, closed = asyncio.run(asyncio.wait_for(exchange(app, request), timeout=10))
+    assert status == 413 and '5,000 bytes' in body['error']
+    assert closed
+
+
+def test_analyze_counts(app):
+    status, body, _ = asyncio.run(exchange(app, post('/analyze', {'counts': COUNTS, 'stages': ['bayesian']})))
+    assert status == 200
+    assert body['groups'] == ['control', 'treatment'] and body['n_total'] == 10000
+    assert body['bayesian']['bayesian_probability'] > 0.99
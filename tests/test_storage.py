@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from thumbnail_ab.storage import compact_dtypes, load_data, open_writer
+
+
+def write_csv(path, **overrides):
+    data = pd.DataFrame({
+        'user_id': [1, 2, 3],
+        'group': ['control', 'treatment', 'control'],
+        'age': [25, 40, 61],
+        'country': ['US', 'UK', 'CA'],
+        'previously_watched_channel': [0, 1, 0],
+        'clicked': [0, 1, 1],
+    })
+    for col, (row, value) in overrides.items():
+        data[col] = data[col].astype(object)
+        data.loc[row, col] = value
+    data.to_csv(path, index=False)
+    return str(path)
+
+
+def test_csv_loads_compact_dtypes(tmp_path):
+    data = load_data(write_csv(tmp_path / 'ok.csv'))
+    assert data['age'].dtype == np.int8
+    assert data['age'].tolist() == [25, 40, 61]
+
+
+def test_out_of_range_age_is_refused_not_wrapped(tmp_path):
+    with pytest.raises(ValueError, match=r"Column 'age', row 1: '300'"):
+        load_data(write_csv(tmp_path / 'age.csv', age=(1, 300)))
+
+
+@pytest.mark.parametrize('col', ['age', 'previously_watched_channel', 'clicked'])
+def test_blank_cell_names_column_and_row(tmp_path, col):
+    with pytest.raises(ValueError, match=rf"Column '{col}', row 2: missing value"):
+        load_data(write_csv(tmp_path / 'blank.csv', **{col: (2, None)}))
+
+
+def test_fractional_flag_is_refused():
+    with pytest.raises(ValueError, match="clicked"):
+        compact_dtypes(pd.DataFrame({'clicked': [0.0, 0.5]}))
+
+
+@pytest.mark.parametrize('fmt', ['npy', 'parquet', 'feather'])
+def test_later_chunks_keep_the_first_chunks_coding(tmp_path, fmt):
+    path = str(tmp_path / ('data_npy' if fmt == 'npy' else f'data.{fmt}'))
+    writer = open_writer(path, fmt, n_rows=5)
+    writer.write(pd.DataFrame({'group': ['control', 'variant_2', 'variant_10'], 'clicked': [0, 1, 0]}))
+    writer.write(pd.DataFrame({'group': ['variant_10', 'control'], 'clicked': [1, 1]}))
+    writer.close()
+    assert load_data(path)['group'].tolist() == ['control', 'variant_2', 'variant_10', 'variant_10', 'control']
+
+
+def test_chunk_with_new_label_is_refused(tmp_path):
+    writer = open_writer(str(tmp_path / 'data_npy'), 'npy', n_rows=4)
+    writer.write(pd.DataFrame({'group': ['control', 'variant_1'], 'clicked': [0, 1]}))
+    with pytest.raises(ValueError, match=r"labels \['variant_2'\]"):
+        writer.write(pd.DataFrame({'group': ['variant_2', 'control'], 'clicked': [1, 1]}))
+
+
+def test_categories_fixed_up_front(tmp_path):
+    path = str(tmp_path / 'data_npy')
+    arms = ['control', 'variant_1', 'variant_2']
+    writer = open_writer(path, 'npy', n_rows=2, categories={'group': arms})
+    writer.write(pd.DataFrame({'group': ['variant_1'], 'clicked': [0]}))
+    writer.write(pd.DataFrame({'group': ['variant_2'], 'clicked': [1]}))
+    writer.close()
+    data = load_data(path)
+    assert list(data['group'].cat.categories) == arms
+    assert data['group'].tolist() == ['variant_1', 'variant_2']
+
+
+def test_short_npy_write_loads_only_written_rows(tmp_path):
+    path = str(tmp_path / 'data_npy')
+    writer = open_writer(path, 'npy', n_rows=10)
+    writer.write(pd.DataFrame({'group': ['control', 'treatment', 'control'], 'age': [30, 40, 50], 'clicked': [0, 1, 1]}))
+    with pytest.raises(ValueError, match="Only 3 of the 10"):
+        writer.close()
+    data = load_data(path)
+    assert data['group'].tolist() == ['control', 'treatment', 'control']
+    assert data['age'].tolist() == [30, 40, 50]
+    assert load_data(path, columns=['age']).shape == (3, 1)
+
+
+def test_npy_write_past_preallocation_is_refused(tmp_path):
+    writer = open_writer(str(tmp_path / 'data_npy'), 'npy', n_rows=2)
+    with pytest.raises(ValueError, match="past the 2 preallocated rows"):
+        writer.write(pd.DataFrame({'group': ['control'] * 3, 'clicked': [0, 1, 0]}))
+
+
+def test_extra_arms_sort_naturally():
+    data = compact_dtypes(pd.DataFrame({'group': ['variant_10', 'variant_2', 'control']}))
+    assert list(data['group'].cat.categories) == ['control', 'treatment', 'variant_2', 'variant_10']
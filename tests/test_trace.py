@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from thumbnail_ab import trace
+from thumbnail_ab.trace import TRACER, pool_map, span
+
+
+def work(n):
+    with span('worker_step', rows=n):
+        return n * 2
+
+
+@pytest.fixture
+def tracer():
+    TRACER.reset()
+    TRACER.enabled = True
+    yield TRACER
+    TRACER.enabled = False
+    TRACER.reset()
+
+
+def test_enable_registers_one_exit_export(monkeypatch):
+    registered = []
+    monkeypatch.setattr(trace.atexit, 'register', registered.append)
+    monkeypatch.setattr(trace, '_export_registered', False)
+    monkeypatch.setattr(trace, '_exports', {'trace': None, 'profile': None})
+    try:
+        trace.enable('first.jsonl')
+        trace.enable('second.jsonl')
+    finally:
+        TRACER.disable()
+    assert registered == [trace._export]
+    assert trace._exports['trace'] == 'second.jsonl'
+
+
+def test_pool_map_keeps_worker_spans(tracer):
+    with ProcessPoolExecutor(2) as pool:
+        assert pool_map(pool, work, [1, 2, 3]) == [2, 4, 6]
+    spans = [r for r in tracer.records if r['name'] == 'worker_step']
+    assert sorted(r['rows'] for r in spans) == [1, 2, 3]
+    assert all(r['pid'] != os.getpid() for r in spans)
+
+
+def test_pool_map_without_tracing_is_a_plain_map():
+    TRACER.reset()
+    with ProcessPoolExecutor(1) as pool:
+        assert pool_map(pool, work, [1, 2]) == [2, 4]
+    assert TRACER.records == []
@@ -0,0 +1,53 @@
+import pytest
+
+from thumbnail_ab.validation import FAIL, PASS, validate_data, validate_file
+from thumbnail_ab.storage import save_data
+
+
+def _split(data, control_share):
+    """Reassign groups so control holds control_share of the rows"""
+    data = data.copy()
+    n_control = int(round(control_share * len(data)))
+    data['group'] = ['control'] * n_control + ['treatment'] * (len(data) - n_control)
+    return data
+
+
+def test_clean_data_passes(make_data):
+    report = validate_data(make_data(10_000), chunk_rows=3000)
+    assert report['passed'], report['failed']
+    assert report['n_rows'] == 10_000
+
+
+def test_srm_flags_a_52_48_split(make_data):
+    data = make_data(20_000)
+    check = validate_data(_split(data, 0.52))['checks']['sample_ratio']
+    assert check['status'] == FAIL
+    assert check['counts'] == {'control': 10_400, 'treatment': 9_600}
+    assert validate_data(_split(data, 0.50))['checks']['sample_ratio']['status'] == PASS
+
+
+def test_srm_uses_the_expected_split(make_data):
+    data = _split(make_data(20_000), 0.52)
+    report = validate_data(data, expected_split={'control': 0.52, 'treatment': 0.48})
+    assert report['checks']['sample_ratio']['status'] == PASS
+
+
+def test_row_problems_are_counted_across_chunks(make_data):
+    data = make_data(5000)
+    data.loc[[10, 4000], 'age'] = [17, 66]
+    data.loc[20, 'clicked'] = 2
+    data.loc[30, 'user_id'] = data.loc[3500, 'user_id']
+    report = validate_data(data, chunk_rows=1000)
+    assert set(report['failed']) == {'ranges', 'duplicates'}
+    assert report['checks']['ranges']['out_of_range_counts'] == {'age': 2, 'clicked': 1}
+    assert report['checks']['duplicates']['duplicate_rows'] == 1
+
+
+def test_file_matches_in_memory(tmp_path, make_data):
+    data = make_data(5000)
+    path = save_data(data, str(tmp_path / 'data.csv'), 'csv')
+    from_file = validate_file(path, chunk_rows=1500)
+    in_memory = validate_data(data)
+    assert from_file['passed'] and in_memory['passed']
+    assert from_file['checks']['sample_ratio']['p_value'] == pytest.approx(
+        in_memory['checks']['sample_ratio']['p_value'], rel=1e-12)
@@ -0,0 +1,18 @@
+# thumbnail_ab - shared building blocks for the YouTube thumbnail A/B test scripts
+import importlib
+
+# The submodules import pandas/scipy, so these re-exports are resolved on
+# first access to keep `import thumbnail_ab` (and the CLI) fast
+_EXPORTS = {
+    'load_data': 'storage',
+    'save_data': 'storage',
+    'open_writer': 'storage',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,261 @@
+# aggregates.py - sufficient statistics for the A/B test in one pass over the rows
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .trace import span
+
+COVARIATES = ['country', 'previously_watched_channel']
+
+
+def _codes(series):
+    """Integer codes and sorted levels of a column (categorical or not)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), list(series.cat.categories)
+    codes, levels = pd.factorize(series, sort=True)
+    return codes, list(levels)
+
+
+def _group_codes(series):
+    """_codes() for the arm column, leaving out categories no row belongs to
+
+    Fixed categorical labels (e.g. 'treatment' in an A/B/n file whose arms
+    are control, variant_1, ...) would otherwise show up as empty arms.
+    """
+    codes, groups = _codes(series)
+    present = np.bincount(codes, minlength=len(groups)) > 0
+    if present.all():
+        return codes, groups
+    remap = np.cumsum(present) - 1
+    return remap[codes], [g for g, keep in zip(groups, present) if keep]
+
+
+@dataclass
+class SufficientStats:
+    """Count tables and moments that every test in stages 03, 05 and 06 needs.
+
+    outcome_counts is (n_groups, 2) with columns [not clicked, clicked];
+    covariate_counts[name] is (n_levels, n_groups), laid out like
+    pd.crosstab(data[name], data['group']). Age moments and covariate
+    tables are only present when those columns were aggregated.
+    """
+    groups: list
+    outcome_counts: np.ndarray
+    age_sum: np.ndarray = None
+    age_sumsq: np.ndarray = None
+    covariate_levels: dict = field(default_factory=dict)
+    covariate_counts: dict = field(default_factory=dict)
+
+    @property
+    def trials(self):
+        return self.outcome_counts.sum(axis=1)
+
+    @property
+    def successes(self):
+        return self.outcome_counts[:, 1]
+
+    @property
+    def rates(self):
+        return self.successes / self.trials
+
+    @property
+    def n_total(self):
+        return int(self.outcome_counts.sum())
+
+    @property
+    def has_covariates(self):
+        """True when age moments and every COVARIATES table were aggregated"""
+        return self.age_sum is not None and set(COVARIATES) <= set(self.covariate_counts)
+
+    def index(self, group):
+        return self.groups.index(group)
+
+    def outcome_table(self):
+        """Group x clicked table, equivalent to pd.crosstab(data['group'], data['clicked'])"""
+        table = pd.DataFrame(self.outcome_counts, index=self.groups, columns=[0, 1])
+        table.index.name, table.columns.name = 'group', 'clicked'
+        return table
+
+    def covariate_table(self, name):
+        """Covariate x group table, equivalent to pd.crosstab(data[name], data['group'])"""
+        table = pd.DataFrame(self.covariate_counts[name],
+                             index=self.covariate_levels[name], columns=self.groups)
+        table.index.name, table.columns.name = name, 'group'
+        return table
+
+    def age_moments(self, group):
+        """(n, mean, sample std) of age within a group"""
+        i = self.index(group)
+        n = self.trials[i]
+        mean = self.age_sum[i] / n
+        var = (self.age_sumsq[i] - n * mean ** 2) / (n - 1)
+        return n, mean, np.sqrt(max(var, 0.0))
+
+    def merge(self, other):
+        """Combine with stats from another batch or shard.
+
+        Merging is associative and commutative; groups and covariate levels
+        missing on one side are treated as zero counts.
+        """
+        groups = self.groups + [g for g in other.groups if g not in self.groups]
+
+        def align_groups(values, src_groups, axis=0):
+            if values is None:
+                return None
+            shape = list(values.shape)
+            shape[axis] = len(groups)
+            out = np.zeros(shape, dtype=values.dtype)
+            idx = [groups.index(g) for g in src_groups]
+            if axis == 0:
+                out[idx] = values
+            else:
+                out[:, idx] = values
+            return out
+
+        def add(a, b):
+            if a is None or b is None:
+                return None  # age moments are only kept if both sides have them
+            return a + b
+
+        outcome_counts = align_groups(self.outcome_counts, self.groups) + align_groups(other.outcome_counts, other.groups)
+        age_sum = add(align_groups(self.age_sum, self.groups), align_groups(other.age_sum, other.groups))
+        age_sumsq = add(align_groups(self.age_sumsq, self.groups), align_groups(other.age_sumsq, other.groups))
+
+        covariate_levels, covariate_counts = {}, {}
+        for name in set(self.covariate_levels) & set(other.covariate_levels):
+            levels = self.covariate_levels[name] + [
+                v for v in other.covariate_levels[name] if v not in self.covariate_levels[name]]
+            counts = np.zeros((len(levels), len(groups)), dtype=np.int64)
+            for side in (self, other):
+                rows = [levels.index(v) for v in side.covariate_levels[name]]
+                counts[rows] += align_groups(side.covariate_counts[name], side.groups, axis=1)
+            covariate_levels[name], covariate_counts[name] = levels, counts
+
+        return SufficientStats(groups, outcome_counts, age_sum, age_sumsq, covariate_levels, covariate_counts)
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def to_dict(self):
+        """JSON-serialisable form, so the tables can be cached or shipped"""
+        return {
+            'groups': list(self.groups),
+            'outcome_counts': self.outcome_counts.tolist(),
+            'age_sum': None if self.age_sum is None else self.age_sum.tolist(),
+            'age_sumsq': None if self.age_sumsq is None else self.age_sumsq.tolist(),
+            'covariate_levels': {k: list(v) for k, v in self.covariate_levels.items()},
+            'covariate_counts': {k: v.tolist() for k, v in self.covariate_counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(
+            groups=list(d['groups']),
+            outcome_counts=np.asarray(d['outcome_counts'], dtype=np.int64),
+            age_sum=None if d['age_sum'] is None else np.asarray(d['age_sum'], dtype=np.float64),
+            age_sumsq=None if d['age_sumsq'] is None else np.asarray(d['age_sumsq'], dtype=np.float64),
+            covariate_levels={k: list(v) for k, v in d['covariate_levels'].items()},
+            covariate_counts={k: np.asarray(v, dtype=np.int64) for k, v in d['covariate_counts'].items()},
+        )
+
+
+def aggregate(data, covariates=COVARIATES):
+    """Build SufficientStats from raw rows with one bincount per table
+
+    Only 'group' and 'clicked' are required; age moments and covariate
+    tables are built for whichever of those columns are present.
+    """
+    with span('group_split', rows=len(data)):
+        group_codes, groups = _group_codes(data['group'])
+        n_groups = len(groups)
+        clicked = data['clicked'].to_numpy().astype(np.int64)
+
+        outcome_counts = np.bincount(group_codes * 2 + clicked, minlength=n_groups * 2).reshape(n_groups, 2)
+
+        age_sum = age_sumsq = None
+        if 'age' in data:
+            age = data['age'].to_numpy().astype(np.float64)
+            age_sum = np.bincount(group_codes, weights=age, minlength=n_groups)
+            age_sumsq = np.bincount(group_codes, weights=age * age, minlength=n_groups)
+
+    covariate_levels, covariate_counts = {}, {}
+    for name in (c for c in covariates if c in data):
+        with span('crosstab_build', rows=len(data), covariate=name):
+            codes, levels = _codes(data[name])
+            counts = np.bincount(codes * n_groups + group_codes, minlength=len(levels) * n_groups)
+            covariate_levels[name] = levels
+            covariate_counts[name] = counts.reshape(len(levels), n_groups)
+
+    return SufficientStats(groups, outcome_counts, age_sum, age_sumsq, covariate_levels, covariate_counts)
+
+
+def ensure_stats(data):
+    """Accept either raw rows or precomputed SufficientStats"""
+    if isinstance(data, SufficientStats):
+        return data
+    return aggregate(data)
+
+
+# ---------------------------------------------------------------------------
+# Tests that run on the aggregated tables
+# (scipy.stats is imported on first use; it dominates start-up time)
+# ---------------------------------------------------------------------------
+
+def ttest_clicks(summary, group_a='treatment', group_b='control'):
+    """Pooled-variance t-test on click indicators, same as stats.ttest_ind on the rows"""
+    from scipy import stats
+
+    moments = []
+    for group in (group_a, group_b):
+        i = summary.index(group)
+        n, s = summary.trials[i], summary.successes[i]
+        p = s / n
+        # For 0/1 data the sum of squares equals the sum
+        moments.append((p, np.sqrt((s - n * p * p) / (n - 1)), n))
+    (m1, s1, n1), (m2, s2, n2) = moments
+    return stats.ttest_ind_from_stats(m1, s1, n1, m2, s2, n2)
+
+
+def ttest_age(summary, group_a='control', group_b='treatment'):
+    """Pooled-variance t-test on age from group sums and sums of squares"""
+    from scipy import stats
+
+    n1, m1, s1 = summary.age_moments(group_a)
+    n2, m2, s2 = summary.age_moments(group_b)
+    return stats.ttest_ind_from_stats(m1, s1, n1, m2, s2, n2)
+
+
+def anova_age(summary):
+    """One-way ANOVA of age across all groups from the per-group sums and sums of squares"""
+    from scipy import stats
+
+    n = summary.trials.astype(np.float64)
+    means = summary.age_sum / n
+    grand_mean = summary.age_sum.sum() / n.sum()
+    between = float(np.sum(n * (means - grand_mean) ** 2))
+    within = float(np.sum(summary.age_sumsq - n * means ** 2))
+    df_between, df_within = len(n) - 1, n.sum() - len(n)
+    f_stat = (between / df_between) / (within / df_within)
+    return f_stat, stats.f.sf(f_stat, df_between, df_within)
+
+
+def chi2_outcome(summary):
+    """Chi-square test of group vs clicked"""
+    from scipy import stats
+
+    return stats.chi2_contingency(summary.outcome_counts)
+
+
+def chi2_covariate(summary, name):
+    """Chi-square balance test of a covariate across groups"""
+    from scipy import stats
+
+    return stats.chi2_contingency(summary.covariate_counts[name])
+
+
+def beta_posterior(summary, group, alpha_prior=2, beta_prior=10):
+    """Beta posterior parameters for a group's CTR"""
+    i = summary.index(group)
+    successes, trials = summary.successes[i], summary.trials[i]
+    return alpha_prior + successes, beta_prior + (trials - successes)
@@ -0,0 +1,183 @@
+# bootstrap.py - bootstrap CIs for CTR lift and adjusted odds ratio from count cells
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .logit import compress, design_matrix, fit_binomial_logit
+from .trace import pool_map
+
+STATISTICS = ['relative_improvement', 'odds_ratio']
+ARM_PREFIX = 'C(group)[T.'
+
+
+def _cells(compressed):
+    """Click and no-click counts per covariate pattern, as one flat cell vector"""
+    clicks = compressed['clicks'].to_numpy(dtype=np.int64)
+    trials = compressed['trials'].to_numpy(dtype=np.int64)
+    return np.concatenate([clicks, trials - clicks])
+
+
+def _arm_terms(X, compressed, control_label='control'):
+    """(label, group mask, design column) per variant, and the control's group mask
+
+    Two arms keep the plain statistic names; an A/B/n test reports each
+    variant against the control as e.g. 'odds_ratio[thumbnail_c]'.
+    """
+    groups = compressed['group'].to_numpy()
+    control = groups == control_label
+    if 'is_treatment' in X:
+        return [('', X['is_treatment'].to_numpy() == 1, 'is_treatment')], control
+    terms = []
+    for column in X.columns:
+        if column.startswith(ARM_PREFIX):
+            arm = column[len(ARM_PREFIX):-1]
+            terms.append((f'[{arm}]', groups == arm, column))
+    return terms, control
+
+
+def _statistics(X, arms, control, cell_counts, statistics, start_params):
+    """Evaluate the requested statistics on one set of (resampled) cell counts"""
+    n_patterns = len(control)
+    clicks = cell_counts[:n_patterns]
+    trials = clicks + cell_counts[n_patterns:]
+
+    values = {}
+    if 'relative_improvement' in statistics:
+        ctr_c = clicks[control].sum() / trials[control].sum()
+        for label, mask, _ in arms:
+            ctr_t = clicks[mask].sum() / trials[mask].sum()
+            values[f'relative_improvement{label}'] = (ctr_t - ctr_c) / ctr_c * 100
+    if 'odds_ratio' in statistics:
+        result = fit_binomial_logit(X, clicks, trials, verbose=False, start_params=start_params)
+        for label, _, column in arms:
+            values[f'odds_ratio{label}'] = np.exp(result.params[column])
+    return values
+
+
+def _run_batch(X, arms, control, cells, statistics, start_params, scheme, n_replicates, seed_seq):
+    """Worker: n_replicates resamples of the cell counts from one seeded Generator"""
+    rng = np.random.default_rng(seed_seq)
+    n_total = cells.sum()
+    if scheme == 'multinomial':
+        # Resampling N rows with replacement == one multinomial draw over the cells
+        draws = rng.multinomial(n_total, cells / n_total, size=n_replicates)
+    elif scheme == 'poisson':
+        # Poisson(1) weight per row sums to Poisson(count) per cell
+        draws = rng.poisson(cells, size=(n_replicates, len(cells)))
+    else:
+        raise ValueError(f"Unknown scheme '{scheme}'. Choose 'multinomial' or 'poisson'")
+
+    out = {}
+    for r in range(n_replicates):
+        for stat, value in _statistics(X, arms, control, draws[r], statistics, start_params).items():
+            out.setdefault(stat, np.empty(n_replicates))[r] = value
+    return out
+
+
+def _percentile_ci(values, level):
+    tail = (1 - level) / 2 * 100
+    return np.percentile(values, tail), np.percentile(values, 100 - tail)
+
+
+def bootstrap_ci(data, n_replicates=2000, batch_size=100, n_workers=None, scheme='multinomial',
+                 level=0.95, seed=42, statistics=STATISTICS, tol=0.002, min_replicates=400, verbose=True):
+    """Percentile bootstrap CIs for relative CTR improvement and adjusted odds ratio.
+
+    data is raw rows or the output of logit.compress(). Replicates resample
+    the aggregated count cells (multinomial or Poisson weights) instead of
+    the rows, in batches spread over a process pool. On A/B/n data every
+    variant gets its own interval against the control, keyed as e.g.
+    'odds_ratio[thumbnail_c]'. Batch i always uses
+    the i-th child of SeedSequence(seed), so results do not depend on
+    n_workers. Sampling stops early once every CI endpoint moves by less
+    than tol (relative) between rounds, after at least min_replicates.
+    """
+    compressed = data if 'trials' in data else compress(data)
+    X = design_matrix(compressed)
+    arms, control = _arm_terms(X, compressed)
+    cells = _cells(compressed)
+    statistics = list(statistics)
+
+    # Point estimates on the observed cells; the fit also warm-starts each refit
+    full_fit = fit_binomial_logit(X, compressed['clicks'], compressed['trials'], verbose=False)
+    estimates = _statistics(X, arms, control, cells, statistics, None)
+    labels = list(estimates)
+
+    n_workers = n_workers or os.cpu_count() or 1
+    n_batches = -(-n_replicates // batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_batches)
+
+    replicates = {label: [] for label in labels}
+    previous_ci, stopped_early, done = None, False, 0
+    start = time.perf_counter()
+
+    executor = ProcessPoolExecutor(n_workers) if n_workers > 1 else None
+    try:
+        for round_start in range(0, n_batches, n_workers):
+            batch_ids = range(round_start, min(round_start + n_workers, n_batches))
+            sizes = [min(batch_size, n_replicates - i * batch_size) for i in batch_ids]
+            args = [(X, arms, control, cells, statistics, full_fit.params.to_numpy(), scheme, size, seeds[i])
+                    for i, size in zip(batch_ids, sizes)]
+            if executor is None:
+                batches = [_run_batch(*a) for a in args]
+            else:
+                batches = pool_map(executor, _run_batch, *zip(*args))
+
+            for batch in batches:
+                for label in labels:
+                    replicates[label].append(batch[label])
+            done += sum(sizes)
+
+            ci = np.array([_percentile_ci(np.concatenate(replicates[label]), level) for label in labels])
+            if previous_ci is not None and done >= min_replicates and done < n_replicates:
+                if np.all(np.abs(ci - previous_ci) <= tol * np.abs(previous_ci)):
+                    stopped_early = True
+                    break
+            previous_ci = ci
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    results = {
+        'n_replicates': done,
+        'replicates_per_sec': done / elapsed if elapsed > 0 else float('inf'),
+        'stopped_early': stopped_early,
+        'scheme': scheme,
+    }
+    for label, (lower, upper) in zip(labels, ci):
+        results[label] = estimates[label]
+        results[f'{label}_ci_lower'] = lower
+        results[f'{label}_ci_upper'] = upper
+
+    if verbose:
+        print(f"\n🔁 BOOTSTRAP ({scheme}, {done:,} replicates, {n_workers} workers)")
+        for label in labels:
+            print(f"   {label}: {results[label]:.4f}  "
+                  f"{level:.0%} CI [{results[f'{label}_ci_lower']:.4f}, {results[f'{label}_ci_upper']:.4f}]")
+        print(f"   Throughput: {results['replicates_per_sec']:,.0f} replicates/sec"
+              f"{' (stopped early: endpoints stable)' if stopped_early else ''}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .storage import load_data
+
+    parser = argparse.ArgumentParser(description="Bootstrap CIs for CTR lift and adjusted odds ratio")
+    parser.add_argument('--data', default=None)
+    parser.add_argument('--replicates', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--scheme', choices=['multinomial', 'poisson'], default='multinomial')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--tol', type=float, default=0.002)
+    args = parser.parse_args()
+
+    data = load_data(args.data, columns=['group', 'clicked', 'age', 'country', 'previously_watched_channel'])
+    if data is not None:
+        bootstrap_ci(data, args.replicates, args.batch_size, args.workers, args.scheme,
+                     seed=args.seed, tol=args.tol)
@@ -0,0 +1,218 @@
+# cache.py - content-addressed on-disk cache of stage results
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+from .aggregates import SufficientStats
+
+DEFAULT_CACHE_DIR = '.ab_cache'
+DEFAULT_MAX_BYTES = 64 * 1024 ** 2
+
+# Bump when a change to the stages makes previously cached results stale
+CACHE_VERSION = 2
+
+
+def _hasher():
+    return hashlib.blake2b(digest_size=16)
+
+
+def file_fingerprint(path, block_size=1 << 20):
+    """Hash of a dataset file's bytes (every file, in name order, for an .npy directory)"""
+    paths = sorted(glob.glob(os.path.join(path, '*'))) if os.path.isdir(path) else [path]
+    h = _hasher()
+    for p in paths:
+        h.update(os.path.basename(p).encode())
+        with open(p, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                h.update(block)
+    return h.hexdigest()
+
+
+def data_fingerprint(data):
+    """Content hash of a dataset path, DataFrame or SufficientStats.
+
+    Two inputs with the same values get the same fingerprint regardless of
+    storage format or dtype (category and object columns hash alike).
+    """
+    if isinstance(data, (str, os.PathLike)):
+        return file_fingerprint(data)
+    h = _hasher()
+    if isinstance(data, SufficientStats):
+        h.update(json.dumps(data.to_dict(), sort_keys=True).encode())
+        return h.hexdigest()
+
+    import pandas as pd
+
+    for column in data.columns:
+        h.update(str(column).encode())
+        h.update(pd.util.hash_pandas_object(data[column], index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def params_fingerprint(params):
+    """Hash of the stage parameters (priors, method, seed, ...) plus CACHE_VERSION"""
+    payload = json.dumps({'version': CACHE_VERSION, 'params': params}, sort_keys=True, default=str)
+    h = _hasher()
+    h.update(payload.encode())
+    return h.hexdigest()
+
+
+def _to_builtin(value):
+    # numpy scalars -> Python numbers so results round-trip through JSON
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+class _Tee(io.TextIOBase):
+    def __init__(self, *streams):
+        self.streams = streams
+
+    def write(self, s):
+        for stream in self.streams:
+            stream.write(s)
+        return len(s)
+
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+
+def _artifacts_intact(entry, artifacts):
+    """True when every artifact file still has the fingerprint recorded in the entry"""
+    recorded = entry.get('artifacts', {})
+    for path in artifacts:
+        if path not in recorded or not os.path.exists(path) or file_fingerprint(path) != recorded[path]:
+            return False
+    return True
+
+
+class ResultCache:
+    """Stage results on disk, keyed by data fingerprint and stage parameters.
+
+    Each entry is one JSON file named <stage>-<data fingerprint>-<params
+    fingerprint>.json holding the stage's results dict and the report it
+    printed. A hit refreshes the file's mtime; once the directory exceeds
+    max_bytes the least recently used entries are deleted.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, stage, fingerprint, params=None):
+        return f"{stage}-{fingerprint}-{params_fingerprint(params or {})}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key):
+        """The cached entry for key, or None"""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(path)
+        return entry
+
+    def put(self, key, result, output='', artifacts=None):
+        """Store a results dict (and the report printed and files written while computing it)"""
+        entry = {'key': key, 'created': time.time(), 'result': result, 'output': output,
+                 'artifacts': artifacts or {}}
+        path = self._path(key)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f, default=_to_builtin)
+        os.replace(tmp_path, path)
+        self.evict()
+        return entry
+
+    def entries(self):
+        """(path, size, last used) of every entry, least recently used first"""
+        found = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            found.append((path, stat.st_size, stat.st_mtime))
+        return sorted(found, key=lambda entry: entry[2])
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def invalidate(self, stage=None, fingerprint=None):
+        """Delete the entries of one stage and/or one dataset (everything by default)"""
+        pattern = f"{stage or '*'}-{fingerprint or '*'}-*.json"
+        removed = 0
+        for path in glob.glob(os.path.join(self.directory, pattern)):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            removed += 1
+        return removed
+
+    def clear(self):
+        return self.invalidate()
+
+    def call(self, stage, fingerprint, params, func, *args, artifacts=(), **kwargs):
+        """Return func(*args, **kwargs) from the cache, computing and storing it on a miss.
+
+        On a hit the stage's printed report is replayed, so a cached run
+        reads exactly like a fresh one. artifacts lists files the stage
+        writes (figures); a hit only counts while each of them still holds
+        what the cached run wrote, otherwise the stage runs again.
+        """
+        key = self.key(stage, fingerprint, params)
+        entry = self.get(key)
+        if entry is not None and _artifacts_intact(entry, artifacts):
+            sys.stdout.write(entry['output'])
+            print(f"♻️  Cached {stage} results reused ({fingerprint[:12]})")
+            return entry['result']
+
+        buffer = io.StringIO()
+        with contextlib.redirect_stdout(_Tee(sys.stdout, buffer)):
+            result = func(*args, **kwargs)
+        written = {path: file_fingerprint(path) for path in artifacts if os.path.exists(path)}
+        self.put(key, result, buffer.getvalue(), written)
+        return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or clear the stage result cache")
+    parser.add_argument('--dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--clear', action='store_true', help="Invalidate entries (all, or --stage/--data only)")
+    parser.add_argument('--stage', default=None)
+    parser.add_argument('--data', default=None, help="Dataset whose entries --clear removes")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.dir)
+    if args.clear:
+        fingerprint = data_fingerprint(args.data) if args.data else None
+        print(f"🗑️  Removed {cache.invalidate(args.stage, fingerprint)} cached results")
+    else:
+        entries = cache.entries()
+        print(f"📦 {len(entries)} cached results, {cache.size() / 1024:.1f} KiB in {args.dir}")
+        for path, size, last_used in reversed(entries):
+            print(f"   {os.path.basename(path)}  {size:,} B  last used {time.ctime(last_used)}")
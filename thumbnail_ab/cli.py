@@ -0,0 +1,262 @@
+# cli.py - `python -m thumbnail_ab <command>`; heavy imports happen inside each command
+import argparse
+import math
+import os
+import sys
+
+
+def _load(args, key=None):
+    from .storage import load_data
+
+    columns = None
+    if key is not None:
+        from .stages import stage_columns
+        columns = stage_columns(key)
+    return load_data(args.data, columns=columns)
+
+
+def _load_experiment(args, key):
+    """Counts of --experiment from --state when given, otherwise the data file"""
+    if not args.state:
+        return _load(args, key)
+    from .incremental import ExperimentState
+    data = ExperimentState.load(args.state).experiments.get(args.experiment)
+    if data is None:
+        print(f"❌ ERROR: experiment '{args.experiment}' not found in {args.state}")
+    return data
+
+
+def _z_test(summary, arm, control='control'):
+    """Two-proportion z-test of arm against control: (z, two-sided p)"""
+    a, c = summary.index(arm), summary.index(control)
+    (n_c, n_a), (s_c, s_a) = summary.trials[[c, a]], summary.successes[[c, a]]
+    pooled = (s_c + s_a) / (n_c + n_a)
+    z = (s_a / n_a - s_c / n_c) / math.sqrt(pooled * (1 - pooled) * (1 / n_c + 1 / n_a))
+    return z, math.erfc(abs(z) / math.sqrt(2))
+
+
+def cmd_summary(args):
+    """Headline CTRs and two-proportion z-tests; needs only numpy, pandas and scipy.special"""
+    from .aggregates import aggregate
+    from .multiarm import arm_order, is_multiarm
+    from .storage import load_data
+
+    data = load_data(args.data, columns=['group', 'clicked'])
+    if data is None:
+        return 1
+    summary = aggregate(data)
+    print(f"📋 SUMMARY ({summary.n_total:,} users)")
+
+    if is_multiarm(summary):
+        # One unadjusted z-test per arm against the control; stage 03 applies Holm/BH
+        c = summary.index('control')
+        print(f"{'Arm':<12} {'CTR':>7} {'Clicks':>14} {'Diff':>8} {'Rel %':>8} {'Z':>8} {'P-value':>9}")
+        for arm in arm_order(summary.groups):
+            i = summary.index(arm)
+            rate, control_rate = summary.rates[i], summary.rates[c]
+            clicks = f"{summary.successes[i]:,}/{summary.trials[i]:,}"
+            if arm == 'control':
+                print(f"{arm:<12} {rate:>7.4f} {clicks:>14}")
+                continue
+            z, p_value = _z_test(summary, arm)
+            print(f"{arm:<12} {rate:>7.4f} {clicks:>14} {rate - control_rate:>8.4f} "
+                  f"{(rate - control_rate) / control_rate * 100:>8.2f} {z:>8.4f} {p_value:>9.6f}")
+        return 0
+
+    c, t = summary.index('control'), summary.index('treatment')
+    (n_c, n_t), (s_c, s_t) = summary.trials[[c, t]], summary.successes[[c, t]]
+    p_c, p_t = s_c / n_c, s_t / n_t
+    z, p_value = _z_test(summary, 'treatment')
+
+    print(f"Control CTR:    {p_c:.4f} ({s_c:,}/{n_c:,} clicks)")
+    print(f"Treatment CTR:  {p_t:.4f} ({s_t:,}/{n_t:,} clicks)")
+    print(f"Absolute difference: {p_t - p_c:.4f}")
+    print(f"Relative improvement: {(p_t - p_c) / p_c * 100:.2f}%")
+    print(f"Z-statistic: {z:.4f}")
+    print(f"P-value: {p_value:.6f}")
+    return 0
+
+
+def cmd_generate(args):
+    from .stages import load_module
+
+    module = load_module('01_data_generation')
+    if args.n_users is None:
+        module.generate_ab_test_data()
+    else:
+        arms = module.make_arms(args.arms, args.click_rates)
+        module.stream_ab_test_data(args.n_users, args.chunk_size, args.seed, args.output, args.format, arms)
+    return 0
+
+
+def cmd_eda(args):
+    from .stages import load_stage
+
+    data = _load(args, 'eda')
+    if data is None:
+        return 1
+    load_stage('eda')(data, args.mode, args.dpi, args.format, show=False if args.no_show else None)
+    return 0
+
+
+def cmd_stats(args):
+    from .stages import load_stage
+
+    data = _load_experiment(args, 'statistical')
+    if data is None:
+        return 1
+    load_stage('statistical')(data, correction=args.correction)
+    return 0
+
+
+def cmd_model(args):
+    from .stages import load_stage
+
+    if args.cache:
+        # As in 04: key on the data file, so a hit skips loading it
+        from .cache import ResultCache, data_fingerprint
+        from .storage import find_data_path
+        path = args.data or find_data_path()
+        if os.path.exists(path):
+            params = {'method': args.method, 'correction': 'holm'}
+            run = lambda: load_stage('regression')(_load(args, 'regression'), **params)
+            ResultCache(args.cache).call('regression', data_fingerprint(path), params, run)
+            return 0
+    data = _load(args, 'regression')
+    if data is None:
+        return 1
+    load_stage('regression')(data, method=args.method)
+    return 0
+
+
+def cmd_bayes(args):
+    from .stages import load_stage
+
+    data = _load_experiment(args, 'bayesian')
+    if data is None:
+        return 1
+    run = lambda: load_stage('bayesian')(data, args.method, args.n_samples, args.tol, args.cross_check,
+                                         plot=not args.no_plot)
+    if args.cache:
+        # As in 05: the posteriors depend on the click counts only, so key on those
+        from .aggregates import ensure_stats
+        from .cache import ResultCache, data_fingerprint
+        from .stages import load_module
+        data = ensure_stats(data)
+        params = {'method': args.method, 'n_samples': args.n_samples, 'tol': args.tol,
+                  'cross_check': args.cross_check, 'plot': not args.no_plot}
+        artifacts = [] if args.no_plot else [load_module('05_bayesian_modelling').FIGURE_PATH]
+        ResultCache(args.cache).call('bayesian', data_fingerprint(data), params, run, artifacts=artifacts)
+    else:
+        run()
+    return 0
+
+
+def cmd_recommend(args):
+    from .stages import load_module, load_stage
+
+    data = _load(args, 'recommendation' if args.reference else None)
+    if data is None:
+        return 1
+    stage_results = {}
+    if not args.reference:
+        from .cache import ResultCache
+        cache = ResultCache(args.cache) if args.cache else None
+        stage_results.update(load_module('06_final_recommendation').upstream_results(data, cache))
+    if args.sequential:
+        from .sequential import SequentialTest
+        stage_results['sequential'] = SequentialTest.load(args.sequential).status()
+    load_stage('recommendation')(data, stage_results)
+    return 0
+
+
+def cmd_pipeline(args):
+    from .cache import ResultCache
+    from .pipeline import run_pipeline
+
+    cache = ResultCache(args.cache) if args.cache else None
+    results = run_pipeline(path=args.data, skip=args.skip, sequential_state=args.sequential, cache=cache,
+                           validate=not args.no_validate)
+    if results is None or not results.get('validation', {'passed': True})['passed']:
+        return 1
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m thumbnail_ab',
+                                     description="YouTube thumbnail A/B test analysis")
+    parser.add_argument('--data', default=None, help="Dataset path (default: fastest ab_test_data.* on disk)")
+    parser.add_argument('--trace', default=None,
+                        help="Record step spans to this file (.json: Chrome trace, otherwise JSON lines)")
+    parser.add_argument('--profile', default=None, help="Also run cProfile and write its stats here")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('summary', help="Headline CTRs and p-value (fast start-up)")
+    p.set_defaults(func=cmd_summary)
+
+    p = sub.add_parser('generate', help="Generate synthetic data (01)")
+    p.add_argument('--n-users', type=int, default=None)
+    p.add_argument('--chunk-size', type=int, default=1_000_000)
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--format', choices=['parquet', 'feather', 'npy', 'csv'], default='csv')
+    p.add_argument('--output', default=None)
+    p.add_argument('--arms', type=int, default=2, help="Number of thumbnails (A/B/n) for streamed data")
+    p.add_argument('--click-rates', type=float, nargs='+', default=None, help="Click rate per arm, control first")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser('eda', help="Exploratory analysis and figure (02)")
+    p.add_argument('--mode', choices=['auto', 'summary', 'raw'], default='auto')
+    p.add_argument('--dpi', type=int, default=300)
+    p.add_argument('--format', choices=['png', 'svg'], default='png')
+    p.add_argument('--no-show', action='store_true')
+    p.set_defaults(func=cmd_eda)
+
+    p = sub.add_parser('stats', help="Frequentist tests and covariate balance (03)")
+    p.add_argument('--correction', choices=['holm', 'bh', 'none'], default='holm',
+                   help="Multiple-comparison correction for A/B/n tests")
+    p.add_argument('--state', default=None)
+    p.add_argument('--experiment', default='default')
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser('model', help="Covariate-adjusted logistic regression (04)")
+    p.add_argument('--method', choices=['auto', 'compressed', 'statsmodels'], default='auto')
+    p.add_argument('--cache', nargs='?', const='.ab_cache', default=None)
+    p.set_defaults(func=cmd_model)
+
+    p = sub.add_parser('bayes', help="Bayesian comparison (05)")
+    p.add_argument('--method', choices=['exact', 'sample'], default='exact')
+    p.add_argument('--n-samples', type=int, default=100000)
+    p.add_argument('--tol', type=float, default=1e-10, help="Precision target for the exact engine")
+    p.add_argument('--cross-check', action='store_true')
+    p.add_argument('--no-plot', action='store_true')
+    p.add_argument('--state', default=None)
+    p.add_argument('--experiment', default='default')
+    p.add_argument('--cache', nargs='?', const='.ab_cache', default=None)
+    p.set_defaults(func=cmd_bayes)
+
+    p = sub.add_parser('recommend', help="Final business recommendation (06)")
+    p.add_argument('--sequential', default=None)
+    p.add_argument('--cache', nargs='?', const='.ab_cache', default=None)
+    p.add_argument('--reference', action='store_true', help="Skip stages 03-05 and use the reference figures")
+    p.set_defaults(func=cmd_recommend)
+
+    p = sub.add_parser('pipeline', help="All stages in one process")
+    p.add_argument('--skip', nargs='*', default=[])
+    p.add_argument('--sequential', default=None)
+    p.add_argument('--cache', nargs='?', const='.ab_cache', default=None)
+    p.add_argument('--no-validate', action='store_true')
+    p.set_defaults(func=cmd_pipeline)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.trace or args.profile:
+        from .trace import enable
+        enable(args.trace, args.profile)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# eda.py - pre-aggregated exploratory plots that render in constant time
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import _group_codes, aggregate
+from .trace import span
+
+# One colour per arm; the first two are the original control/treatment colours
+COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f',
+          '#bcbd22', '#17becf']
+FIGURE_FORMATS = ['png', 'svg']
+
+
+def arm_colors(n_arms):
+    """COLORS repeated to cover n_arms"""
+    return [COLORS[i % len(COLORS)] for i in range(n_arms)]
+
+
+def is_headless():
+    """True when there is no display to show figures on"""
+    if sys.platform.startswith('linux'):
+        return not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return False
+
+
+def get_pyplot():
+    """Import pyplot, selecting the Agg backend on headless machines"""
+    import matplotlib
+    if is_headless():
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def show_if_interactive(plt):
+    """plt.show() only where it can display something instead of blocking"""
+    import matplotlib
+    if not is_headless() and matplotlib.get_backend().lower() != 'agg':
+        plt.show()
+    plt.close('all')
+
+
+def age_histogram(data, bin_width=1):
+    """Age counts per bin and group with one bincount; returns (bin_edges, table)"""
+    group_codes, groups = _group_codes(data['group'])
+    age = data['age'].to_numpy().astype(np.int64)
+    low, high = int(age.min()), int(age.max())
+    edges = np.arange(low, high + bin_width + 1, bin_width)
+    bins = (age - low) // bin_width
+    n_bins = len(edges) - 1
+    counts = np.bincount(group_codes.astype(np.int64) * n_bins + bins, minlength=len(groups) * n_bins)
+    return edges, pd.DataFrame(counts.reshape(len(groups), n_bins).T, columns=groups)
+
+
+def eda_summary(data, age_bin_width=2):
+    """Every aggregate the EDA figure needs, computed once from the rows"""
+    summary = aggregate(data)
+    edges, age_counts = age_histogram(data, age_bin_width)
+    return {
+        'n_rows': len(data),
+        'click_rates': pd.Series(summary.rates, index=summary.groups),
+        'age_edges': edges,
+        'age_counts': age_counts,
+        # Same as pd.crosstab(..., normalize='index')
+        'country_share': summary.covariate_table('country').pipe(lambda t: t.div(t.sum(axis=1), axis=0)),
+        'watcher_share': summary.covariate_table('previously_watched_channel').pipe(
+            lambda t: t.div(t.sum(axis=1), axis=0)),
+    }
+
+
+def render_eda(summary, path='exploratory_analysis.png', dpi=150, fmt=None, show=None):
+    """Draw the four EDA panels from eda_summary() output; cost is independent of row count"""
+    plt = get_pyplot()
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.') or 'png'
+    if fmt not in FIGURE_FORMATS:
+        raise ValueError(f"Unsupported figure format '{fmt}'. Choose from {FIGURE_FORMATS}")
+
+    plt.style.use('default')
+    fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+
+    # Plot 1: Click rates by group
+    rates = summary['click_rates']
+    axes[0, 0].bar(rates.index.astype(str), rates.to_numpy(), color=arm_colors(len(rates)))
+    axes[0, 0].set_title('Click-Through Rate by Group', fontsize=14, fontweight='bold')
+    axes[0, 0].set_xlabel('group')
+    axes[0, 0].set_ylabel('Click Rate')
+
+    # Plot 2: Age distribution by group
+    edges = summary['age_edges']
+    age_counts = summary['age_counts']
+    for color, (group, counts) in zip(arm_colors(age_counts.shape[1]), age_counts.items()):
+        axes[0, 1].stairs(counts.to_numpy(), edges, fill=True, alpha=0.6, color=color, label=str(group))
+    axes[0, 1].set_title('Age Distribution by Group', fontsize=14, fontweight='bold')
+    axes[0, 1].set_xlabel('age')
+    axes[0, 1].set_ylabel('Count')
+    axes[0, 1].legend(title='group')
+
+    # Plot 3: Country distribution
+    summary['country_share'].plot(kind='bar', ax=axes[1, 0], color=arm_colors(summary['country_share'].shape[1]))
+    axes[1, 0].set_title('Country Distribution by Group', fontsize=14, fontweight='bold')
+    axes[1, 0].tick_params(axis='x', rotation=45)
+    axes[1, 0].legend(title='Group')
+
+    # Plot 4: Previous channel watchers
+    summary['watcher_share'].plot(kind='bar', ax=axes[1, 1], color=arm_colors(summary['watcher_share'].shape[1]))
+    axes[1, 1].set_title('Previous Channel Watchers by Group', fontsize=14, fontweight='bold')
+    axes[1, 1].set_xticklabels(['Not Watched', 'Watched'], rotation=0)
+    axes[1, 1].legend(title='Group')
+
+    plt.tight_layout()
+    with span('figure_save', path=str(path), dpi=dpi):
+        plt.savefig(path, dpi=dpi, format=fmt, bbox_inches='tight')
+    if show is None or show:
+        show_if_interactive(plt)
+    else:
+        plt.close(fig)
+    return path
@@ -0,0 +1,121 @@
+# incremental.py - fold new click-event batches into mergeable per-experiment state
+import json
+import os
+from functools import reduce
+
+from .aggregates import (
+    SufficientStats, aggregate, beta_posterior, chi2_covariate, chi2_outcome, ttest_age, ttest_clicks
+)
+from .storage import load_data
+
+DEFAULT_STATE_PATH = 'ab_test_state.json'
+
+
+class ExperimentState:
+    """SufficientStats per experiment, updated batch by batch.
+
+    Each batch is aggregated once and merged into the running totals, so
+    refreshing the tests costs O(batch) to ingest and O(1) to evaluate,
+    never a rescan of the history. States built on separate shards can be
+    combined with merge() in any order.
+    """
+
+    def __init__(self, experiments=None):
+        self.experiments = dict(experiments or {})
+
+    def update(self, experiment_id, batch):
+        """Fold a batch of raw rows (or precomputed SufficientStats) into an experiment"""
+        batch_stats = batch if isinstance(batch, SufficientStats) else aggregate(batch)
+        current = self.experiments.get(experiment_id)
+        self.experiments[experiment_id] = batch_stats if current is None else current.merge(batch_stats)
+        return self.experiments[experiment_id]
+
+    def merge(self, other):
+        """Combine with the state of another shard"""
+        merged = ExperimentState(self.experiments)
+        for experiment_id, summary in other.experiments.items():
+            merged.update(experiment_id, summary)
+        return merged
+
+    def __getitem__(self, experiment_id):
+        return self.experiments[experiment_id]
+
+    def __contains__(self, experiment_id):
+        return experiment_id in self.experiments
+
+    def to_dict(self):
+        return {experiment_id: summary.to_dict() for experiment_id, summary in self.experiments.items()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls({experiment_id: SufficientStats.from_dict(v) for experiment_id, v in d.items()})
+
+    def save(self, path=DEFAULT_STATE_PATH):
+        # Write then rename so a crashed refresh never leaves a half-written state
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_STATE_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def merge_states(states):
+    """Reduce the states of several shards into one"""
+    return reduce(lambda a, b: a.merge(b), states, ExperimentState())
+
+
+def current_results(summary, alpha_prior=2, beta_prior=10):
+    """Headline test results for an experiment, computed from its counts alone"""
+    control = summary.index('control')
+    treatment = summary.index('treatment')
+    t_stat, p_value = ttest_clicks(summary, 'treatment', 'control')
+    _, p_chi, _, _ = chi2_outcome(summary)
+
+    results = {
+        'control_rate': float(summary.rates[control]),
+        'treatment_rate': float(summary.rates[treatment]),
+        'absolute_difference': float(summary.rates[treatment] - summary.rates[control]),
+        't_statistic': float(t_stat),
+        'p_value': float(p_value),
+        'chi2_p_value': float(p_chi),
+        'control_posterior': tuple(int(v) for v in beta_posterior(summary, 'control', alpha_prior, beta_prior)),
+        'treatment_posterior': tuple(int(v) for v in beta_posterior(summary, 'treatment', alpha_prior, beta_prior)),
+    }
+    if summary.age_sum is not None:
+        results['age_balance_p_value'] = float(ttest_age(summary)[1])
+    for name in summary.covariate_counts:
+        results[f'{name}_balance_p_value'] = float(chi2_covariate(summary, name)[1])
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fold new event batches into incremental experiment state")
+    parser.add_argument('batches', nargs='*', help="Batch files to ingest (any storage format)")
+    parser.add_argument('--state', default=DEFAULT_STATE_PATH)
+    parser.add_argument('--experiment', default='default')
+    parser.add_argument('--merge', nargs='*', default=[], help="Other shard state files to merge in")
+    args = parser.parse_args()
+
+    state = ExperimentState.load(args.state)
+    for path in args.merge:
+        state = state.merge(ExperimentState.load(path))
+    for path in args.batches:
+        batch = load_data(path)
+        if batch is not None:
+            state.update(args.experiment, batch)
+            print(f"✅ Ingested {len(batch):,} events from {path}")
+    state.save(args.state)
+
+    if args.experiment in state:
+        summary = state[args.experiment]
+        print(f"\n📊 EXPERIMENT '{args.experiment}' ({summary.n_total:,} events)")
+        for key, value in current_results(summary).items():
+            print(f"   {key}: {value}")
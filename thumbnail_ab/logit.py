@@ -0,0 +1,171 @@
+# logit.py - logistic regression on rows collapsed into unique covariate patterns
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from .aggregates import _codes
+from .trace import span
+
+# Same model as 'clicked ~ is_treatment + age + previously_watched_channel + C(country)'
+PATTERN_COLUMNS = ['group', 'age', 'previously_watched_channel', 'country']
+
+
+def compress(data, columns=PATTERN_COLUMNS, age_bins=None):
+    """Collapse rows into one row per unique covariate pattern.
+
+    Returns a DataFrame with the pattern columns plus 'trials' and
+    'clicks'. All covariates here are low-cardinality (age is an integer
+    from 18 to 64), so this is exact; pass age_bins to bin a continuous age
+    into bin midpoints first when that no longer holds.
+    """
+    codes, levels = [], []
+    for col in columns:
+        values = data[col]
+        if col == 'age' and age_bins is not None:
+            binned = pd.cut(values, age_bins, include_lowest=True)
+            values = pd.Series(binned.map(lambda b: b.mid).astype(float), index=data.index)
+        c, lv = _codes(values)
+        codes.append(c.astype(np.int64))
+        levels.append(lv)
+
+    # Mixed-radix key over the per-column codes, then one pass of bincount
+    key = np.zeros(len(data), dtype=np.int64)
+    for c, lv in zip(codes, levels):
+        key = key * len(lv) + c
+    unique_keys, inverse = np.unique(key, return_inverse=True)
+    trials = np.bincount(inverse)
+    clicks = np.bincount(inverse, weights=data['clicked'].to_numpy()).astype(np.int64)
+
+    patterns = {}
+    remaining = unique_keys
+    for col, lv in reversed(list(zip(columns, levels))):
+        remaining, code = np.divmod(remaining, len(lv))
+        patterns[col] = np.asarray(lv, dtype=object)[code]
+    compressed = pd.DataFrame({col: patterns[col] for col in columns})
+    compressed['trials'] = trials
+    compressed['clicks'] = clicks
+    return compressed
+
+
+def design_matrix(compressed, treatment_label='treatment', control_label='control'):
+    """Design matrix with the column names the formula API produces
+
+    Two arms get the original is_treatment dummy; an A/B/n test gets one
+    C(group)[T.<arm>] dummy per variant with the control as reference.
+    """
+    X = pd.DataFrame({'Intercept': 1.0}, index=compressed.index)
+    countries = sorted(compressed['country'].unique())
+    for country in countries[1:]:  # first level is the reference, as in C(country)
+        X[f'C(country)[T.{country}]'] = (compressed['country'] == country).astype(float)
+    arms = sorted(set(compressed['group'].unique()) - {control_label})
+    if arms == [treatment_label]:
+        X['is_treatment'] = (compressed['group'] == treatment_label).astype(float)
+    else:
+        for arm in arms:
+            X[f'C(group)[T.{arm}]'] = (compressed['group'] == arm).astype(float)
+    X['age'] = compressed['age'].astype(float)
+    X['previously_watched_channel'] = compressed['previously_watched_channel'].astype(float)
+    return X
+
+
+class LogitResult:
+    """The subset of statsmodels' LogitResults that stage 04 reads"""
+
+    def __init__(self, params, cov, llf, llnull, nobs, iterations, converged):
+        self.params = params
+        self.cov_params_ = cov
+        self.bse = pd.Series(np.sqrt(np.diag(cov)), index=params.index)
+        self.tvalues = self.params / self.bse
+        self.pvalues = pd.Series(2 * special.ndtr(-np.abs(self.tvalues)), index=params.index)
+        self.llf = llf
+        self.llnull = llnull
+        self.nobs = nobs
+        self.iterations = iterations
+        self.converged = converged
+        self.df_model = len(params) - 1
+        self.prsquared = 1 - llf / llnull
+        self.llr_pvalue = special.chdtrc(self.df_model, 2 * (llf - llnull))
+        self.aic = -2 * llf + 2 * len(params)
+        self.bic = -2 * llf + np.log(nobs) * len(params)
+
+    def conf_int(self, alpha=0.05):
+        z = special.ndtri(1 - alpha / 2)
+        return pd.DataFrame({0: self.params - z * self.bse, 1: self.params + z * self.bse})
+
+    def summary(self):
+        ci = self.conf_int()
+        lines = [
+            "Logit Regression Results (compressed covariate patterns)".center(80),
+            "=" * 80,
+            f"{'No. Observations:':<22}{self.nobs:>16,}   {'Pseudo R-squ.:':<22}{self.prsquared:>16.4f}",
+            f"{'Df Model:':<22}{self.df_model:>16}   {'Log-Likelihood:':<22}{self.llf:>16.2f}",
+            f"{'Converged:':<22}{str(self.converged):>16}   {'LL-Null:':<22}{self.llnull:>16.2f}",
+            f"{'Iterations:':<22}{self.iterations:>16}   {'LLR p-value:':<22}{self.llr_pvalue:>16.4g}",
+            "=" * 80,
+            f"{'':<32}{'coef':>8}{'std err':>10}{'z':>8}{'P>|z|':>8}{'[0.025':>8}{'0.975]':>8}",
+            "-" * 80,
+        ]
+        for name in self.params.index:
+            lines.append(f"{name:<32}{self.params[name]:>8.4f}{self.bse[name]:>10.3f}"
+                         f"{self.tvalues[name]:>8.3f}{self.pvalues[name]:>8.3f}"
+                         f"{ci.loc[name, 0]:>8.3f}{ci.loc[name, 1]:>8.3f}")
+        lines.append("=" * 80)
+        return "\n".join(lines)
+
+
+def fit_binomial_logit(X, clicks, trials, max_iter=35, tol=1e-8, verbose=True, start_params=None):
+    """Newton-Raphson for a logit model on (clicks, trials) per design row.
+
+    The log-likelihood equals the Bernoulli log-likelihood of the original
+    rows, so llf, pseudo R-squared, AIC and BIC match an ungrouped fit.
+    start_params warm-starts the iterations (e.g. for bootstrap refits).
+    """
+    names = X.columns
+    X = X.to_numpy(dtype=np.float64)
+    clicks = np.asarray(clicks, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    nobs = int(trials.sum())
+
+    def loglik(eta):
+        return float(np.sum(clicks * eta - trials * np.logaddexp(0, eta)))
+
+    beta = np.zeros(X.shape[1]) if start_params is None else np.array(start_params, dtype=np.float64)
+    llf = loglik(X @ beta)
+    converged = False
+    for iteration in range(1, max_iter + 1):
+        with span('logit_iteration', rows=len(X), iteration=iteration):
+            eta = X @ beta
+            p = special.expit(eta)
+            gradient = X.T @ (clicks - trials * p)
+            hessian = (X * (trials * p * (1 - p))[:, None]).T @ X
+            step = np.linalg.solve(hessian, gradient)
+            beta = beta + step
+            new_llf = loglik(X @ beta)
+        if verbose:
+            print(f"   Iteration {iteration}: log-likelihood = {new_llf:.6f}")
+        if abs(new_llf - llf) < tol * (abs(llf) + tol) and np.max(np.abs(step)) < 1e-6:
+            llf = new_llf
+            converged = True
+            break
+        llf = new_llf
+
+    p = special.expit(X @ beta)
+    hessian = (X * (trials * p * (1 - p))[:, None]).T @ X
+    cov = np.linalg.inv(hessian)
+
+    p_null = clicks.sum() / trials.sum()
+    llnull = float(clicks.sum() * np.log(p_null) + (trials.sum() - clicks.sum()) * np.log1p(-p_null))
+
+    params = pd.Series(beta, index=names)
+    return LogitResult(params, pd.DataFrame(cov, index=names, columns=names), llf, llnull,
+                       nobs, iteration, converged)
+
+
+def fit_compressed_logit(data, age_bins=None, verbose=True):
+    """Fit the stage 04 model on compressed covariate patterns"""
+    with span('logit_compress', rows=len(data)):
+        compressed = compress(data, age_bins=age_bins)
+    if verbose:
+        print(f"Compressed {len(data):,} rows into {len(compressed):,} covariate patterns")
+    X = design_matrix(compressed)
+    return fit_binomial_logit(X, compressed['clicks'], compressed['trials'], verbose=verbose), compressed
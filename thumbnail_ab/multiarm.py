@@ -0,0 +1,150 @@
+# multiarm.py - A/B/n thumbnail tests: every pairwise comparison as one vectorized matrix
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from .aggregates import ensure_stats
+from .bayes import evaluate_experiments, pairwise_prob_greater
+from .segments import benjamini_hochberg, holm
+
+CONTROL = 'control'
+CORRECTIONS = {'holm': holm, 'bh': benjamini_hochberg, 'none': lambda p: np.asarray(p, dtype=np.float64)}
+
+# Name of an arm's dummy in the logit design matrix, as the formula API names C(group)
+ARM_TERM = 'C(group)[T.{}]'
+
+
+def is_multiarm(summary):
+    """True for more than the original two arms"""
+    return len(summary.groups) > 2
+
+
+def arm_order(groups, control=CONTROL):
+    """Arms with the control first, the rest in their original order"""
+    if control not in groups:
+        raise ValueError(f"No '{control}' arm among {list(groups)}")
+    return [control] + [g for g in groups if g != control]
+
+
+def best_arm(summary, control=CONTROL):
+    """Non-control arm with the highest observed click rate"""
+    candidates = [i for i, g in enumerate(summary.groups) if g != control]
+    return summary.groups[max(candidates, key=lambda i: summary.rates[i])]
+
+
+def _correct(p_values, correction):
+    if correction not in CORRECTIONS:
+        raise ValueError(f"Unknown correction '{correction}'. Choose from {list(CORRECTIONS)}")
+    return CORRECTIONS[correction](p_values)
+
+
+def pairwise_tests(data, correction='holm'):
+    """Pooled-variance t-tests on click indicators for every pair of arms.
+
+    Same test as aggregates.ttest_clicks, evaluated for all pairs at once by
+    broadcasting the per-arm counts. Returns (n_arms, n_arms) DataFrames
+    where entry [i, j] compares arm i against arm j: 'difference' (CTR_i -
+    CTR_j), 't_statistic', 'p_value' and 'p_adjusted', the latter corrected
+    over the n_arms * (n_arms - 1) / 2 distinct pairs.
+    """
+    summary = ensure_stats(data)
+    n = summary.trials.astype(np.float64)
+    s = summary.successes.astype(np.float64)
+    rate = s / n
+    var = (s - n * rate ** 2) / (n - 1)          # sample variance of the 0/1 clicks
+
+    n_i, n_j = n[:, None], n[None, :]
+    pooled = ((n_i - 1) * var[:, None] + (n_j - 1) * var[None, :]) / (n_i + n_j - 2)
+    difference = rate[:, None] - rate[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = difference / np.sqrt(pooled * (1 / n_i + 1 / n_j))
+    p_value = 2 * special.stdtr(n_i + n_j - 2, -np.abs(t))
+    np.fill_diagonal(t, np.nan)
+    np.fill_diagonal(p_value, np.nan)
+
+    upper = np.triu_indices(len(n), 1)
+    p_adjusted = np.full_like(p_value, np.nan)
+    p_adjusted[upper] = _correct(p_value[upper], correction)
+    p_adjusted.T[upper] = p_adjusted[upper]
+
+    frame = lambda values: pd.DataFrame(values, index=summary.groups, columns=summary.groups)
+    return {
+        'difference': frame(difference),
+        't_statistic': frame(t),
+        'p_value': frame(p_value),
+        'p_adjusted': frame(p_adjusted),
+    }
+
+
+def compare_to_control(data, control=CONTROL, correction='holm', alpha=0.05):
+    """One row per variant against the control, corrected over the n_arms - 1 comparisons"""
+    summary = ensure_stats(data)
+    pairwise = pairwise_tests(summary, correction='none')
+    arms = arm_order(summary.groups, control)[1:]
+    c = summary.index(control)
+
+    table = pd.DataFrame({
+        'ctr': summary.rates[[summary.index(a) for a in arms]],
+        'clicks': summary.successes[[summary.index(a) for a in arms]],
+        'trials': summary.trials[[summary.index(a) for a in arms]],
+        'absolute_difference': pairwise['difference'].loc[arms, control].to_numpy(),
+        't_statistic': pairwise['t_statistic'].loc[arms, control].to_numpy(),
+        'p_value': pairwise['p_value'].loc[arms, control].to_numpy(),
+    }, index=pd.Index(arms, name='arm'))
+    table['relative_improvement'] = table['absolute_difference'] / summary.rates[c] * 100
+    table['p_adjusted'] = _correct(table['p_value'].to_numpy(), correction)
+    table['significant'] = table['p_adjusted'] < alpha
+    return table
+
+
+def bayesian_arms(data, alpha_prior=2, beta_prior=10, level=0.95, control=CONTROL):
+    """Per-arm posteriors with probability of being best, plus the P(row > column) matrix"""
+    summary = ensure_stats(data)
+    arms = arm_order(summary.groups, control)
+    idx = [summary.index(a) for a in arms]
+    successes, trials = summary.successes[idx], summary.trials[idx]
+
+    evaluated = evaluate_experiments(successes, trials, alpha_prior, beta_prior, level)
+    table = pd.DataFrame({key: values[0] for key, values in evaluated.items()}, index=pd.Index(arms, name='arm'))
+    prob_greater = pairwise_prob_greater(table['alpha_posterior'].to_numpy(), table['beta_posterior'].to_numpy())
+    return table, pd.DataFrame(prob_greater, index=arms, columns=arms)
+
+
+def arm_effects(logit_result, arms, correction='holm', alpha=0.05):
+    """Adjusted odds ratio of every variant against the control from a multi-arm logit fit"""
+    terms = [ARM_TERM.format(arm) for arm in arms]
+    conf_int = logit_result.conf_int()
+    table = pd.DataFrame({
+        'odds_ratio': np.exp(logit_result.params[terms].to_numpy()),
+        'confidence_interval_lower': np.exp(conf_int.loc[terms, 0].to_numpy()),
+        'confidence_interval_upper': np.exp(conf_int.loc[terms, 1].to_numpy()),
+        'p_value': logit_result.pvalues[terms].to_numpy(),
+    }, index=pd.Index(arms, name='arm'))
+    table['p_adjusted'] = _correct(table['p_value'].to_numpy(), correction)
+    table['significant'] = table['p_adjusted'] < alpha
+    return table
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .storage import load_data
+
+    parser = argparse.ArgumentParser(description="Pairwise and per-arm comparisons for an A/B/n test")
+    parser.add_argument('--data', default=None)
+    parser.add_argument('--correction', choices=list(CORRECTIONS), default='holm')
+    args = parser.parse_args()
+
+    data = load_data(args.data, columns=['group', 'clicked'])
+    if data is not None:
+        summary = ensure_stats(data)
+        print("🎰 A/B/n COMPARISONS")
+        print("=" * 50)
+        print(compare_to_control(summary, correction=args.correction).round(6).to_string())
+        print(f"\nPairwise adjusted p-values ({args.correction}):")
+        print(pairwise_tests(summary, args.correction)['p_adjusted'].round(6).to_string())
+        table, prob_greater = bayesian_arms(summary)
+        print("\nPosterior summary:")
+        print(table[['posterior_mean', 'prob_best', 'expected_loss']].round(6).to_string())
+        print("\nP(row arm > column arm):")
+        print(prob_greater.round(4).to_string())
@@ -0,0 +1,173 @@
+# parallel.py - run stages 03-05 over row partitions on a process pool, then reduce
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from .aggregates import aggregate
+from .cuped import moments
+from .logit import LogitResult, compress, design_matrix
+from .stages import load_stage
+from .storage import infer_format, read_partition, row_partitions
+from .trace import pool_map, span
+
+# Everything stages 03-05 read; each partition is read once for all of them
+SCAN_COLUMNS = ['group', 'clicked', 'age', 'country', 'previously_watched_channel']
+
+# Partitions per worker, so a slow partition does not hold up the whole pool
+PARTITIONS_PER_WORKER = 4
+
+
+def plan_partitions(paths, n_partitions):
+    """(path, fmt, start, stop) for every partition of every shard file
+
+    Separate files are partitions in their own right; each file is split
+    further where its format allows (see storage.row_partitions).
+    """
+    per_file = max(1, -(-n_partitions // len(paths)))
+    partitions = []
+    for path in paths:
+        fmt = infer_format(path)
+        partitions += [(path, fmt, start, stop) for start, stop in row_partitions(path, per_file, fmt)]
+    return partitions
+
+
+def scan_partition(partition, age_bins=None):
+    """Map step: count tables, CUPED moments and logit covariate patterns of one partition"""
+    path, fmt, start, stop = partition
+    data = read_partition(path, SCAN_COLUMNS, start, stop, fmt)
+    return aggregate(data), moments(data), compress(data, age_bins=age_bins)
+
+
+def newton_terms(block, beta):
+    """Gradient, Hessian and log-likelihood of the binomial logit on one partition's patterns"""
+    X, clicks, trials = block
+    eta = X @ beta
+    p = special.expit(eta)
+    gradient = X.T @ (clicks - trials * p)
+    hessian = (X * (trials * p * (1 - p))[:, None]).T @ X
+    return gradient, hessian, float(np.sum(clicks * eta - trials * np.logaddexp(0, eta)))
+
+
+def _newton_terms(args):
+    return newton_terms(*args)
+
+
+def design_blocks(compressed_parts):
+    """Design matrix rows of every partition, with columns shared across all of them
+
+    The design is built once over all partitions' patterns so that every
+    block has the same reference levels and dummies, then split back.
+    """
+    table = pd.concat([part.assign(partition=i) for i, part in enumerate(compressed_parts)], ignore_index=True)
+    X = design_matrix(table)
+    values = X.to_numpy(dtype=np.float64)
+    blocks = []
+    for i in range(len(compressed_parts)):
+        rows = (table['partition'] == i).to_numpy()
+        blocks.append((values[rows], table.loc[rows, 'clicks'].to_numpy(np.float64),
+                       table.loc[rows, 'trials'].to_numpy(np.float64)))
+    return blocks, X.columns
+
+
+def fit_partitioned_logit(blocks, names, pool, max_iter=35, tol=1e-8):
+    """Newton-Raphson with each iteration's gradient and Hessian summed over partitions on the pool
+
+    Converges to the same estimates as logit.fit_binomial_logit on all the
+    rows; only (k,) gradients and (k, k) Hessians come back per partition.
+    """
+    def reduced_terms(beta):
+        with span('logit_iteration', partitions=len(blocks)):
+            terms = pool_map(pool, _newton_terms, [(block, beta) for block in blocks])
+        return sum(t[0] for t in terms), sum(t[1] for t in terms), sum(t[2] for t in terms)
+
+    beta = np.zeros(len(names))
+    gradient, hessian, llf = reduced_terms(beta)
+    converged = False
+    for iteration in range(1, max_iter + 1):
+        step = np.linalg.solve(hessian, gradient)
+        beta = beta + step
+        gradient, hessian, new_llf = reduced_terms(beta)
+        print(f"   Iteration {iteration}: log-likelihood = {new_llf:.6f}")
+        done = abs(new_llf - llf) < tol * (abs(llf) + tol) and np.max(np.abs(step)) < 1e-6
+        llf = new_llf
+        if done:
+            converged = True
+            break
+
+    clicks = sum(block[1].sum() for block in blocks)
+    trials = sum(block[2].sum() for block in blocks)
+    p_null = clicks / trials
+    llnull = float(clicks * np.log(p_null) + (trials - clicks) * np.log1p(-p_null))
+    cov = np.linalg.inv(hessian)
+    return LogitResult(pd.Series(beta, index=names), pd.DataFrame(cov, index=names, columns=names), llf, llnull,
+                       int(trials), iteration, converged)
+
+
+def merge_patterns(compressed_parts):
+    """Sum the pattern tables of all partitions into one, as compress() on all rows would give"""
+    table = pd.concat(compressed_parts, ignore_index=True)
+    pattern_columns = [c for c in table.columns if c not in ('trials', 'clicks')]
+    return table.groupby(pattern_columns, sort=True, observed=True)[['trials', 'clicks']].sum().reset_index()
+
+
+def run_partitioned(paths, workers=None, skip=(), age_bins=None, n_partitions=None):
+    """Stages 03-05 on one or more dataset files without ever holding all rows in memory.
+
+    Every partition is read once on the pool and reduced to SufficientStats,
+    CUPED moments and logit patterns; those merge into the inputs of the
+    statistical and Bayesian stages, and the regression stage receives a fit
+    whose gradient and Hessian were summed across partitions.
+    """
+    workers = workers or os.cpu_count()
+    partitions = plan_partitions(list(paths), n_partitions or workers * PARTITIONS_PER_WORKER)
+    print(f"🧩 {len(partitions)} partitions on {workers} worker processes")
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        with span('partition_scan', partitions=len(partitions)):
+            scanned = pool_map(pool, scan_partition, partitions, [age_bins] * len(partitions))
+        summary = reduce(lambda a, b: a.merge(b), (s[0] for s in scanned))
+        moment_state = reduce(lambda a, b: a.merge(b), (s[1] for s in scanned))
+        compressed_parts = [s[2] for s in scanned]
+        print(f"✅ Scanned {summary.n_total:,} rows")
+
+        if 'statistical' not in skip:
+            results['statistical'] = load_stage('statistical')(summary)
+        if 'regression' not in skip:
+            blocks, names = design_blocks(compressed_parts)
+            print("\nFitting the covariate-adjusted logit across partitions...")
+            logit_result = fit_partitioned_logit(blocks, names, pool)
+            fitted = (logit_result, merge_patterns(compressed_parts), moment_state)
+            results['regression'] = load_stage('regression')(None, fitted=fitted)
+        if 'bayesian' not in skip:
+            results['bayesian'] = load_stage('bayesian')(summary)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from .storage import find_data_path
+    from .trace import enable as enable_tracing
+
+    parser = argparse.ArgumentParser(description="Run stages 03-05 over row partitions on a process pool")
+    parser.add_argument('paths', nargs='*', help="Dataset file(s); several files are treated as shards")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--partitions', type=int, default=None,
+                        help=f"Partitions in total (default: {PARTITIONS_PER_WORKER} per worker)")
+    parser.add_argument('--skip', nargs='*', default=[], choices=['statistical', 'regression', 'bayesian'])
+    parser.add_argument('--trace', default=None, help="Record step spans to this file")
+    args = parser.parse_args()
+
+    if args.trace:
+        enable_tracing(args.trace)
+    print("🧵 PARTITIONED ANALYSIS")
+    print("=" * 50)
+    start = time.perf_counter()
+    run_partitioned(args.paths or [find_data_path()], args.workers, args.skip, n_partitions=args.partitions)
+    print(f"\n⏱️  Finished in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,217 @@
+# permutation.py - batched group-label permutation tests on packed bit arrays
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import stats
+
+from .aggregates import _codes
+from .trace import pool_map
+
+STATISTICS = ['ctr_difference', 'age_difference', 'watcher_difference', 'country_chi2']
+PACK_BLOCK = 64  # permutations shuffled as booleans before being packed
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(x):
+        return _POPCOUNT_TABLE[x]
+
+
+def _bit_count(labels_packed, feature_packed):
+    """Number of set bits in labels & feature, per permutation row"""
+    return _popcount(labels_packed & feature_packed).sum(axis=1, dtype=np.int64)
+
+
+class PermutationData:
+    """Rows reduced to what the permutation statistics need.
+
+    Binary columns (clicks, watcher flag, one indicator per country) are
+    packed 8 rows per byte, so the count of ones falling in the permuted
+    treatment group is a bitwise AND plus popcount. Only the rows of the
+    two compared arms are kept, so on A/B/n data each variant is tested
+    against the control rather than against every other arm.
+    """
+
+    def __init__(self, data, treatment_label='treatment', control_label='control'):
+        for label in (control_label, treatment_label):
+            if not (data['group'] == label).any():
+                raise ValueError(f"No '{label}' arm among {sorted(data['group'].unique())}")
+        data = data[data['group'].isin([control_label, treatment_label])]
+        self.is_treatment = (data['group'] == treatment_label).to_numpy()
+        self.n = len(self.is_treatment)
+        self.n_treatment = int(self.is_treatment.sum())
+        self.n_control = self.n - self.n_treatment
+
+        self.bits = {'clicked': np.packbits(data['clicked'].to_numpy().astype(bool))}
+        self.totals = {'clicked': int(data['clicked'].sum())}
+        if 'previously_watched_channel' in data:
+            watched = data['previously_watched_channel'].to_numpy().astype(bool)
+            self.bits['watched'] = np.packbits(watched)
+            self.totals['watched'] = int(watched.sum())
+        self.country_levels = []
+        if 'country' in data:
+            codes, levels = _codes(data['country'])
+            # Levels absent from this segment carry no information
+            self.country_levels = [level for i, level in enumerate(levels) if np.any(codes == i)]
+            for i, level in enumerate(levels):
+                if level in self.country_levels:
+                    self.bits[f'country={level}'] = np.packbits(codes == i)
+                    self.totals[f'country={level}'] = int((codes == i).sum())
+        self.age = data['age'].to_numpy(dtype=np.float64) if 'age' in data else None
+
+    def statistics(self, labels_packed, age_treatment=None):
+        """All available statistics for (n_perm, n / 8) packed labels
+
+        age_treatment holds the summed age of each permutation's treatment
+        rows, which popcounts cannot give.
+        """
+        labels_packed = np.atleast_2d(labels_packed)
+        n_t, n_c = self.n_treatment, self.n_control
+        out = {}
+
+        def difference(key):
+            in_treatment = _bit_count(labels_packed, self.bits[key])
+            return np.abs(in_treatment / n_t - (self.totals[key] - in_treatment) / n_c)
+
+        out['ctr_difference'] = difference('clicked')
+        if 'watched' in self.bits:
+            out['watcher_difference'] = difference('watched')
+        if self.age is not None:
+            age_t = np.asarray(age_treatment, dtype=np.float64)
+            out['age_difference'] = np.abs(age_t / n_t - (self.age.sum() - age_t) / n_c)
+        if len(self.country_levels) > 1:
+            # Pearson chi-square of the country x group table, one row per permutation
+            observed_t = np.stack([_bit_count(labels_packed, self.bits[f'country={c}'])
+                                   for c in self.country_levels], axis=1)
+            totals = np.array([self.totals[f'country={c}'] for c in self.country_levels])
+            observed_c = totals - observed_t
+            expected_t = totals * n_t / self.n
+            expected_c = totals * n_c / self.n
+            out['country_chi2'] = (((observed_t - expected_t) ** 2 / expected_t).sum(axis=1)
+                                   + ((observed_c - expected_c) ** 2 / expected_c).sum(axis=1))
+        return out
+
+
+def _permutation_batch(pdata, observed, n_permutations, seed_seq):
+    """Worker: count permutations at least as extreme as observed, per statistic
+
+    Labels are shuffled PACK_BLOCK permutations at a time and packed
+    straight away, so the unpacked boolean scratch stays at PACK_BLOCK x n
+    whatever the batch size.
+    """
+    rng = np.random.default_rng(seed_seq)
+    base = np.zeros(pdata.n, dtype=bool)
+    base[:pdata.n_treatment] = True
+    extreme = {stat: 0 for stat in observed}
+    for start in range(0, n_permutations, PACK_BLOCK):
+        block = min(PACK_BLOCK, n_permutations - start)
+        labels = rng.permuted(np.broadcast_to(base, (block, pdata.n)), axis=1)
+        age_t = labels @ pdata.age if pdata.age is not None else None
+        values = pdata.statistics(np.packbits(labels, axis=1), age_t)
+        for stat in observed:
+            # A small tolerance so ties are not lost to floating-point noise
+            extreme[stat] += int(np.sum(values[stat] >= observed[stat] - 1e-12))
+    return extreme
+
+
+def permutation_test(data, statistics=None, mc_error=0.001, max_permutations=100000, batch_size=1000,
+                     n_workers=None, seed=42, treatment_label='treatment', control_label='control',
+                     verbose=True):
+    """Monte Carlo permutation p-values for CTR difference and covariate balance.
+
+    Group labels are shuffled in small blocks and packed 8 per byte;
+    binary statistics are counted on the packed bits and the age
+    difference is one matrix-vector product per block. Only the control and
+    treatment_label arms take part, so pass treatment_label to test one
+    variant of an A/B/n experiment. Batches run on a process
+    pool with per-batch seeds from SeedSequence(seed). Sampling stops once
+    the Monte Carlo standard error of every p-value is at most mc_error, or
+    after max_permutations.
+    """
+    pdata = data if isinstance(data, PermutationData) else PermutationData(data, treatment_label, control_label)
+    is_t = pdata.is_treatment
+    age_t = [is_t @ pdata.age] if pdata.age is not None else None
+    observed = pdata.statistics(np.packbits(is_t), age_t)
+    observed = {stat: float(value[0]) for stat, value in observed.items()
+                if statistics is None or stat in statistics}
+
+    n_workers = n_workers or os.cpu_count() or 1
+    n_batches = -(-max_permutations // batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_batches)
+
+    extreme = {stat: 0 for stat in observed}
+    done = 0
+    executor = ProcessPoolExecutor(n_workers) if n_workers > 1 else None
+    try:
+        for round_start in range(0, n_batches, n_workers):
+            batch_ids = range(round_start, min(round_start + n_workers, n_batches))
+            sizes = [min(batch_size, max_permutations - i * batch_size) for i in batch_ids]
+            args = [(pdata, observed, size, seeds[i]) for i, size in zip(batch_ids, sizes)]
+            if executor is None:
+                batches = [_permutation_batch(*a) for a in args]
+            else:
+                batches = pool_map(executor, _permutation_batch, *zip(*args))
+            for batch in batches:
+                for stat, count in batch.items():
+                    extreme[stat] += count
+            done += sum(sizes)
+
+            p_values = {stat: (1 + extreme[stat]) / (1 + done) for stat in observed}
+            standard_errors = {stat: np.sqrt(p * (1 - p) / done) for stat, p in p_values.items()}
+            if max(standard_errors.values()) <= mc_error:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    results = {
+        'n_permutations': done,
+        'observed': observed,
+        'p_values': p_values,
+        'mc_standard_errors': standard_errors,
+    }
+    # Under label permutation the treatment click count is hypergeometric,
+    # so the CTR test also has an exact answer (Fisher's exact test)
+    clicks_t = int(_bit_count(np.packbits(is_t)[None], pdata.bits['clicked'])[0])
+    clicks_c = pdata.totals['clicked'] - clicks_t
+    table = [[clicks_c, pdata.n_control - clicks_c], [clicks_t, pdata.n_treatment - clicks_t]]
+    results['ctr_exact_p_value'] = float(stats.fisher_exact(table)[1])
+
+    if verbose:
+        print(f"\n🔀 PERMUTATION TESTS ({done:,} permutations)")
+        for stat in observed:
+            print(f"   {stat}: observed {observed[stat]:.4f}, p-value {p_values[stat]:.4f} "
+                  f"(± {standard_errors[stat]:.4f})")
+        print(f"   Exact (Fisher) p-value for CTR difference: {results['ctr_exact_p_value']:.6f}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .storage import load_data
+
+    parser = argparse.ArgumentParser(description="Permutation tests for CTR difference and covariate balance")
+    parser.add_argument('--data', default=None)
+    parser.add_argument('--where', nargs='*', default=[], help="Segment filters such as country=UK")
+    parser.add_argument('--mc-error', type=float, default=0.001)
+    parser.add_argument('--max-permutations', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--treatment', default='treatment', help="Arm compared against the control")
+    parser.add_argument('--control', default='control')
+    args = parser.parse_args()
+
+    data = load_data(args.data, columns=['group', 'clicked', 'age', 'country', 'previously_watched_channel'])
+    if data is not None:
+        for condition in args.where:
+            column, value = condition.split('=', 1)
+            data = data[data[column].astype(str) == value]
+        print(f"Segment size: {len(data):,} users")
+        permutation_test(data, mc_error=args.mc_error, max_permutations=args.max_permutations,
+                         batch_size=args.batch_size, n_workers=args.workers, seed=args.seed,
+                         treatment_label=args.treatment, control_label=args.control)
@@ -0,0 +1,91 @@
+# pipeline.py - run stages 02-06 in one process on a single load of the data
+from .aggregates import aggregate
+from .cache import data_fingerprint
+from .sequential import SequentialTest
+from .stages import AGGREGATE_STAGES, STAGES, load_module, load_stage
+from .storage import find_data_path, load_data
+from .validation import print_report, validate_data, validate_file
+
+# Stages whose results depend only on the data and these parameters, so a
+# ResultCache can serve them; the parameters are passed to the stage and keyed on
+CACHED_STAGES = {
+    'statistical': {'correction': 'holm'},
+    'regression': {'method': 'auto', 'correction': 'holm'},
+    'bayesian': {'plot': True},
+}
+
+
+def run_pipeline(data=None, path=None, skip=(), sequential_state=None, cache=None, validate=True,
+                 params=None):
+    """Run every stage on one in-memory dataset and collect their results.
+
+    The raw rows are aggregated once into SufficientStats for the stages
+    that only need counts. The final recommendation receives the results
+    of the statistical, regression and Bayesian stages instead of its
+    reference constants, plus the sequential test decision when
+    sequential_state is given.
+
+    With a ResultCache, the statistical, regression and Bayesian stages are
+    looked up by the fingerprint of their input (the counts, or the data
+    file) and only recomputed when it has changed.
+
+    With validate=True the data-quality checks run first; if any fails,
+    no stage runs and the results hold only the 'validation' report.
+
+    params maps a stage key to keyword overrides for that stage, e.g.
+    {'bayesian': {'plot': False}}; cached stages are keyed on them too.
+    """
+    params = params or {}
+    results = {}
+    if data is None:
+        path = path or find_data_path()
+        if validate:
+            # The file is checked as stored, before load_data narrows its dtypes
+            try:
+                results['validation'] = validate_file(path)
+            except FileNotFoundError:
+                print(f"❌ ERROR: {path} not found. Run 01_data_generation.py first.")
+                return None
+    else:
+        path = None
+        if validate:
+            results['validation'] = validate_data(data)
+
+    if validate:
+        print_report(results['validation'])
+        if not results['validation']['passed']:
+            print("🛑 Stopping before the analysis stages")
+            return results
+
+    if path is not None:
+        data = load_data(path, verbose=True)
+        if data is None:
+            return None
+
+    summary = aggregate(data)
+    if cache is not None:
+        summary_fingerprint = data_fingerprint(summary)
+        rows_fingerprint = data_fingerprint(path or data)
+
+    if sequential_state:
+        results['sequential'] = SequentialTest.load(sequential_state).status()
+
+    for key, (_, function_name) in STAGES.items():
+        if key in skip:
+            print(f"\n⏭️  SKIPPING {function_name}")
+            continue
+        stage = load_stage(key)
+        stage_input = summary if key in AGGREGATE_STAGES else data
+        if key == 'recommendation':
+            results[key] = stage(stage_input, stage_results=results)
+        elif cache is not None and key in CACHED_STAGES:
+            fingerprint = summary_fingerprint if key in AGGREGATE_STAGES else rows_fingerprint
+            stage_params = {**CACHED_STAGES[key], **params.get(key, {})}
+            # A hit whose figure is missing or changed reruns the stage to redraw it
+            figure = getattr(load_module(STAGES[key][0]), 'FIGURE_PATH', None) if stage_params.get('plot') else None
+            results[key] = cache.call(key, fingerprint, stage_params, stage, stage_input,
+                                      artifacts=[figure] if figure else [], **stage_params)
+        else:
+            results[key] = stage(stage_input, **params.get(key, {}))
+
+    return results
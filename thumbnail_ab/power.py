@@ -0,0 +1,340 @@
+# power.py - sample size, power and test duration for the two-proportion test and the adjusted logit
+import itertools
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from .logit import compress, design_matrix, fit_compressed_logit
+
+# Covariate mix of 01_data_generation.py, used when no dataset is given
+COUNTRY_PROBS = {'US': 0.6, 'UK': 0.2, 'CA': 0.15, 'AU': 0.05}
+WATCHED_PROB = 0.3
+AGES = np.arange(18, 65)
+
+TREATMENT_TERM = 'is_treatment'
+MAX_SIM_ELEMENTS = 20_000_000  # simulations x grid points drawn at once
+MAX_SIM_CELLS = 4_000_000      # simulations x grid points x covariate cells in one batched logit fit
+
+
+def _alpha_per_comparison(alpha, n_arms):
+    # Bonferroni over the n_arms - 1 variant-vs-control comparisons (conservative for Holm)
+    return alpha / (n_arms - 1)
+
+
+def _treatment_rate(baseline, mde, relative):
+    return baseline * (1 + mde) if relative else baseline + mde
+
+
+def _rates(baseline, mde, relative):
+    p1 = np.asarray(baseline, dtype=np.float64)
+    p2 = _treatment_rate(p1, np.asarray(mde, dtype=np.float64), relative)
+    if np.any((p2 <= 0) | (p2 >= 1)):
+        raise ValueError("baseline + mde must stay strictly between 0 and 1")
+    return p1, p2
+
+
+# ---------------------------------------------------------------------------
+# Two-proportion test (stage 03)
+# ---------------------------------------------------------------------------
+
+def sample_size_two_proportions(baseline, mde, alpha=0.05, power=0.8, ratio=1.0, relative=False, n_arms=2):
+    """Control users needed to detect mde with a two-sided two-proportion test
+
+    Each variant gets ratio times as many users. mde is an absolute CTR
+    difference, or a fraction of the baseline with relative=True. All
+    arguments broadcast, so whole grids are computed at once.
+    """
+    p1, p2 = _rates(baseline, mde, relative)
+    z_alpha = special.ndtri(1 - _alpha_per_comparison(alpha, n_arms) / 2)
+    z_beta = special.ndtri(power)
+    p_bar = (p1 + ratio * p2) / (1 + ratio)
+    n = (z_alpha * np.sqrt(p_bar * (1 - p_bar) * (1 + 1 / ratio))
+         + z_beta * np.sqrt(p1 * (1 - p1) + p2 * (1 - p2) / ratio)) ** 2 / (p2 - p1) ** 2
+    return np.ceil(n)
+
+
+def power_two_proportions(baseline, mde, n_per_arm, alpha=0.05, ratio=1.0, relative=False, n_arms=2):
+    """Analytic power of the two-proportion test with n_per_arm control users"""
+    p1, p2 = _rates(baseline, mde, relative)
+    n1 = np.asarray(n_per_arm, dtype=np.float64)
+    n2 = ratio * n1
+    z_alpha = special.ndtri(1 - _alpha_per_comparison(alpha, n_arms) / 2)
+    p_bar = (n1 * p1 + n2 * p2) / (n1 + n2)
+    se_null = np.sqrt(p_bar * (1 - p_bar) * (1 / n1 + 1 / n2))
+    se_alt = np.sqrt(p1 * (1 - p1) / n1 + p2 * (1 - p2) / n2)
+    diff = np.abs(p2 - p1)
+    return special.ndtr((diff - z_alpha * se_null) / se_alt) + special.ndtr((-diff - z_alpha * se_null) / se_alt)
+
+
+def simulate_power_two_proportions(baseline, mde, n_per_arm, alpha=0.05, ratio=1.0, relative=False, n_arms=2,
+                                   n_sims=2000, seed=42, max_elements=MAX_SIM_ELEMENTS):
+    """Monte Carlo power of the pooled t-test that stage 03 runs (ttest_clicks).
+
+    Every grid point (the broadcast of baseline, mde and n_per_arm) gets
+    n_sims simulated experiments drawn as binomial click counts; the test
+    statistic is computed from the counts for all of them at once.
+    """
+    p1, p2 = _rates(baseline, mde, relative)
+    p1, p2, n1 = np.broadcast_arrays(p1, p2, np.asarray(n_per_arm, dtype=np.int64))
+    shape = p1.shape
+    p1, p2, n1 = p1.ravel(), p2.ravel(), n1.ravel()
+    n2 = np.round(ratio * n1).astype(np.int64)
+    alpha_eff = _alpha_per_comparison(alpha, n_arms)
+
+    rng = np.random.default_rng(seed)
+    power = np.empty(len(p1))
+    chunk = max(1, max_elements // n_sims)
+    for start in range(0, len(p1), chunk):
+        sl = slice(start, start + chunk)
+        s1 = rng.binomial(n1[sl], p1[sl], size=(n_sims, len(p1[sl]))).astype(np.float64)
+        s2 = rng.binomial(n2[sl], p2[sl], size=(n_sims, len(p2[sl]))).astype(np.float64)
+        m1, m2 = s1 / n1[sl], s2 / n2[sl]
+        # Pooled variance of the 0/1 clicks, as in stats.ttest_ind on the rows
+        pooled = (s1 - n1[sl] * m1 ** 2 + s2 - n2[sl] * m2 ** 2) / (n1[sl] + n2[sl] - 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (m2 - m1) / np.sqrt(pooled * (1 / n1[sl] + 1 / n2[sl]))
+        p_value = 2 * special.stdtr(n1[sl] + n2[sl] - 2, -np.abs(t))
+        power[sl] = np.mean(p_value < alpha_eff, axis=0)
+    return power.reshape(shape)
+
+
+# ---------------------------------------------------------------------------
+# Covariate-adjusted logit (stage 04)
+# ---------------------------------------------------------------------------
+
+def covariate_patterns(data=None):
+    """Covariate mix as (patterns, probabilities), without the group column.
+
+    Taken from the rows of data when given, otherwise the independent
+    age / watcher / country mix that 01_data_generation.py draws from.
+    """
+    columns = ['age', 'previously_watched_channel', 'country']
+    if data is not None:
+        compressed = compress(data, columns=columns)
+        return compressed[columns], (compressed['trials'] / compressed['trials'].sum()).to_numpy()
+
+    rows = list(itertools.product(AGES, [0, 1], COUNTRY_PROBS))
+    patterns = pd.DataFrame(rows, columns=columns)
+    probs = (1 / len(AGES)
+             * np.where(patterns['previously_watched_channel'] == 1, WATCHED_PROB, 1 - WATCHED_PROB)
+             * patterns['country'].map(COUNTRY_PROBS).to_numpy())
+    return patterns, probs
+
+
+def covariate_effects_from_data(data):
+    """Covariate log-odds coefficients of the stage 04 model fitted to data"""
+    result, _ = fit_compressed_logit(data, verbose=False)
+    return result.params.drop(['Intercept', TREATMENT_TERM], errors='ignore').to_dict()
+
+
+def _logit_design(patterns, probs, ratio):
+    """Design matrix over (arm, covariate pattern) cells and each cell's share of users"""
+    table = pd.concat([patterns.assign(group='control'), patterns.assign(group='treatment')], ignore_index=True)
+    weights = np.concatenate([probs / (1 + ratio), probs * ratio / (1 + ratio)])
+    X = design_matrix(table)
+    return X, weights
+
+
+def _linear_predictors(X, weights, baseline, beta_treatment, covariate_effects):
+    """eta (grid, cells), with intercepts solved so the control arm's average CTR equals baseline"""
+    coefs = pd.Series(0.0, index=X.columns)
+    for name, value in (covariate_effects or {}).items():
+        if name in coefs.index:
+            coefs[name] = value
+    covariate_eta = X.drop(columns=['Intercept', TREATMENT_TERM]).to_numpy() @ coefs.drop(
+        ['Intercept', TREATMENT_TERM]).to_numpy()
+    control = X[TREATMENT_TERM].to_numpy() == 0
+    w_control = weights[control] / weights[control].sum()
+
+    # Newton on the intercept; a handful of steps is exact to machine precision here
+    intercept = special.logit(baseline)
+    for _ in range(20):
+        mu = special.expit(intercept[:, None] + covariate_eta[control])
+        mean = mu @ w_control
+        slope = (mu * (1 - mu)) @ w_control
+        intercept = intercept - (mean - baseline) / slope
+    return intercept[:, None] + covariate_eta[None, :] + beta_treatment[:, None] * X[TREATMENT_TERM].to_numpy()
+
+
+def _treatment_variance(X, weights, eta):
+    """Per-user asymptotic variance of the treatment coefficient: [I^-1]_TT, I = E[mu(1-mu) x x']"""
+    Xv = X.to_numpy()
+    mu = special.expit(eta)
+    information = np.einsum('gp,pi,pj->gij', weights * mu * (1 - mu), Xv, Xv)
+    t = X.columns.get_loc(TREATMENT_TERM)
+    return np.linalg.inv(information)[:, t, t]
+
+
+def _logit_setup(baseline, mde, ratio, relative, covariate_effects, patterns):
+    p1, p2 = _rates(baseline, mde, relative)
+    p1, p2 = np.broadcast_arrays(p1, p2)
+    shape = p1.shape
+    p1, p2 = p1.ravel(), p2.ravel()
+    # The effect is specified on the control CTR; as a log-odds shift it is the same for every covariate pattern
+    beta_treatment = special.logit(p2) - special.logit(p1)
+    patterns, probs = patterns if patterns is not None else covariate_patterns()
+    X, weights = _logit_design(patterns, probs, ratio)
+    eta = _linear_predictors(X, weights, p1, beta_treatment, covariate_effects)
+    return shape, beta_treatment, X, weights, eta
+
+
+def sample_size_logit(baseline, mde, alpha=0.05, power=0.8, ratio=1.0, relative=False, n_arms=2,
+                      covariate_effects=None, patterns=None):
+    """Control users needed for the Wald test on is_treatment in the covariate-adjusted logit
+
+    Uses the expected Fisher information of the stage 04 model over the
+    covariate mix (see covariate_patterns); covariate_effects maps design
+    column names (e.g. 'previously_watched_channel') to log-odds
+    coefficients and defaults to none, as in the generated data.
+    """
+    shape, beta_treatment, X, weights, eta = _logit_setup(baseline, mde, ratio, relative, covariate_effects,
+                                                          patterns)
+    z_alpha = special.ndtri(1 - _alpha_per_comparison(alpha, n_arms) / 2)
+    z_beta = special.ndtri(power)
+    n_total = (z_alpha + z_beta) ** 2 * _treatment_variance(X, weights, eta) / beta_treatment ** 2
+    return np.ceil(n_total / (1 + ratio)).reshape(shape)
+
+
+def power_logit(baseline, mde, n_per_arm, alpha=0.05, ratio=1.0, relative=False, n_arms=2,
+                covariate_effects=None, patterns=None):
+    """Analytic power of the adjusted logit's treatment test with n_per_arm control users"""
+    shape, beta_treatment, X, weights, eta = _logit_setup(baseline, mde, ratio, relative, covariate_effects,
+                                                          patterns)
+    n_total = np.broadcast_to(np.asarray(n_per_arm, dtype=np.float64), shape).ravel() * (1 + ratio)
+    z_alpha = special.ndtri(1 - _alpha_per_comparison(alpha, n_arms) / 2)
+    z = np.abs(beta_treatment) / np.sqrt(_treatment_variance(X, weights, eta) / n_total)
+    return (special.ndtr(z - z_alpha) + special.ndtr(-z - z_alpha)).reshape(shape)
+
+
+def simulate_power_logit(baseline, mde, n_per_arm, alpha=0.05, ratio=1.0, relative=False, n_arms=2,
+                         covariate_effects=None, patterns=None, n_sims=500, seed=42, max_iter=25,
+                         max_elements=MAX_SIM_CELLS):
+    """Monte Carlo power of the adjusted logit, fitting every simulated dataset in one batched Newton solve
+
+    Each simulated dataset is drawn directly as (users, clicks) counts per
+    arm x covariate cell, which is all the compressed stage 04 fit needs.
+    The datasets of all grid points are stacked into one batch (in chunks
+    of at most max_elements cells), and every Hessian comes from a single
+    matrix product with the precomputed outer products of the design rows.
+    """
+    shape, beta_treatment, X, weights, eta = _logit_setup(baseline, mde, ratio, relative, covariate_effects,
+                                                          patterns)
+    n_total = np.round(np.broadcast_to(np.asarray(n_per_arm, dtype=np.float64), shape).ravel()
+                       * (1 + ratio)).astype(np.int64)
+    alpha_eff = _alpha_per_comparison(alpha, n_arms)
+    Xv = X.to_numpy()
+    n_patterns, k = Xv.shape
+    outer = (Xv[:, :, None] * Xv[:, None, :]).reshape(n_patterns, k * k)
+    t = X.columns.get_loc(TREATMENT_TERM)
+
+    def hessians(beta, trials):
+        p = special.expit(beta @ Xv.T)
+        return ((trials * p * (1 - p)) @ outer).reshape(-1, k, k), p
+
+    # Newton starts from the true coefficients, which are only a sampling error away
+    true_beta = np.linalg.lstsq(Xv, eta.T, rcond=None)[0].T                # (grid, k)
+
+    rng = np.random.default_rng(seed)
+    power = np.empty(len(beta_treatment))
+    chunk = max(1, max_elements // (n_sims * n_patterns))
+    for start in range(0, len(power), chunk):
+        sl = slice(start, start + chunk)
+        n_points = len(power[sl])
+        trials = rng.multinomial(n_total[sl, None], weights, size=(n_points, n_sims))
+        clicks = rng.binomial(trials, special.expit(eta[sl])[:, None, :])
+        # One row per (grid point, simulation)
+        trials = trials.reshape(-1, n_patterns).astype(np.float64)
+        clicks = clicks.reshape(-1, n_patterns).astype(np.float64)
+
+        beta = np.repeat(true_beta[sl], n_sims, axis=0)
+        active = np.arange(len(beta))  # fits still moving; converged ones drop out of the solve
+        for _ in range(max_iter):
+            hessian, p = hessians(beta[active], trials[active])
+            gradient = (clicks[active] - trials[active] * p) @ Xv
+            step = np.linalg.solve(hessian, gradient[:, :, None])[:, :, 0]
+            beta[active] += step
+            active = active[np.max(np.abs(step), axis=1) >= 1e-8]
+            if len(active) == 0:
+                break
+        hessian, _ = hessians(beta, trials)
+        se = np.sqrt(np.linalg.inv(hessian)[:, t, t])
+        p_value = 2 * special.ndtr(-np.abs(beta[:, t] / se))
+        power[sl] = np.mean((p_value < alpha_eff).reshape(n_points, n_sims), axis=1)
+    return power.reshape(shape)
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+def test_duration(n_per_arm, daily_users, n_arms=2, ratio=1.0, traffic_share=1.0):
+    """Days needed to enrol n_per_arm control users (and ratio x that per variant)"""
+    total = np.asarray(n_per_arm, dtype=np.float64) * (1 + ratio * (n_arms - 1))
+    return np.ceil(total / (daily_users * traffic_share))
+
+
+def plan_grid(baselines, mdes, alpha=0.05, power=0.8, ratio=1.0, relative=False, n_arms=2,
+              daily_users=None, traffic_share=1.0, covariate_effects=None, patterns=None):
+    """Sample size (and duration) for every baseline x mde combination, both tests"""
+    baseline_grid, mde_grid = (g.ravel() for g in np.meshgrid(np.asarray(baselines, dtype=np.float64),
+                                                              np.asarray(mdes, dtype=np.float64), indexing='ij'))
+    table = pd.DataFrame({'baseline': baseline_grid, 'mde': mde_grid})
+    table['treatment_rate'] = _treatment_rate(baseline_grid, mde_grid, relative)
+    table['n_per_arm_ttest'] = sample_size_two_proportions(baseline_grid, mde_grid, alpha, power, ratio,
+                                                           relative, n_arms)
+    table['n_per_arm_logit'] = sample_size_logit(baseline_grid, mde_grid, alpha, power, ratio, relative, n_arms,
+                                                 covariate_effects, patterns)
+    if daily_users:
+        for test in ('ttest', 'logit'):
+            table[f'days_{test}'] = test_duration(table[f'n_per_arm_{test}'], daily_users, n_arms, ratio,
+                                                  traffic_share)
+    return table
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from .storage import load_data
+
+    parser = argparse.ArgumentParser(description="Plan sample size and duration for a thumbnail test")
+    parser.add_argument('--baseline', type=float, nargs='+', default=[0.12], help="Control CTR(s)")
+    parser.add_argument('--mde', type=float, nargs='+', default=[0.04],
+                        help="Minimum detectable effect(s), absolute unless --relative")
+    parser.add_argument('--relative', action='store_true', help="Treat --mde as a fraction of the baseline")
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--power', type=float, default=0.8)
+    parser.add_argument('--ratio', type=float, default=1.0, help="Variant users per control user")
+    parser.add_argument('--arms', type=int, default=2)
+    parser.add_argument('--daily-users', type=float, default=None)
+    parser.add_argument('--traffic-share', type=float, default=1.0, help="Share of daily users in the test")
+    parser.add_argument('--data', default=None,
+                        help="Take the covariate mix and covariate effects for the logit from this dataset")
+    parser.add_argument('--simulate', type=int, default=0, metavar='N_SIMS',
+                        help="Check the planned sizes with this many simulated experiments per cell")
+    args = parser.parse_args()
+
+    patterns = covariate_effects = None
+    if args.data:
+        data = load_data(args.data)
+        if data is None:
+            raise SystemExit(1)
+        patterns, covariate_effects = covariate_patterns(data), covariate_effects_from_data(data)
+
+    print("📐 SAMPLE SIZE PLANNER")
+    print("=" * 50)
+    print(f"alpha={args.alpha} | power={args.power} | arms={args.arms} | ratio={args.ratio} | "
+          f"mde {'relative' if args.relative else 'absolute'}")
+    start = time.perf_counter()
+    table = plan_grid(args.baseline, args.mde, args.alpha, args.power, args.ratio, args.relative, args.arms,
+                      args.daily_users, args.traffic_share, covariate_effects, patterns)
+    if args.simulate:
+        common = dict(alpha=args.alpha, ratio=args.ratio, relative=args.relative, n_arms=args.arms)
+        table['sim_power_ttest'] = simulate_power_two_proportions(
+            table['baseline'], table['mde'], table['n_per_arm_ttest'], n_sims=args.simulate, **common)
+        table['sim_power_logit'] = simulate_power_logit(
+            table['baseline'], table['mde'], table['n_per_arm_logit'], n_sims=args.simulate,
+            covariate_effects=covariate_effects, patterns=patterns, **common)
+    print(table.to_string(index=False))
+    print(f"\n⏱️  {len(table)} scenarios in {time.perf_counter() - start:.2f}s")
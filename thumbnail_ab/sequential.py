@@ -0,0 +1,171 @@
+# sequential.py - always-valid p-values for continuously monitored CTR tests (mSPRT)
+import json
+import os
+
+import numpy as np
+
+from .aggregates import ensure_stats
+
+DEFAULT_STATE_PATH = 'ab_test_sequential.json'
+
+CONTINUE = 'continue'
+STOP_TREATMENT_BETTER = 'stop_treatment_better'
+STOP_CONTROL_BETTER = 'stop_control_better'
+STOP_MAX_SAMPLE = 'stop_max_sample'
+
+
+class SequentialTest:
+    """Mixture SPRT on the treatment - control CTR difference.
+
+    Uses the normal-mixture likelihood ratio of Johari et al. ("Always
+    valid inference") with a N(0, tau^2) mixing distribution over the
+    difference. The p-value is the running minimum of 1 / LR, so peeking
+    after every batch keeps the false positive rate at alpha. Likewise the
+    confidence sequence is the running intersection of every look's
+    interval, so it never widens. Each update only adds the batch's
+    counts, so it is O(1) in the history length.
+    """
+
+    def __init__(self, alpha=0.05, tau=0.02, max_users=None):
+        self.alpha = alpha
+        self.tau = tau  # prior sd of the CTR difference; pick near the effect you expect
+        self.max_users = max_users
+        self.successes = {'control': 0, 'treatment': 0}
+        self.trials = {'control': 0, 'treatment': 0}
+        self.p_value = 1.0
+        self.lower, self.upper = -np.inf, np.inf  # running confidence sequence
+        self.n_looks = 0
+        self.decision = CONTINUE
+
+    def update(self, batch):
+        """Fold in a batch (raw rows, SufficientStats or {group: (successes, trials)})"""
+        if isinstance(batch, dict):
+            counts = batch
+        else:
+            summary = ensure_stats(batch)
+            counts = {g: (int(summary.successes[summary.index(g)]), int(summary.trials[summary.index(g)]))
+                      for g in summary.groups}
+        for group in ('control', 'treatment'):
+            successes, trials = counts.get(group, (0, 0))
+            self.successes[group] += successes
+            self.trials[group] += trials
+        self.n_looks += 1
+        return self.evaluate()
+
+    def _moments(self):
+        n_c, n_t = self.trials['control'], self.trials['treatment']
+        p_c = self.successes['control'] / n_c
+        p_t = self.successes['treatment'] / n_t
+        variance = p_c * (1 - p_c) / n_c + p_t * (1 - p_t) / n_t
+        return p_t - p_c, variance
+
+    def evaluate(self):
+        """Update the always-valid p-value and confidence sequence; return the decision"""
+        if min(self.trials.values()) == 0:
+            return self.status()
+
+        difference, variance = self._moments()
+        if variance > 0:
+            tau2 = self.tau ** 2
+            log_lr = (0.5 * np.log(variance / (variance + tau2))
+                      + difference ** 2 * tau2 / (2 * variance * (variance + tau2)))
+            self.p_value = min(self.p_value, float(np.exp(-log_lr)))
+            lower, upper = self._look_interval(difference, variance)
+            self.lower, self.upper = max(self.lower, lower), min(self.upper, upper)
+
+        if self.decision == CONTINUE:
+            if self.p_value <= self.alpha:
+                self.decision = STOP_TREATMENT_BETTER if difference > 0 else STOP_CONTROL_BETTER
+            elif self.max_users is not None and sum(self.trials.values()) >= self.max_users:
+                self.decision = STOP_MAX_SAMPLE
+        return self.status()
+
+    def _look_interval(self, difference, variance):
+        """(1 - alpha) mixture interval from the counts at one look"""
+        tau2 = self.tau ** 2
+        half_width = np.sqrt(variance * (variance + tau2) / tau2
+                             * (np.log((variance + tau2) / variance) - 2 * np.log(self.alpha)))
+        return difference - half_width, difference + half_width
+
+    def confidence_sequence(self):
+        """Always-valid (1 - alpha) confidence interval for the CTR difference
+
+        The intersection of the intervals of every look so far, so it only
+        ever narrows. Unbounded while the counts carry no variance estimate
+        (no clicks, or only clicks, in both arms so far).
+        """
+        return self.lower, self.upper
+
+    def status(self):
+        status = {
+            'decision': self.decision,
+            'always_valid_p_value': self.p_value,
+            'n_looks': self.n_looks,
+            'control_trials': self.trials['control'],
+            'treatment_trials': self.trials['treatment'],
+        }
+        if min(self.trials.values()) > 0:
+            difference, _ = self._moments()
+            lower, upper = self.confidence_sequence()
+            status.update({'difference': difference,
+                           'confidence_sequence_lower': lower,
+                           'confidence_sequence_upper': upper})
+        return status
+
+    def to_dict(self):
+        return {
+            'alpha': self.alpha, 'tau': self.tau, 'max_users': self.max_users,
+            'successes': self.successes, 'trials': self.trials,
+            'p_value': self.p_value, 'n_looks': self.n_looks, 'decision': self.decision,
+            'confidence_sequence': [self.lower, self.upper],
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        test = cls(d['alpha'], d['tau'], d['max_users'])
+        test.successes, test.trials = dict(d['successes']), dict(d['trials'])
+        test.p_value, test.n_looks, test.decision = d['p_value'], d['n_looks'], d['decision']
+        test.lower, test.upper = d.get('confidence_sequence', (-np.inf, np.inf))
+        return test
+
+    def save(self, path=DEFAULT_STATE_PATH):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_STATE_PATH, **kwargs):
+        if not os.path.exists(path):
+            return cls(**kwargs)
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .storage import load_data
+
+    parser = argparse.ArgumentParser(description="Fold batches into a sequential (mSPRT) test and print the decision")
+    parser.add_argument('batches', nargs='*', help="Batch files, ingested as one look each")
+    parser.add_argument('--state', default=DEFAULT_STATE_PATH)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--tau', type=float, default=0.02)
+    parser.add_argument('--max-users', type=int, default=None)
+    parser.add_argument('--simulate-looks', type=int, default=None,
+                        help="Split a single dataset into this many looks, to replay monitoring")
+    args = parser.parse_args()
+
+    test = SequentialTest.load(args.state, alpha=args.alpha, tau=args.tau, max_users=args.max_users)
+    for path in args.batches:
+        data = load_data(path, columns=['group', 'clicked'])
+        if data is None:
+            continue
+        for look in np.array_split(np.arange(len(data)), args.simulate_looks or 1):
+            status = test.update(data.iloc[look])
+            print(f"   Look {status['n_looks']}: n={status['control_trials'] + status['treatment_trials']:,} "
+                  f"p={status['always_valid_p_value']:.6f} -> {status['decision']}")
+    test.save(args.state)
+
+    print(f"\n⏱️  SEQUENTIAL DECISION: {test.decision}")
@@ -0,0 +1,293 @@
+# service.py - local HTTP/JSON service answering stage results from warm worker processes
+import asyncio
+import contextlib
+import json
+import math
+import os
+import signal
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import SufficientStats, aggregate
+from .cache import data_fingerprint
+from .incremental import ExperimentState
+from .stages import load_stage
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8750
+
+# Stages served over HTTP; both run on count tables alone
+SERVICE_STAGES = ['statistical', 'bayesian']
+STAGE_KWARGS = {'bayesian': {'plot': False}}
+
+RESULT_CACHE_SIZE = 1024
+MAX_BODY_BYTES = 64 * 1024 ** 2
+
+
+# ---------------------------------------------------------------------------
+# Worker processes: stage scripts and scipy are imported once, at start-up
+# ---------------------------------------------------------------------------
+
+_STAGES = {}
+
+
+def _init_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the service shuts the pool down itself
+    sys.stdout = open(os.devnull, 'w')  # the stage functions report by printing
+    for key in SERVICE_STAGES:
+        _STAGES[key] = load_stage(key)
+    # One call on a tiny table pulls in everything the stages import lazily
+    warm_up = SufficientStats(['control', 'treatment'], np.array([[90, 10], [88, 12]]))
+    for key in SERVICE_STAGES:
+        run_stage(key, warm_up)
+
+
+def to_json(value):
+    """Results dict -> plain JSON types (numpy scalars, arrays, DataFrames; NaN becomes null)"""
+    if isinstance(value, dict):
+        return {str(k): to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return to_json(value.to_dict())
+    if isinstance(value, np.ndarray):
+        return to_json(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def run_stage(key, summary):
+    """Run one stage on SufficientStats and return its results dict as JSON types"""
+    return to_json(_STAGES[key](summary, **STAGE_KWARGS.get(key, {})))
+
+
+def aggregate_events(events):
+    """SufficientStats of an event batch given as a list of rows or a dict of columns"""
+    data = pd.DataFrame(events)
+    missing = {'group', 'clicked'} - set(data.columns)
+    if missing:
+        raise ValueError(f"Events need the columns {sorted(missing)}")
+    return aggregate(data)
+
+
+def counts_to_stats(counts):
+    """SufficientStats from {"arm": {"trials": n, "clicks": k}, ...}"""
+    groups = list(counts)
+    trials = np.array([int(counts[g]['trials']) for g in groups], dtype=np.int64)
+    clicks = np.array([int(counts[g]['clicks']) for g in groups], dtype=np.int64)
+    if np.any(clicks < 0) or np.any(clicks > trials):
+        raise ValueError("clicks must be between 0 and trials for every arm")
+    return SufficientStats(groups, np.column_stack([trials - clicks, clicks]))
+
+
+# ---------------------------------------------------------------------------
+# Service
+# ---------------------------------------------------------------------------
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AnalysisService:
+    """Experiment state in memory, stage work on a process pool, results memoised by content.
+
+    Results are keyed by (stage, fingerprint of the counts), so repeated
+    dashboard reads of an unchanged experiment are answered without
+    touching the pool, and concurrent identical requests share one run.
+    """
+
+    def __init__(self, workers=None, state_path=None):
+        self.state_path = state_path
+        self.state = ExperimentState.load(state_path) if state_path else ExperimentState()
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        self.results = OrderedDict()
+        self.started = time.time()
+
+    async def warm_up(self):
+        # Start every worker now rather than on the first requests
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, os.getpid)
+                               for _ in range(self.workers)))
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        if self.state_path:
+            self.state.save(self.state_path)
+
+    async def _offload(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+
+    async def stage_result(self, key, summary):
+        cache_key = (key, data_fingerprint(summary))
+        if cache_key in self.results:
+            self.results.move_to_end(cache_key)
+            return await asyncio.shield(self.results[cache_key])
+        future = asyncio.ensure_future(self._offload(run_stage, key, summary))
+        self.results[cache_key] = future
+        if len(self.results) > RESULT_CACHE_SIZE:
+            self.results.popitem(last=False)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            self.results.pop(cache_key, None)
+            raise
+
+    async def analyze(self, summary, stages):
+        if not isinstance(stages, list) or not stages or not all(isinstance(key, str) for key in stages):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'stages' must be a non-empty list drawn from {SERVICE_STAGES}")
+        unknown = set(stages) - set(SERVICE_STAGES)
+        if unknown:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Unknown stages {sorted(unknown)}. Choose from {SERVICE_STAGES}")
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self.stage_result(key, summary) for key in stages))
+        response = {'n_total': summary.n_total, 'groups': list(summary.groups)}
+        response.update(zip(stages, results))
+        response['elapsed_ms'] = (time.perf_counter() - start) * 1000
+        return response
+
+    async def summary_from_body(self, body):
+        if 'counts' in body:
+            return counts_to_stats(body['counts'])
+        if 'events' in body:
+            return await self._offload(aggregate_events, body['events'])
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Body needs 'counts' or 'events'")
+
+    def experiment(self, experiment_id):
+        if experiment_id not in self.state:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No experiment '{experiment_id}'")
+        return self.state[experiment_id]
+
+    def describe(self, experiment_id):
+        summary = self.state[experiment_id]
+        return {'experiment': experiment_id, 'n_total': summary.n_total, 'groups': list(summary.groups),
+                'trials': summary.trials.tolist(), 'clicks': summary.successes.tolist()}
+
+    async def route(self, method, path, query, body):
+        parts = [p for p in path.split('/') if p]
+        stages = query.get('stages', [','.join(SERVICE_STAGES)])[0].split(',')
+
+        if method == 'GET' and parts == ['health']:
+            return {'status': 'ok', 'experiments': len(self.state.experiments),
+                    'uptime_s': time.time() - self.started, 'cached_results': len(self.results)}
+        if method == 'POST' and parts == ['analyze']:
+            return await self.analyze(await self.summary_from_body(body), body.get('stages', stages))
+        if parts == ['experiments'] and method == 'GET':
+            return {'experiments': [self.describe(e) for e in self.state.experiments]}
+
+        if len(parts) >= 2 and parts[0] == 'experiments':
+            experiment_id, action = parts[1], parts[2:]
+            if method == 'GET' and action == ['results']:
+                response = await self.analyze(self.experiment(experiment_id), stages)
+                return {'experiment': experiment_id, **response}
+            if method == 'POST' and action == ['events']:
+                if 'events' not in body:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "Body needs 'events'")
+                self.state.update(experiment_id, await self.summary_from_body(body))
+                return self.describe(experiment_id)
+            if method == 'PUT' and action == ['counts']:
+                if 'counts' not in body:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "Body needs 'counts'")
+                self.state.experiments[experiment_id] = counts_to_stats(body['counts'])
+                return self.describe(experiment_id)
+            if method == 'GET' and not action:
+                self.experiment(experiment_id)
+                return self.describe(experiment_id)
+            if method == 'DELETE' and not action:
+                self.experiment(experiment_id)
+                del self.state.experiments[experiment_id]
+                return {'experiment': experiment_id, 'deleted': True}
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+
+    # -- HTTP/1.1 over asyncio streams, with keep-alive ---------------------
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                too_large = length > MAX_BODY_BYTES
+                if too_large:
+                    # Refused on the header alone; the unread body leaves the connection unusable
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {
+                        'error': f"Body of {length:,} bytes exceeds the {MAX_BODY_BYTES:,} byte limit"}
+                else:
+                    raw = await reader.readexactly(length) if length else b''
+                    status, payload = await self.respond(method, target, raw)
+
+                body = json.dumps(payload).encode()
+                keep_alive = not too_large and headers.get('connection', '').lower() != 'close'
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, raw):
+        url = urlsplit(target)
+        try:
+            body = json.loads(raw) if raw else {}
+            return HTTPStatus.OK, await self.route(method.upper(), url.path, parse_qs(url.query), body)
+        except HTTPError as e:
+            return e.status, {'error': str(e)}
+        except (ValueError, KeyError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {'error': f"{type(e).__name__}: {e}"}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{type(e).__name__}: {e}"}
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, state_path=None):
+    service = AnalysisService(workers, state_path)
+    await service.warm_up()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):  # no signal handlers in the Windows event loop
+            asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    print(f"🌐 Serving on http://{host}:{port} with {service.workers} warm workers", flush=True)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON service for the count-based stages")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--state', default=None,
+                        help="Experiment state file (see thumbnail_ab.incremental) to load and save on exit")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.workers, args.state))
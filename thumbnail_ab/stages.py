@@ -0,0 +1,36 @@
+# stages.py - registry of the analysis stages implemented by the numbered scripts
+import importlib
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# results key -> (script module, stage function), in pipeline order
+STAGES = {
+    'eda': ('02_exploratory_analysis', 'perform_eda'),
+    'statistical': ('03_statistical_analysiss', 'perform_statistical_tests'),
+    'regression': ('04_advanced_modelling', 'perform_logistic_regression'),
+    'bayesian': ('05_bayesian_modelling', 'perform_bayesian_analysis'),
+    'recommendation': ('06_final_recommendation', 'generate_final_recommendation'),
+}
+
+# Stages that only need count tables, so they can receive a shared SufficientStats
+AGGREGATE_STAGES = {'statistical', 'bayesian', 'recommendation'}
+
+
+def load_module(module_name):
+    """Import one of the numbered scripts (their names start with a digit)"""
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    return importlib.import_module(module_name)
+
+
+def load_stage(key):
+    """The stage function registered under key; imports only that script"""
+    module_name, function_name = STAGES[key]
+    return getattr(load_module(module_name), function_name)
+
+
+def stage_columns(key):
+    """Columns the stage's script reads"""
+    return load_module(STAGES[key][0]).COLUMNS
@@ -0,0 +1,373 @@
+# storage.py - pluggable on-disk storage for the A/B test dataset
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from .trace import span
+
+DATA_STEM = 'ab_test_data'
+FORMATS = ['parquet', 'feather', 'npy', 'csv']  # preference order when no path is given
+
+# Compact dtypes shared by every backend, so categorical encodings and
+# small integer flags survive a round trip regardless of the format
+CATEGORIES = {
+    'group': ['control', 'treatment'],
+    'country': ['AU', 'CA', 'UK', 'US'],
+}
+DTYPES = {
+    'user_id': np.uint32,
+    'age': np.int8,
+    'previously_watched_channel': np.int8,
+    'clicked': np.int8,
+}
+ALL_COLUMNS = ['user_id', 'group', 'age', 'country', 'previously_watched_channel', 'clicked']
+
+
+def data_path(fmt, stem=DATA_STEM):
+    """Default on-disk location of the dataset for a given format"""
+    if fmt == 'npy':
+        return f'{stem}_npy'  # directory of one .npy file per column
+    return f'{stem}.{fmt}'
+
+
+def infer_format(path):
+    """Guess the storage format from a path"""
+    if os.path.isdir(path) or path.endswith('_npy'):
+        return 'npy'
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    if ext in ('parquet', 'pq'):
+        return 'parquet'
+    if ext in ('feather', 'arrow'):
+        return 'feather'
+    if ext == 'csv':
+        return 'csv'
+    raise ValueError(f"Cannot infer storage format from '{path}'; pass fmt= explicitly")
+
+
+def find_data_path(stem=DATA_STEM):
+    """Return the fastest existing copy of the dataset, falling back to CSV"""
+    for fmt in FORMATS:
+        path = data_path(fmt, stem)
+        if os.path.exists(path):
+            return path
+    return data_path('csv', stem)
+
+
+def _narrow(values, col, dtype):
+    """Cast a column to a compact integer dtype, refusing values the cast would change"""
+    if values.dtype == dtype:
+        return values
+    numeric = pd.to_numeric(values, errors='coerce')
+    info = np.iinfo(dtype)
+    invalid = numeric.isna() | (numeric < info.min) | (numeric > info.max) | (numeric % 1 != 0)
+    if invalid.any():
+        row = int(invalid.to_numpy().argmax())
+        value = values.iloc[row]
+        problem = "missing value" if pd.isna(value) else f"'{value}' is not an integer in [{info.min}, {info.max}]"
+        raise ValueError(f"Column '{col}', row {row}: {problem}")
+    return numeric.astype(dtype)
+
+
+def natural_key(label):
+    """Sort key that orders embedded numbers by value: variant_2 before variant_10"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', str(label))]
+
+
+def compact_dtypes(data, categories=None):
+    """Cast known columns to the shared compact dtypes
+
+    categories optionally fixes the full label list of categorical columns
+    (e.g. every arm of the test), so separately written chunks share one
+    coding; labels outside a fixed list raise ValueError. Raises ValueError
+    naming the column and row of the first missing or out-of-range integer
+    rather than letting the narrowing cast wrap it.
+    """
+    data = data.copy(deep=False)
+    fixed = categories or {}
+    for col in {**CATEGORIES, **fixed}:
+        if col not in data:
+            continue
+        labels = set(data[col].dropna().unique())
+        if col in fixed:
+            unknown = labels - set(fixed[col])
+            if unknown:
+                raise ValueError(f"Column '{col}' has labels {sorted(unknown, key=natural_key)} "
+                                 f"outside its fixed categories {list(fixed[col])}")
+            data[col] = pd.Categorical(data[col], categories=list(fixed[col]))
+        else:
+            # Known labels keep fixed codes; any extra labels are appended after them
+            extra = sorted(labels - set(CATEGORIES[col]), key=natural_key)
+            data[col] = pd.Categorical(data[col], categories=CATEGORIES[col] + extra)
+    for col, dtype in DTYPES.items():
+        if col in data:
+            data[col] = _narrow(data[col], col, dtype)
+    return data
+
+
+# ---------------------------------------------------------------------------
+# Readers
+# ---------------------------------------------------------------------------
+
+def _read_csv(path, columns):
+    # Integer columns are read at pandas' default width and range-checked
+    # by compact_dtypes; reading them as int8 directly would wrap values
+    dtype = {col: 'category' for col in CATEGORIES}
+    data = pd.read_csv(path, usecols=columns, dtype=dtype)
+    return compact_dtypes(data)
+
+
+def _read_parquet(path, columns):
+    return compact_dtypes(pd.read_parquet(path, columns=columns))
+
+
+def _read_feather(path, columns):
+    return compact_dtypes(pd.read_feather(path, columns=columns))
+
+
+def _read_npy(path, columns, rows=slice(None)):
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    columns = columns or meta['columns']
+
+    data = {}
+    for col in columns:
+        # mmap_mode='r' means only the pages a stage actually touches are read;
+        # rows past n_rows are preallocated space that was never written
+        values = np.load(os.path.join(path, f'{col}.npy'), mmap_mode='r')[:meta['n_rows']][rows]
+        if col in meta['categories']:
+            data[col] = pd.Categorical.from_codes(values, categories=meta['categories'][col])
+        else:
+            data[col] = values
+    return pd.DataFrame(data, columns=columns)
+
+
+READERS = {
+    'csv': _read_csv,
+    'parquet': _read_parquet,
+    'feather': _read_feather,
+    'npy': _read_npy,
+}
+
+
+def load_data(path=None, columns=None, fmt=None, verbose=False):
+    """Load the A/B test dataset from disk.
+
+    path defaults to the first of ab_test_data.parquet / .feather / _npy / .csv
+    that exists. columns restricts the read to the columns a stage needs;
+    binary formats skip the other columns entirely.
+    """
+    path = path or find_data_path()
+    fmt = fmt or infer_format(path)
+    if fmt not in READERS:
+        raise ValueError(f"Unknown storage format '{fmt}'. Choose from {list(READERS)}")
+
+    try:
+        with span(f'read_{fmt}', path=str(path)) as record:
+            data = READERS[fmt](path, list(columns) if columns is not None else None)
+            if record is not None:
+                record['rows'] = len(data)
+    except FileNotFoundError:
+        print(f"❌ ERROR: {path} not found. Run 01_data_generation.py first.")
+        return None
+
+    if verbose:
+        print(f"✅ DATA LOADED SUCCESSFULLY ({fmt}: {path})")
+    return data
+
+
+# ---------------------------------------------------------------------------
+# Row partitions
+# ---------------------------------------------------------------------------
+
+def row_partitions(path, n_partitions, fmt=None):
+    """Split a dataset into up to n_partitions (start, stop) ranges that can be read independently
+
+    npy columns are memory-mapped, so any row range can be read on its own;
+    Parquet is split on row-group boundaries (the ranges count row groups).
+    CSV and Feather files form a single partition, (None, None).
+    """
+    fmt = fmt or infer_format(path)
+    if fmt == 'npy':
+        with open(os.path.join(path, 'meta.json')) as f:
+            n_units = json.load(f)['n_rows']
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        n_units = pq.ParquetFile(path).metadata.num_row_groups
+    else:
+        return [(None, None)]
+    bounds = np.linspace(0, n_units, min(n_partitions, n_units) + 1).round().astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def read_partition(path, columns=None, start=None, stop=None, fmt=None):
+    """One range from row_partitions(); without a range, the whole file"""
+    fmt = fmt or infer_format(path)
+    columns = list(columns) if columns is not None else None
+    with span(f'read_{fmt}_partition', path=str(path), start=start, stop=stop) as record:
+        if start is None:
+            data = READERS[fmt](path, columns)
+        elif fmt == 'npy':
+            data = _read_npy(path, columns, slice(start, stop))
+        elif fmt == 'parquet':
+            import pyarrow.parquet as pq
+            table = pq.ParquetFile(path).read_row_groups(range(start, stop), columns=columns)
+            data = compact_dtypes(table.to_pandas())
+        else:
+            raise ValueError(f"The {fmt} backend cannot be read by row range")
+        if record is not None:
+            record['rows'] = len(data)
+    return data
+
+
+# ---------------------------------------------------------------------------
+# Writers
+# ---------------------------------------------------------------------------
+
+class CSVWriter:
+    """Append chunks to a CSV file"""
+
+    def __init__(self, path, n_rows=None, categories=None):
+        self.path = path
+        self.first = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.path, mode='w' if self.first else 'a', header=self.first, index=False)
+        self.first = False
+
+    def close(self):
+        pass
+
+
+class ArrowWriter:
+    """Append chunks as row groups / record batches to a Parquet or Feather file"""
+
+    def __init__(self, path, fmt, n_rows=None, categories=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.path = path
+        self.fmt = fmt
+        self.writer = None
+        self._open_parquet = pq.ParquetWriter
+        self._open_ipc = pa.ipc.new_file
+        # Feather files allow a single dictionary per column, so every chunk
+        # is coded against the first chunk's (or the given) categories
+        self.categories = dict(categories or {})
+
+    def write(self, chunk):
+        chunk = compact_dtypes(chunk, self.categories)
+        _pin_categories(self.categories, chunk)
+        table = self.pa.Table.from_pandas(chunk, preserve_index=False)
+        if self.writer is None:
+            if self.fmt == 'parquet':
+                self.writer = self._open_parquet(self.path, table.schema)
+            else:
+                self.writer = self._open_ipc(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _pin_categories(pinned, chunk):
+    """Record the label lists of a written chunk so later chunks reuse its codes"""
+    for col in chunk.columns:
+        if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+            pinned.setdefault(col, list(chunk[col].cat.categories))
+
+
+class NpyWriter:
+    """Write chunks into preallocated memory-mapped .npy columns
+
+    Codes of categorical columns are only meaningful against one label
+    list, so the first chunk's (or the given) categories are kept for all
+    later chunks; a chunk with a label outside them raises ValueError.
+    """
+
+    def __init__(self, path, n_rows=None, categories=None):
+        if n_rows is None:
+            raise ValueError("The npy backend needs n_rows up front to preallocate its columns")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.n_rows = n_rows
+        self.offset = 0
+        self.arrays = {}
+        self.categories = dict(categories or {})
+
+    def write(self, chunk):
+        chunk = compact_dtypes(chunk, self.categories)
+        _pin_categories(self.categories, chunk)
+        end = self.offset + len(chunk)
+        if end > self.n_rows:
+            raise ValueError(f"Writing rows {self.offset}-{end} past the {self.n_rows} preallocated rows")
+        for col in chunk.columns:
+            if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+                values = chunk[col].cat.codes.to_numpy()
+            else:
+                values = chunk[col].to_numpy()
+            if col not in self.arrays:
+                self.arrays[col] = np.lib.format.open_memmap(
+                    os.path.join(self.path, f'{col}.npy'), mode='w+',
+                    dtype=values.dtype, shape=(self.n_rows,))
+            self.arrays[col][self.offset:end] = values
+        self.offset = end
+
+    def close(self):
+        for array in self.arrays.values():
+            array.flush()
+        meta = {
+            'columns': list(self.arrays),
+            'categories': self.categories,
+            'n_rows': self.offset,
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        self.arrays = {}
+        # meta records the rows actually written, so the reader still ignores the rest
+        if self.offset != self.n_rows:
+            raise ValueError(f"Only {self.offset} of the {self.n_rows} preallocated rows were written")
+
+
+def open_writer(path, fmt=None, n_rows=None, categories=None):
+    """Open an incremental writer with write(chunk) / close() for any backend
+
+    categories ({column: labels}) fixes the label lists of categorical
+    columns up front; otherwise the first chunk's lists are kept.
+    """
+    fmt = fmt or infer_format(path)
+    if fmt == 'csv':
+        return CSVWriter(path, n_rows, categories)
+    if fmt in ('parquet', 'feather'):
+        return ArrowWriter(path, fmt, n_rows, categories)
+    if fmt == 'npy':
+        return NpyWriter(path, n_rows, categories)
+    raise ValueError(f"Unknown storage format '{fmt}'. Choose from {list(READERS)}")
+
+
+def save_data(data, path=None, fmt='csv'):
+    """Write a whole DataFrame in one of the supported formats"""
+    path = path or data_path(fmt)
+    writer = open_writer(path, fmt, n_rows=len(data))
+    writer.write(data)
+    writer.close()
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert the A/B test dataset between storage formats")
+    parser.add_argument('source', nargs='?', default=data_path('csv'))
+    parser.add_argument('--to', choices=list(READERS), default='parquet')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    data = load_data(args.source)
+    if data is not None:
+        output = save_data(data, args.output, args.to)
+        print(f"✅ Converted {args.source} -> {output} ({args.to})")
@@ -0,0 +1,224 @@
+# trace.py - opt-in spans (duration, rows, memory delta) around the pipeline's steps
+import atexit
+import contextlib
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+# Set to a .json (Chrome trace) or .jsonl path to trace any script from the environment
+TRACE_ENV = 'THUMBNAIL_AB_TRACE'
+PROFILE_ENV = 'THUMBNAIL_AB_PROFILE'
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def current_rss():
+    """Resident set size in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def count_rows(data):
+    """Row count of a DataFrame, SufficientStats or array; None when unknown"""
+    n_total = getattr(data, 'n_total', None)
+    if n_total is not None:
+        return int(n_total)
+    try:
+        return len(data)
+    except TypeError:
+        return None
+
+
+class Tracer:
+    """Collects finished spans; does nothing until enable() is called.
+
+    While disabled, span() returns a shared no-op context manager, so the
+    hooks left in the stage functions cost one attribute check each.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self.profiler = None
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+
+    def enable(self, profile=False):
+        """Start recording spans; profile=True also runs cProfile until disable()"""
+        self.enabled = True
+        if profile and self.profiler is None:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def disable(self):
+        self.enabled = False
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def reset(self):
+        self.records = []
+
+    def merge(self, records, origin):
+        """Add spans recorded by another process whose tracer started at origin"""
+        shift_us = (origin - self._origin) / 1000
+        self.records.extend(dict(record, start_us=record['start_us'] + shift_us) for record in records)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def _span(self, name, rows, attrs):
+        stack = self._stack()
+        record = {'name': name, 'parent': stack[-1]['name'] if stack else None, 'depth': len(stack),
+                  'rows': rows, 'pid': os.getpid(), 'tid': threading.get_ident()}
+        stack.append(record)
+        rss_start = current_rss()
+        start = time.perf_counter_ns()
+        try:
+            yield record
+        finally:
+            end = time.perf_counter_ns()
+            stack.pop()
+            record['start_us'] = (start - self._origin) / 1000
+            record['duration_ms'] = (end - start) / 1e6
+            record['rss_mb'] = current_rss() / 1024 ** 2
+            record['memory_delta_mb'] = record['rss_mb'] - rss_start / 1024 ** 2
+            if attrs:
+                record['attrs'] = attrs
+            if record['rows'] and record['duration_ms'] > 0:
+                record['rows_per_sec'] = record['rows'] / (record['duration_ms'] / 1000)
+            self.records.append(record)
+
+    def span(self, name, rows=None, **attrs):
+        """Context manager timing one step; yields the record so rows/attrs can be filled in late"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name, rows, attrs)
+
+    def export_jsonl(self, path):
+        """One JSON object per finished span"""
+        with open(path, 'w') as f:
+            for record in self.records:
+                f.write(json.dumps(record, default=str) + '\n')
+
+    def export_chrome_trace(self, path):
+        """Trace Event Format, viewable in chrome://tracing or Perfetto"""
+        events = []
+        for record in self.records:
+            args = {k: v for k, v in record.items()
+                    if k in ('rows', 'rows_per_sec', 'rss_mb', 'memory_delta_mb') and v is not None}
+            args.update(record.get('attrs', {}))
+            events.append({'name': record['name'], 'ph': 'X', 'ts': record['start_us'],
+                           'dur': record['duration_ms'] * 1000, 'pid': record['pid'], 'tid': record['tid'],
+                           'args': args})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+
+    def export(self, path):
+        """Chrome trace for .json paths, JSON lines otherwise"""
+        if path.endswith('.json'):
+            self.export_chrome_trace(path)
+        else:
+            self.export_jsonl(path)
+
+    def save_profile(self, path):
+        """Write the cProfile statistics (readable with pstats or snakeviz)"""
+        if self.profiler is not None:
+            self.profiler.dump_stats(path)
+
+
+TRACER = Tracer()
+
+
+def span(name, rows=None, **attrs):
+    """Time one step on the module tracer (a no-op unless tracing is enabled)"""
+    if not TRACER.enabled:
+        return _NULL_SPAN
+    return TRACER._span(name, rows, attrs)
+
+
+def traced(func):
+    """Wrap a stage function in a span named after it, with the input's row count"""
+    @functools.wraps(func)
+    def wrapper(data, *args, **kwargs):
+        if not TRACER.enabled:
+            return func(data, *args, **kwargs)
+        with TRACER._span(func.__name__, count_rows(data), {}):
+            return func(data, *args, **kwargs)
+    return wrapper
+
+
+def _run_traced(func, *args):
+    """Worker side of pool_map: the result plus the spans recorded while computing it"""
+    was_enabled, TRACER.enabled = TRACER.enabled, True
+    first = len(TRACER.records)  # a forked worker starts with a copy of the parent's records
+    try:
+        result = func(*args)
+    finally:
+        TRACER.enabled = was_enabled
+    records = TRACER.records[first:]
+    del TRACER.records[first:]
+    return result, records, TRACER._origin
+
+
+def pool_map(executor, func, *iterables):
+    """list(executor.map(...)), bringing spans recorded in the workers back into TRACER
+
+    Worker processes keep their own tracer, so without this their spans
+    would be lost when the pool shuts down. While tracing is disabled
+    this is a plain executor.map.
+    """
+    if not TRACER.enabled:
+        return list(executor.map(func, *iterables))
+    results = []
+    for result, records, origin in executor.map(_run_traced, itertools.repeat(func), *iterables):
+        TRACER.merge(records, origin)
+        results.append(result)
+    return results
+
+
+_exports = {'trace': None, 'profile': None}
+_export_registered = False
+
+
+def _export():
+    TRACER.disable()
+    if _exports['trace']:
+        TRACER.export(_exports['trace'])
+    if _exports['profile']:
+        TRACER.save_profile(_exports['profile'])
+
+
+def enable(trace_path=None, profile_path=None):
+    """Start tracing and write the trace (and cProfile stats) when the process exits
+
+    Calling it again updates the output paths; the exit hook is registered
+    once. Spans from process pools are included where the pool is driven
+    through pool_map (partitioned stages, bootstrap, permutation tests);
+    the service's worker processes are not traced, only its event loop.
+    """
+    global _export_registered
+    TRACER.enable(profile=profile_path is not None)
+    _exports['trace'] = trace_path or _exports['trace']
+    _exports['profile'] = profile_path or _exports['profile']
+    if not _export_registered:
+        atexit.register(_export)
+        _export_registered = True
+
+
+if os.environ.get(TRACE_ENV) or os.environ.get(PROFILE_ENV):
+    enable(os.environ.get(TRACE_ENV), os.environ.get(PROFILE_ENV))
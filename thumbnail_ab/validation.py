@@ -0,0 +1,331 @@
+# validation.py - data-quality checks in one chunked pass, with a report the pipeline can fail fast on
+import json
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from .aggregates import aggregate, anova_age, chi2_covariate
+from .multiarm import CONTROL
+from .storage import ALL_COLUMNS, CATEGORIES, infer_format, read_partition, row_partitions
+from .trace import span
+
+CHUNK_ROWS = 1_000_000
+AGE_RANGE = (18, 65)  # inclusive
+BINARY_COLUMNS = ['previously_watched_channel', 'clicked']
+INTEGER_COLUMNS = ['user_id', 'age'] + BINARY_COLUMNS
+LABEL_COLUMNS = ['group', 'country']
+
+SRM_ALPHA = 0.001     # strict, since a sample ratio mismatch stops the analysis
+BALANCE_ALPHA = 0.05  # as in the covariate balance check of 03
+SMD_THRESHOLD = 0.1   # standardized mean difference usually taken as meaningful imbalance
+BITMAP_MAX_ID = 2 ** 32
+MAX_EXAMPLES = 10
+
+PASS, WARN, FAIL = 'pass', 'warn', 'fail'
+
+
+class DuplicateTracker:
+    """Counts repeated user_ids across chunks.
+
+    Non-negative integer ids are marked in a bitmap (one bit per id, grown
+    as larger ids arrive), so memory is max id / 8 bytes however many rows
+    are seen. Other ids fall back to a hash set.
+    """
+
+    def __init__(self):
+        self.bitmap = np.zeros(0, dtype=np.uint8)
+        self.seen = None
+        self.duplicates = 0
+        self.examples = []
+
+    def update(self, ids):
+        ids = np.asarray(ids)
+        if len(ids) == 0:
+            return
+        bitmap_ok = ids.dtype.kind in 'iu' and ids.min() >= 0 and ids.max() < BITMAP_MAX_ID
+        if self.seen is None and bitmap_ok:
+            self._update_bitmap(ids.astype(np.int64))
+        else:
+            self._update_set(ids)
+
+    def _update_bitmap(self, ids):
+        unique, counts = np.unique(ids, return_counts=True)
+        n_bytes = int(unique[-1] >> 3) + 1
+        if n_bytes > len(self.bitmap):
+            grown = np.zeros(max(n_bytes, 2 * len(self.bitmap)), dtype=np.uint8)
+            grown[:len(self.bitmap)] = self.bitmap
+            self.bitmap = grown
+        byte = unique >> 3
+        bit = np.left_shift(1, unique & 7).astype(np.uint8)
+        already = (self.bitmap[byte] & bit) != 0
+        np.bitwise_or.at(self.bitmap, byte, bit)
+        self.duplicates += int((counts - 1).sum() + already.sum())
+        self._add_examples(np.concatenate([unique[already], unique[counts > 1]]))
+
+    def _update_set(self, ids):
+        if self.seen is None:
+            # Switch over: carry the ids marked so far into the set
+            marked = np.flatnonzero(np.unpackbits(self.bitmap, bitorder='little'))
+            self.seen = set(marked.tolist())
+        repeated = []
+        for value in ids.tolist():
+            if value in self.seen:
+                repeated.append(value)
+            else:
+                self.seen.add(value)
+        self.duplicates += len(repeated)
+        self._add_examples(repeated)
+
+    def _add_examples(self, ids):
+        for value in ids[:MAX_EXAMPLES - len(self.examples)]:
+            self.examples.append(value.item() if hasattr(value, 'item') else value)
+
+
+def _check(status, **details):
+    return {'status': status, **details}
+
+
+def _smd(mean_a, var_a, mean_b, var_b):
+    """Standardized mean difference of a against b"""
+    pooled = np.sqrt((var_a + var_b) / 2)
+    return float((mean_a - mean_b) / pooled) if pooled > 0 else 0.0
+
+
+class Validator:
+    """Accumulates every check chunk by chunk; report() evaluates them.
+
+    Row-level problems (missing values, out-of-range values, unknown
+    labels) exclude a row from the count tables, which feed the
+    sample-ratio-mismatch and covariate balance tests.
+    """
+
+    def __init__(self, expected_split=None, control=CONTROL):
+        self.expected_split = expected_split
+        self.control = control
+        self.n_rows = 0
+        self.missing_columns = None
+        self.dtype_errors = {}
+        self.nulls = pd.Series(dtype=np.int64)
+        self.out_of_range = {}
+        self.ranges = {}
+        self.duplicates = DuplicateTracker()
+        self.summary = None
+
+    def update(self, chunk):
+        with span('validate_chunk', rows=len(chunk)):
+            self.n_rows += len(chunk)
+            missing = [c for c in ALL_COLUMNS if c not in chunk]
+            self.missing_columns = missing if self.missing_columns is None else sorted(
+                set(self.missing_columns) | set(missing))
+
+            for col in INTEGER_COLUMNS:
+                if col in chunk and not (pd.api.types.is_integer_dtype(chunk[col])
+                                         or pd.api.types.is_bool_dtype(chunk[col])):
+                    # A float column of whole numbers is what a CSV with gaps reads as
+                    values = chunk[col].dropna()
+                    is_whole = pd.api.types.is_float_dtype(chunk[col]) and bool((values % 1 == 0).all())
+                    if not is_whole:
+                        self.dtype_errors[col] = str(chunk[col].dtype)
+            for col in LABEL_COLUMNS:
+                if col in chunk and pd.api.types.is_numeric_dtype(chunk[col]):
+                    self.dtype_errors[col] = str(chunk[col].dtype)
+
+            null_mask = chunk.isna()
+            self.nulls = self.nulls.add(null_mask.sum(), fill_value=0).astype(np.int64)
+            valid = ~null_mask.any(axis=1).to_numpy()
+
+            bad = {}
+            if 'age' in chunk and 'age' not in self.dtype_errors:
+                age = chunk['age'].to_numpy(dtype=np.float64, na_value=np.nan)
+                bad['age'] = (age < AGE_RANGE[0]) | (age > AGE_RANGE[1])
+                self._track_range('age', age)
+            for col in BINARY_COLUMNS:
+                if col in chunk and col not in self.dtype_errors:
+                    values = chunk[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                    bad[col] = ~np.isin(values, (0, 1)) & ~np.isnan(values)
+                    self._track_range(col, values)
+            if 'country' in chunk:
+                country = chunk['country']
+                bad['country'] = (~country.isin(CATEGORIES['country']) & country.notna()).to_numpy()
+            for col, mask in bad.items():
+                self.out_of_range[col] = self.out_of_range.get(col, 0) + int(mask.sum())
+                valid &= ~mask
+
+            if 'user_id' in chunk and 'user_id' not in self.dtype_errors:
+                self.duplicates.update(chunk['user_id'].dropna().to_numpy())
+
+            if {'group', 'clicked'} <= set(chunk.columns) and not self.dtype_errors:
+                rows = chunk[valid]
+                if len(rows):
+                    stats = aggregate(rows)
+                    self.summary = stats if self.summary is None else self.summary.merge(stats)
+        return self
+
+    def _track_range(self, col, values):
+        if np.isnan(values).all():
+            return
+        low, high = np.nanmin(values), np.nanmax(values)
+        if col in self.ranges:
+            low, high = min(low, self.ranges[col][0]), max(high, self.ranges[col][1])
+        self.ranges[col] = (float(low), float(high))
+
+    # -- evaluation ---------------------------------------------------------
+
+    def _schema_check(self):
+        failed = bool(self.missing_columns or self.dtype_errors)
+        return _check(FAIL if failed else PASS, missing_columns=self.missing_columns or [],
+                      wrong_dtypes=self.dtype_errors)
+
+    def _missing_check(self):
+        counts = {col: int(n) for col, n in self.nulls.items() if n > 0}
+        return _check(FAIL if counts else PASS, null_counts=counts)
+
+    def _range_check(self):
+        counts = {col: n for col, n in self.out_of_range.items() if n > 0}
+        return _check(FAIL if counts else PASS, out_of_range_counts=counts,
+                      observed_ranges={col: list(r) for col, r in self.ranges.items()},
+                      age_range=list(AGE_RANGE))
+
+    def _duplicate_check(self):
+        n = self.duplicates.duplicates
+        return _check(FAIL if n else PASS, duplicate_rows=n, examples=self.duplicates.examples)
+
+    def _srm_check(self):
+        if self.summary is None:
+            return _check(FAIL, reason="no valid rows to count")
+        groups, observed = self.summary.groups, self.summary.trials.astype(np.float64)
+        if self.expected_split is None:
+            split = np.full(len(groups), 1 / len(groups))
+        else:
+            split = np.array([self.expected_split.get(g, 0.0) for g in groups], dtype=np.float64)
+            split = split / split.sum()
+        expected = split * observed.sum()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chi2 = float(np.sum((observed - expected) ** 2 / expected))
+        p_value = float(special.chdtrc(len(groups) - 1, chi2)) if len(groups) > 1 else 0.0
+        return _check(FAIL if p_value < SRM_ALPHA or len(groups) < 2 else PASS,
+                      counts=dict(zip(groups, observed.astype(int).tolist())),
+                      expected_share=dict(zip(groups, split.tolist())),
+                      chi2=chi2, p_value=p_value, alpha=SRM_ALPHA)
+
+    def _balance_check(self):
+        summary = self.summary
+        if summary is None or len(summary.groups) < 2 or self.control not in summary.groups:
+            return _check(FAIL, reason=f"needs a '{self.control}' arm and at least one variant")
+        p_values, smd = {}, {}
+        n = summary.trials.astype(np.float64)
+        c = summary.index(self.control)
+        arms = [i for i, g in enumerate(summary.groups) if i != c]
+
+        if summary.age_sum is not None:
+            p_values['age'] = float(anova_age(summary)[1])
+            mean = summary.age_sum / n
+            var = (summary.age_sumsq - n * mean ** 2) / (n - 1)
+            smd['age'] = {summary.groups[a]: _smd(mean[a], var[a], mean[c], var[c]) for a in arms}
+        for name in summary.covariate_counts:
+            p_values[name] = float(chi2_covariate(summary, name)[1])
+            shares = summary.covariate_counts[name] / n  # (levels, groups)
+            var = shares * (1 - shares)
+            # Largest imbalance over the covariate's levels, per arm
+            smd[name] = {summary.groups[a]: max((_smd(shares[l, a], var[l, a], shares[l, c], var[l, c])
+                                                 for l in range(len(shares))), key=abs) for a in arms}
+        imbalanced = sorted({name for name, p in p_values.items() if p < BALANCE_ALPHA}
+                            | {name for name, by_arm in smd.items()
+                               if any(abs(v) > SMD_THRESHOLD for v in by_arm.values())})
+        return _check(WARN if imbalanced else PASS, p_values=p_values, standardized_mean_differences=smd,
+                      imbalanced=imbalanced, alpha=BALANCE_ALPHA, smd_threshold=SMD_THRESHOLD)
+
+    def report(self):
+        """JSON-serialisable report; 'passed' is False when any check failed (warnings do not fail)"""
+        checks = {
+            'schema': self._schema_check(),
+            'missing_values': self._missing_check(),
+            'ranges': self._range_check(),
+            'duplicates': self._duplicate_check(),
+            'sample_ratio': self._srm_check(),
+            'covariate_balance': self._balance_check(),
+        }
+        failed = [name for name, check in checks.items() if check['status'] == FAIL]
+        return {
+            'passed': not failed,
+            'n_rows': self.n_rows,
+            'failed': failed,
+            'warnings': [name for name, check in checks.items() if check['status'] == WARN],
+            'checks': checks,
+        }
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS, fmt=None):
+    """Chunks of a dataset file with its values as stored (no compact dtype casts that could hide bad values)"""
+    fmt = fmt or infer_format(path)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        for i in range(parquet.metadata.num_row_groups):
+            yield parquet.read_row_group(i).to_pandas()
+    elif fmt == 'npy':
+        with open(f'{path}/meta.json') as f:
+            n_rows = json.load(f)['n_rows']
+        for start, stop in row_partitions(path, -(-n_rows // chunk_rows), fmt):
+            yield read_partition(path, start=start, stop=stop, fmt=fmt)
+    else:
+        yield pd.read_feather(path)
+
+
+def validate_data(data, chunk_rows=CHUNK_ROWS, expected_split=None):
+    """Validate an in-memory DataFrame chunk by chunk"""
+    validator = Validator(expected_split)
+    for start in range(0, len(data), chunk_rows):
+        validator.update(data.iloc[start:start + chunk_rows])
+    return validator.report()
+
+
+def validate_file(path, chunk_rows=CHUNK_ROWS, expected_split=None):
+    """Validate a dataset file without loading it whole"""
+    validator = Validator(expected_split)
+    for chunk in iter_chunks(path, chunk_rows):
+        validator.update(chunk)
+    return validator.report()
+
+
+def print_report(report):
+    icons = {PASS: '✅', WARN: '⚠️ ', FAIL: '❌'}
+    print(f"\n🧪 DATA VALIDATION ({report['n_rows']:,} rows)")
+    print("=" * 50)
+    for name, check in report['checks'].items():
+        details = {k: v for k, v in check.items() if k != 'status'}
+        print(f"{icons[check['status']]} {name}: {json.dumps(details, default=str)}")
+    if report['passed']:
+        print("✅ VALIDATION PASSED" + (f" with warnings: {', '.join(report['warnings'])}" if report['warnings'] else ""))
+    else:
+        print(f"❌ VALIDATION FAILED: {', '.join(report['failed'])}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from .storage import find_data_path
+
+    parser = argparse.ArgumentParser(description="Validate the A/B test dataset in one chunked pass")
+    parser.add_argument('--data', default=None)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--expected-split', nargs='+', default=None, metavar='ARM=SHARE',
+                        help="Expected traffic share per arm, e.g. control=0.5 treatment=0.5 (default: even)")
+    parser.add_argument('--output', default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    path = args.data or find_data_path()
+    expected_split = None
+    if args.expected_split:
+        expected_split = {arm: float(share) for arm, share in (item.split('=', 1) for item in args.expected_split)}
+    report = validate_file(path, args.chunk_rows, expected_split)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"📄 Report saved as '{args.output}'")
+    sys.exit(0 if report['passed'] else 1)